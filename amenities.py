@@ -0,0 +1,52 @@
+"""Canonical amenity vocabulary.
+
+Hotel amenities are entered as free text ("2 outdoor swimming pools, Free
+Wifi, ..."). ``canonical_amenities`` splits that text into tokens and maps
+each token onto the fixed vocabulary below, which is what the
+``hotel_amenities`` table stores and what ``?amenities=`` filters on.
+"""
+import re
+
+# Canonical name -> pattern searched for in each lower-cased token
+VOCABULARY = {
+    'wifi': r'wi-?\s?fi',
+    'pool': r'pool',
+    'parking': r'parking',
+    'gym': r'\bgym\b|fitness',
+    'spa': r'\bspa\b|treatment',
+    'sauna': r'sauna|steam room',
+    'jacuzzi': r'jacuzzi',
+    'breakfast': r'breakfast',
+    'restaurant': r'restaurant',
+    'bar': r'\bbars?\b|lounge',
+    'room_service': r'room service',
+    'airport_shuttle': r'airport shuttle',
+    'air_conditioning': r'air condition',
+    'family_rooms': r'family rooms?',
+    'beach': r'beach',
+    'minibar': r'minibar',
+    'tea_coffee': r'\btea\b|coffee',
+    'tv': r'\btv\b|dstv|flat-screen',
+    'laundry': r'laundry|dry cleaning',
+    'accessible': r'disabled|accessib',
+    'safe': r'\bsafe\b|safety deposit',
+}
+
+_PATTERNS = {name: re.compile(pattern) for name, pattern in VOCABULARY.items()}
+_SEPARATORS = re.compile(r'[,;\n]|\.\s|\band\b')
+
+
+def tokenize(text):
+    return [token.strip() for token in _SEPARATORS.split(text.lower()) if token.strip()]
+
+
+def canonical_amenities(text):
+    """Return the sorted canonical amenity names found in ``text``."""
+    if not text:
+        return []
+    found = set()
+    for token in tokenize(text):
+        for name, pattern in _PATTERNS.items():
+            if pattern.search(token):
+                found.add(name)
+    return sorted(found)
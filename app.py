@@ -1,49 +1,255 @@
-from datetime import datetime
-from flask import Flask, request, make_response, jsonify
+from datetime import datetime, time, timedelta, timezone
+from flask import Flask, request, make_response, jsonify, url_for, Response, stream_with_context
 from flask_restful import Api, Resource
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from models import db, User, Flight, Hotel, UserFlight, UserHotel, Booking
+from models import db, User, Flight, Hotel, HotelAmenity, UserFlight, UserHotel, Booking, ChangeCounter, Job
+from amenities import VOCABULARY as AMENITY_VOCABULARY
+import hotel_search
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 from functools import wraps
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import click
 from flask_restful import reqparse
 import json
-import base64
-import requests
-from requests.auth import HTTPBasicAuth
+from pagination import paginate, PaginationError, parse_limit, encode_cursor, decode_cursor
+from sqlalchemy.orm import selectinload
+from cache import create_route_cache, create_role_changes, route_tag, TTLCache
+from daraja import DarajaClient, DarajaError
+from passwords import PasswordHasher, HashingBusy
+from flight_import import parse_flight, FlightDataError, FlightImporter, read_csv, read_ndjson
+from connections import RouteIndex, SORT_KEYS, itinerary_to_dict
+from quotes import parse_itinerary, quote_itineraries, QuoteError
+from idempotency import IdempotencyStore
+from metrics import init_metrics
+from slow_queries import SlowQueryLog
+from database import engine_options, SQLitePragmas, StatementTimeout
+from replicas import ReplicaRouter
+from jobs import JobQueue, Worker, RetryJob, JobFailed
+from emails import Mailer, MailError, booking_confirmation
+import dataset as datasets
+from bulk_load import bulk_transaction
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config["JWT_SECRET_KEY"] = "super-secret"
 app.json.compact = False
-
-CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
+app.config['ROUTE_CACHE_URL'] = os.environ.get('ROUTE_CACHE_URL')
+app.config['ROUTE_CACHE_SIZE'] = int(os.environ.get('ROUTE_CACHE_SIZE', 1024))
+app.config['ROUTE_CACHE_TTL'] = int(os.environ.get('ROUTE_CACHE_TTL', 60))
+app.config['MPESA_BASE_URL'] = os.environ.get('MPESA_BASE_URL', 'https://sandbox.safaricom.co.ke')
+app.config['MPESA_CONSUMER_KEY'] = os.environ.get('MPESA_CONSUMER_KEY', 'YXZhAOLvjYqmX7TkAirasXHJfTjUHHqQtIOAGXYTLjjVfvUK')
+app.config['MPESA_CONSUMER_SECRET'] = os.environ.get('MPESA_CONSUMER_SECRET', 'c6SpWnqqHckfRGGGKQt56LKdwIDrMQXeHlGs9PEiSbfGLLAmnbUjc7niS8olHtJ2')
+app.config['MPESA_CONNECT_TIMEOUT'] = float(os.environ.get('MPESA_CONNECT_TIMEOUT', 3.05))
+app.config['MPESA_READ_TIMEOUT'] = float(os.environ.get('MPESA_READ_TIMEOUT', 10))
+app.config['MPESA_RETRIES'] = int(os.environ.get('MPESA_RETRIES', 2))
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 4))
+app.config['PASSWORD_HASH_RETRY_AFTER'] = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
+app.config['JWT_ADMIN_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('JWT_ADMIN_ACCESS_TOKEN_MINUTES', 5)))
+app.config['ROLE_CACHE_TTL'] = int(os.environ.get('ROLE_CACHE_TTL', 30))
+app.config['FLIGHT_IMPORT_BATCH_SIZE'] = int(os.environ.get('FLIGHT_IMPORT_BATCH_SIZE', 500))
+app.config['STREAM_BATCH_SIZE'] = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
+app.config['CONNECTIONS_REFRESH_SECONDS'] = int(os.environ.get('CONNECTIONS_REFRESH_SECONDS', 60))
+app.config['CONNECTIONS_HORIZON_DAYS'] = int(os.environ.get('CONNECTIONS_HORIZON_DAYS', 365))
+app.config['CONNECTIONS_MAX_STOPS'] = int(os.environ.get('CONNECTIONS_MAX_STOPS', 2))
+app.config['CONNECTIONS_MIN_CONNECTION_MINUTES'] = int(os.environ.get('CONNECTIONS_MIN_CONNECTION_MINUTES', 45))
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 250))
+app.config['SLOW_QUERY_SAMPLE_RATE'] = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0))
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', os.path.join(app.instance_path, 'slow_queries.log'))
+app.config['SLOW_QUERY_LOG_BYTES'] = int(os.environ.get('SLOW_QUERY_LOG_BYTES', 10 * 1024 * 1024))
+app.config['SLOW_QUERY_LOG_BACKUPS'] = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5))
+app.config['SLOW_QUERY_EXPLAIN_INTERVAL'] = int(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'no')
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+app.config['REPLICA_DATABASE_URI'] = os.environ.get('REPLICA_DATABASE_URI')
+if app.config['REPLICA_DATABASE_URI']:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': app.config['REPLICA_DATABASE_URI']}
+app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+app.config['REPLICA_LAG_CHECK_SECONDS'] = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 1))
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+app.config['QUOTE_MAX_ITINERARIES'] = int(os.environ.get('QUOTE_MAX_ITINERARIES', 1000))
+app.config['GROUP_BOOKING_MAX_ITINERARIES'] = int(os.environ.get('GROUP_BOOKING_MAX_ITINERARIES', 50))
+app.config['IDEMPOTENCY_TTL'] = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+app.config['IDEMPOTENCY_WAIT_SECONDS'] = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 10))
+app.config['IDEMPOTENCY_LOCK_SECONDS'] = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+app.config['IDEMPOTENCY_SWEEP_SECONDS'] = int(os.environ.get('IDEMPOTENCY_SWEEP_SECONDS', 300))
+# Number of proxies in front of the app whose X-Forwarded-For is trusted for the client address
+app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+app.config['JOB_WORKER_CONCURRENCY'] = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))
+app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS', 1))
+app.config['JOB_RETRY_BASE_SECONDS'] = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 5))
+app.config['JOB_RETRY_MAX_SECONDS'] = float(os.environ.get('JOB_RETRY_MAX_SECONDS', 3600))
+app.config['JOB_LOCK_SECONDS'] = int(os.environ.get('JOB_LOCK_SECONDS', 300))
+app.config['STK_PUSH_MAX_ATTEMPTS'] = int(os.environ.get('STK_PUSH_MAX_ATTEMPTS', 5))
+app.config['STK_PUSH_CONCURRENCY'] = int(os.environ.get('STK_PUSH_CONCURRENCY', 2))
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 8))
+app.config['EMAIL_CONCURRENCY'] = int(os.environ.get('EMAIL_CONCURRENCY', 4))
+app.config['SENDGRID_API_KEY'] = os.environ.get('SENDGRID_API_KEY')
+app.config['SENDGRID_FROM'] = os.environ.get('SENDGRID_FROM', 'bookings@airspace.example')
+app.config['SENDGRID_HOST'] = os.environ.get('SENDGRID_HOST', 'https://api.sendgrid.com')
+app.config['SENDGRID_TIMEOUT'] = float(os.environ.get('SENDGRID_TIMEOUT', 10))
+
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}}, expose_headers=["Link", "X-Next-Cursor"])
 migrate = Migrate(app, db)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
+SQLitePragmas.from_config(app.config).install()
+StatementTimeout.from_config(app.config).install()
 db.init_app(app)
+init_metrics(app)
+replica_router = ReplicaRouter.from_config(db, app.config)
+replica_router.init_app(app)
 
 api = Api(app)
+route_cache = create_route_cache(app.config)
+mpesa = DarajaClient.from_config(app.config)
+passwords = PasswordHasher.from_config(bcrypt, app.config)
+route_index = RouteIndex.from_config(app.config)
+role_cache = TTLCache(maxsize=4096, ttl=app.config['ROLE_CACHE_TTL'])
+role_changes = create_role_changes(app.config)
+os.makedirs(os.path.dirname(app.config['SLOW_QUERY_LOG']), exist_ok=True)
+slow_queries = SlowQueryLog.from_config(app.config)
+slow_queries.install()
+idempotency = IdempotencyStore.from_config(app.config)
+jobs = JobQueue.from_config(app.config)
+mailer = Mailer.from_config(app.config)
+
+# Claims embedded in every access token so authorization checks can skip the DB
+def user_claims(user):
+    return {"role": user.role}
+
+# Admin tokens are short-lived, which bounds how long a revoked admin's token works
+def create_user_token(user):
+    expires = app.config['JWT_ADMIN_ACCESS_TOKEN_EXPIRES'] if user.role == 'admin' else None
+    return create_access_token(identity=user.user_id, additional_claims=user_claims(user), expires_delta=expires)
+
+# Role of the current caller. Role changes are recorded in a store every
+# worker shares (Redis, when ROUTE_CACHE_URL is set): the token's role claim
+# is trusted unless the user's role changed or the user was deleted after the
+# token was issued. Without a shared store a change made by another worker
+# would go unseen, so the role is read from the users row through a TTL
+# cache instead, and other workers see a demotion or deletion within
+# ROLE_CACHE_TTL seconds.
+def current_role():
+    user_id = get_jwt_identity()
+    claims = get_jwt()
+    if role_changes is not None and 'role' in claims:
+        changed_at = role_changes.get(user_id)
+        if changed_at is None or claims['iat'] > changed_at:
+            return claims['role']
+        # This worker's cached role may predate the change as well
+        user = db.session.get(User, user_id)
+        return user.role if user else None
+    role = role_cache.get(user_id)
+    if role is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        role = user.role
+        role_cache.set(user_id, role)
+    return role
+
+# Called after an admin changes or removes a user so older tokens stop being trusted
+def invalidate_claims(user_id):
+    if role_changes is not None:
+        role_changes.set(user_id, datetime.now().timestamp())
+    role_cache.delete(user_id)
 
 # Decorator for Admin Access
 def admin_required(fn):
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        if user is None:
-            return jsonify({"error": "User not found"}), 404
-        if user.role != 'admin':
-            return jsonify({"error": "Admin access required"}), 403
+        role = current_role()
+        if role is None:
+            return make_response(jsonify({"error": "User not found"}), 404)
+        if role != 'admin':
+            return make_response(jsonify({"error": "Admin access required"}), 403)
         return fn(*args, **kwargs)
     return wrapper
 
+# Builds a list response with the keyset cursor for the next page in the headers
+def paginated_response(body, next_cursor):
+    response = make_response(jsonify(body), 200)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        next_url = url_for(request.endpoint, _external=True, **args)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+# Reads ?expand=a,b and returns the relationship names plus the matching
+# selectin loaders, so each expanded relationship costs one batched query
+def parse_expand(model):
+    names = [name.strip() for name in request.args.get('expand', '').split(',') if name.strip()]
+    for name in names:
+        if name not in model.expandable:
+            raise ValueError(f"Cannot expand: {name}")
+    return names, [selectinload(getattr(model, name)) for name in names]
+
+# 503 telling the client when to retry a login or signup the hasher turned away
+def busy_response(e):
+    response = make_response(jsonify({"error": "Server is busy, please try again shortly"}), 503)
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# Clients opt into streaming with ?stream=1 or by preferring NDJSON in Accept
+def wants_stream():
+    if request.args.get('stream') == '1':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+# Writes one JSON object per line while rows are still being fetched in
+# batches, so neither the full row list nor the full body is held in memory
+def stream_response(query, expand=()):
+    def generate():
+        for row in query.yield_per(app.config['STREAM_BATCH_SIZE']):
+            yield json.dumps(row.to_dict(expand), separators=(',', ':')) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# ETag and Last-Modified for a collection, read from the table's change counter
+def collection_validators(table):
+    version, updated_at = ChangeCounter.current(table)
+    return f"{table}-{version}", updated_at
+
+# Returns a 304 when the client's cached copy is still current, otherwise None
+def not_modified(etag, last_modified=None):
+    if request.if_none_match:
+        current = request.if_none_match.contains(etag)
+    elif last_modified and request.if_modified_since:
+        current = last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    else:
+        current = False
+    if current:
+        return with_validators(make_response('', 304), etag, last_modified)
+    return None
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return response
+
 class Index(Resource):
     def get(self):
         response_dict = {"message": "Welcome to the AirEscape RESTful API"}
@@ -53,11 +259,17 @@ api.add_resource(Index, '/')
 
 class Users(Resource):
     def get(self):
-        
-        
-        users = User.query.all()
-        response = [user.to_dict() for user in users]
-        return make_response(jsonify(response), 200)
+        try:
+            expand, options = parse_expand(User)
+            if wants_stream():
+                return stream_response(User.query.options(*options).order_by(User.user_id), expand)
+            users, next_cursor = paginate(User.query.options(*options), User.user_id, {
+                'user_id': User.user_id,
+                'last_name': User.last_name,
+            }, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        return paginated_response([user.to_dict(expand) for user in users], next_cursor)
     
 
     def post(self):
@@ -69,19 +281,24 @@ class Users(Resource):
         if existing_user:
             return make_response(jsonify({"error": "Email already exists"}), 422)
 
+        try:
+            password = passwords.hash(data.get("password"))
+        except HashingBusy as e:
+            return busy_response(e)
+
         new_user = User(
             title=data.get('title'),
             first_name=data['first_name'],
             last_name=data['last_name'],
             email=email,
-            password=bcrypt.generate_password_hash(data.get("password")).decode('utf-8'),
+            password=password,
             role=data.get('role', 'traveler'),
             phone_number=data['phone_number']
         )
         db.session.add(new_user)
         db.session.commit()
 
-        access_token = create_access_token(identity=new_user.user_id)  
+        access_token = create_user_token(new_user)
 
         response = {
             "user": new_user.to_dict(),
@@ -96,35 +313,49 @@ class UserByID(Resource):
     @jwt_required()
     def get(self, user_id):
         current_user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
-        if user_id != current_user_id and User.query.get(current_user_id).role != 'admin':
+        try:
+            expand, options = parse_expand(User)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        user = User.query.options(*options).get_or_404(user_id)
+        if user_id != current_user_id and current_role() != 'admin':
             return make_response(jsonify({"error": "Access denied"}), 403)
-        return make_response(jsonify(user.to_dict()), 200)
+        return make_response(jsonify(user.to_dict(expand)), 200)
 
     @jwt_required()
     def patch(self, user_id):
         current_user_id = get_jwt_identity()
         user = User.query.get_or_404(user_id)
-        if user_id != current_user_id and User.query.get(current_user_id).role != 'admin':
+        if user_id != current_user_id and current_role() != 'admin':
             return make_response(jsonify({"error": "Access denied"}), 403)
         data = request.get_json()
+        role_changed = 'role' in data and data['role'] != user.role
         for key, value in data.items():
             setattr(user, key, value)
         db.session.commit()
+        if role_changed:
+            invalidate_claims(user_id)
         return make_response(jsonify(user.to_dict()), 200)
 
     @jwt_required()
     def delete(self, user_id):
         current_user_id = get_jwt_identity()
-        if User.query.get(current_user_id).role != 'admin':
+        if current_role() != 'admin':
             return make_response(jsonify({"error": "Admin access required"}), 403)
         user = User.query.get_or_404(user_id)
         db.session.delete(user)
         db.session.commit()
+        invalidate_claims(user_id)
         return make_response(jsonify({"message": "User deleted"}), 200)
 
 api.add_resource(UserByID, '/users/<int:user_id>')
 
+# Half-open range covering one calendar day. Comparing the bare column (rather
+# than date(departure_date)) lets the route + departure index be used
+def departs_on(day):
+    start = datetime.combine(day, time.min)
+    return Flight.departure_date >= start, Flight.departure_date < start + timedelta(days=1)
+
 class Flights(Resource):
     def get(self):
         from_city = request.args.get('from')
@@ -134,11 +365,30 @@ class Flights(Resource):
         trip_type = request.args.get('tripType', 'oneway')  # Default to 'oneway' if not provided
         passengers = int(request.args.get('passengers', 1))
 
-        # If no specific search parameters are provided, return all flights
+        try:
+            expand, options = parse_expand(Flight)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+
+        # If no specific search parameters are provided, return a page of all flights
         if not from_city and not to_city and not outbound_date_str:
-            flights = Flight.query.all()
-            response = [flight.to_dict() for flight in flights]
-            return make_response(jsonify(response), 200)
+            if wants_stream():
+                return stream_response(Flight.query.options(*options).order_by(Flight.flight_id), expand)
+            if not expand:
+                etag, last_modified = collection_validators('flights')
+                cached = not_modified(etag, last_modified)
+                if cached:
+                    return cached
+            try:
+                flights, next_cursor = paginate(Flight.query.options(*options), Flight.flight_id, {
+                    'flight_id': Flight.flight_id,
+                    'price': Flight.price,
+                    'departure_date': Flight.departure_date,
+                }, request.args)
+            except PaginationError as e:
+                return make_response(jsonify({"error": str(e)}), 400)
+            response = paginated_response([flight.to_dict(expand) for flight in flights], next_cursor)
+            return response if expand else with_validators(response, etag, last_modified)
 
         # Existing logic for filtering flights
         if not from_city or not to_city or not outbound_date_str:
@@ -153,25 +403,61 @@ class Flights(Resource):
         except ValueError:
             return make_response(jsonify({"error": "Invalid date format"}), 400)
 
+        # Nothing in a flat search result can change without bumping the flights counter
+        etag = last_modified = None
+        if not expand:
+            etag, last_modified = collection_validators('flights')
+            cached = not_modified(etag, last_modified)
+            if cached:
+                return cached
+
+        # Serve repeated searches from the route cache, with the validators
+        # read when the body was built: a write on another worker bumps the
+        # counter without clearing this worker's cache, and a cached body sent
+        # under the new ETag would then be revalidated as current
+        cache_key = json.dumps([
+            from_city, to_city, outbound_date_str, passengers, trip_type,
+            return_date_str if trip_type == 'roundtrip' else None, expand
+        ])
+        cached = route_cache.get(cache_key)
+        if cached is not None:
+            response = make_response(jsonify(cached['body']), 200)
+            if expand:
+                return response
+            cached_etag = cached['etag']
+            cached_last_modified = datetime.fromisoformat(cached['last_modified']) if cached['last_modified'] else None
+            return (not_modified(cached_etag, cached_last_modified)
+                    or with_validators(response, cached_etag, cached_last_modified))
+        cache_tags = [route_tag(from_city, to_city)]
+
         # Query for outbound flights
-        outbound_flights_query = Flight.query.filter_by(departure_city=from_city, arrival_city=to_city)
-        outbound_flights_query = outbound_flights_query.filter(db.func.date(Flight.departure_date) == outbound_date)
+        outbound_flights_query = Flight.query.options(*options).filter_by(departure_city=from_city, arrival_city=to_city)
+        outbound_flights_query = outbound_flights_query.filter(*departs_on(outbound_date))
         outbound_flights_query = outbound_flights_query.filter(Flight.seats_available >= passengers)
         outbound_flights = outbound_flights_query.all()
 
         response = {
-            'outbound_flights': [flight.to_dict() for flight in outbound_flights]
+            'outbound_flights': [flight.to_dict(expand) for flight in outbound_flights]
         }
 
         if trip_type == 'roundtrip':
-            return_flights_query = Flight.query.filter_by(departure_city=to_city, arrival_city=from_city)
-            return_flights_query = return_flights_query.filter(db.func.date(Flight.departure_date) == return_date)
+            return_flights_query = Flight.query.options(*options).filter_by(departure_city=to_city, arrival_city=from_city)
+            return_flights_query = return_flights_query.filter(*departs_on(return_date))
             return_flights_query = return_flights_query.filter(Flight.seats_available >= passengers)
             return_flights = return_flights_query.all()
 
-            response['return_flights'] = [flight.to_dict() for flight in return_flights]
+            response['return_flights'] = [flight.to_dict(expand) for flight in return_flights]
+            cache_tags.append(route_tag(to_city, from_city))
 
-        return make_response(jsonify(response), 200)
+        # A lagging replica may not have the write that just invalidated this route
+        if not replica_router.lagging():
+            route_cache.set(cache_key, {
+                "body": response,
+                "etag": etag,
+                "last_modified": last_modified.isoformat() if last_modified else None,
+            }, cache_tags)
+        response = make_response(jsonify(response), 200)
+        return response if expand else with_validators(response, etag, last_modified)
 
     
     @jwt_required()
@@ -179,74 +465,318 @@ class Flights(Resource):
     def post(self):
         data = request.get_json()
 
-        # Validate required fields
-        required_fields = [
-            'flight_number', 'departure_city', 'arrival_city', 
-            'departure_date', 'arrival_date', 'departure_time', 
-            'arrival_time', 'price', 'seats_available'
-        ]
-        for field in required_fields:
-            if field not in data:
-                return make_response(jsonify({"error": f"Missing field: {field}"}), 400)
-
-        # Convert date and time strings to datetime objects
+        # Validate required fields and convert date and time strings
         try:
-            departure_date = datetime.fromisoformat(data['departure_date'])
-            arrival_date = datetime.fromisoformat(data['arrival_date'])
-            departure_time = datetime.strptime(data['departure_time'], '%H:%M:%S').time()
-            arrival_time = datetime.strptime(data['arrival_time'], '%H:%M:%S').time()
-        except ValueError as e:
-            return make_response(jsonify({"error": "Invalid date or time format"}), 400)
-        
-        new_flight = Flight(
-            flight_number=data['flight_number'],
-            departure_city=data['departure_city'],
-            arrival_city=data['arrival_city'],
-            departure_date=departure_date,
-            arrival_date=arrival_date,
-            departure_time=departure_time,
-            arrival_time=arrival_time,
-            price=data['price'],
-            seats_available=data['seats_available'],
-            trip_type=data.get('trip_type')  # Optional field
-        )
-        
+            new_flight = Flight(**parse_flight(data))
+        except FlightDataError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+
         db.session.add(new_flight)
         db.session.commit()
+        route_cache.invalidate(route_tag(new_flight.departure_city, new_flight.arrival_city))
+        route_index.upsert(new_flight)
         
         return make_response(jsonify(new_flight.to_dict()), 201)
 
 api.add_resource(Flights, '/flights')
 
+class FlightConnections(Resource):
+    def get(self):
+        """Direct and connecting itineraries between two cities on a day"""
+        from_city = request.args.get('from')
+        to_city = request.args.get('to')
+        outbound_date_str = request.args.get('outboundDate')
+        if not from_city or not to_city or not outbound_date_str:
+            return make_response(jsonify({"error": "From, to cities, and outboundDate are required"}), 400)
+        try:
+            outbound_date = datetime.strptime(outbound_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return make_response(jsonify({"error": "Invalid date format"}), 400)
+        try:
+            passengers = int(request.args.get('passengers', 1))
+            max_stops = min(int(request.args.get('maxStops', 1)), app.config['CONNECTIONS_MAX_STOPS'])
+            min_connection = int(request.args.get('minConnectionMinutes', app.config['CONNECTIONS_MIN_CONNECTION_MINUTES']))
+            limit = min(int(request.args.get('limit', 10)), 50)
+        except ValueError:
+            return make_response(jsonify({"error": "passengers, maxStops, minConnectionMinutes and limit must be integers"}), 400)
+        sort = request.args.get('sort', 'price')
+        if sort not in SORT_KEYS:
+            return make_response(jsonify({"error": f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400)
+
+        itineraries = route_index.search(
+            from_city, to_city, outbound_date,
+            passengers=passengers,
+            max_stops=max(max_stops, 0),
+            min_connection=timedelta(minutes=max(min_connection, 0)),
+            sort=sort,
+            limit=max(limit, 1),
+        )
+        return make_response(jsonify([itinerary_to_dict(legs, passengers) for legs in itineraries]), 200)
+
+api.add_resource(FlightConnections, '/flights/connections')
+
+class FareCalendar(Resource):
+    def get(self):
+        """Cheapest fare and seat availability per day of a month for a route"""
+        from_city = request.args.get('from')
+        to_city = request.args.get('to')
+        month_str = request.args.get('month')
+        trip_type = request.args.get('tripType', 'oneway')
+        if not from_city or not to_city or not month_str:
+            return make_response(jsonify({"error": "From, to cities, and month are required"}), 400)
+        try:
+            start = datetime.strptime(month_str, '%Y-%m')
+            passengers = int(request.args.get('passengers', 1))
+        except ValueError:
+            return make_response(jsonify({"error": "month must be YYYY-MM and passengers an integer"}), 400)
+        end = (start + timedelta(days=32)).replace(day=1)
+
+        cache_key = json.dumps(['calendar', from_city, to_city, month_str, passengers, trip_type])
+        cached = route_cache.get(cache_key)
+        if cached is not None:
+            return make_response(jsonify(cached), 200)
+
+        routes = [(from_city, to_city)]
+        if trip_type == 'roundtrip':
+            routes.append((to_city, from_city))
+
+        # One grouped query for every day of the month and both directions
+        day = db.func.date(Flight.departure_date).label('day')
+        rows = db.session.execute(
+            db.select(
+                Flight.departure_city, day,
+                db.func.min(Flight.price), db.func.max(Flight.seats_available), db.func.count()
+            )
+            .where(db.or_(*(db.and_(Flight.departure_city == a, Flight.arrival_city == b) for a, b in routes)))
+            .where(Flight.departure_date >= start, Flight.departure_date < end)
+            .where(Flight.seats_available >= passengers)
+            .group_by(Flight.departure_city, day)
+        ).all()
+
+        fares = {(city, str(day)[:10]): (min_price, seats, count) for city, day, min_price, seats, count in rows}
+        days = [(start + timedelta(days=i)).date().isoformat() for i in range((end - start).days)]
+
+        def calendar(origin):
+            result = []
+            for d in days:
+                min_price, seats, count = fares.get((origin, d), (None, 0, 0))
+                result.append({"date": d, "min_price": min_price, "seats_available": seats, "flights": count})
+            return result
+
+        response = {"month": start.strftime('%Y-%m'), "outbound": calendar(from_city)}
+        if trip_type == 'roundtrip':
+            response['return'] = calendar(to_city)
+
+        if not replica_router.lagging():
+            route_cache.set(cache_key, response, [route_tag(a, b) for a, b in routes])
+        return make_response(jsonify(response), 200)
+
+api.add_resource(FareCalendar, '/flights/calendar')
+
+class FlightImport(Resource):
+    @admin_required
+    def post(self):
+        """Bulk upsert flights from an NDJSON or CSV request body"""
+        try:
+            batch_size = int(request.args.get('batch_size', app.config['FLIGHT_IMPORT_BATCH_SIZE']))
+        except ValueError:
+            return make_response(jsonify({"error": "batch_size must be an integer"}), 400)
+        if batch_size < 1:
+            return make_response(jsonify({"error": "batch_size must be at least 1"}), 400)
+
+        if request.mimetype == 'text/csv':
+            records = read_csv(request.stream)
+        elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = read_ndjson(request.stream)
+        else:
+            return make_response(jsonify({"error": "Content-Type must be text/csv or application/x-ndjson"}), 415)
+
+        importer = FlightImporter(batch_size).run(records)
+        route_cache.invalidate(*(route_tag(*route) for route in importer.routes))
+        route_index.invalidate()
+        return make_response(jsonify(importer.result()), 200)
+
+api.add_resource(FlightImport, '/flights/import')
+
+@app.cli.command('import-flights')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']), help="Defaults to the file extension.")
+@click.option('--batch-size', type=int, default=None, help="Rows per upsert batch.")
+def import_flights_command(path, file_format, batch_size):
+    """Bulk upsert flights from an NDJSON or CSV file."""
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as f:
+        records = read_csv(f) if file_format == 'csv' else read_ndjson(f)
+        importer = FlightImporter(batch_size or app.config['FLIGHT_IMPORT_BATCH_SIZE']).run(records)
+    result = importer.result()
+    click.echo(f"Imported {result['imported']} flights, {result['error_count']} errors")
+    for error in result['errors']:
+        click.echo(f"  line {error['line']}: {error['error']}")
+
+@app.cli.command('generate-dataset')
+@click.option('--rows', default='10k', help="Total rows: 10k, 100k, 1m, 10m or a number.")
+@click.option('--seed', type=int, default=42, help="Same seed, same data.")
+@click.option('--batch-size', type=int, default=10000, help="Rows per INSERT batch or COPY.")
+@click.option('--index-threshold', type=int, default=100000,
+              help="Drop and rebuild secondary indexes for loads of at least this many rows.")
+def generate_dataset_command(rows, seed, batch_size, index_threshold):
+    """Replace the data in the database with a reproducible synthetic dataset."""
+    try:
+        dataset = datasets.Dataset(datasets.parse_rows(rows), seed=seed, password_hash=passwords.hash('password'))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--rows')
+    started = datetime.now()
+    timings = {}
+    with bulk_transaction(db.engine) as connection:
+        datasets.clear(connection)
+        written = datasets.write(connection, dataset, batch_size, drop_indexes=dataset.rows >= index_threshold,
+                                 progress=lambda table, count: click.echo(f"  {table}: {count} rows"), timings=timings)
+    route_cache.clear()
+    route_index.invalidate()
+    load = timings['rows'] + timings['indexes']
+    click.echo(f"Generated {dataset.rows} rows in {(datetime.now() - started).total_seconds():.1f}s, "
+               f"loading {sum(written.values()) / load:,.0f} rows/s (password: 'password')")
+
 class FlightByID(Resource):
     def get(self, flight_id):
+        try:
+            expand, options = parse_expand(Flight)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        if expand:
+            flight = Flight.query.options(*options).get_or_404(flight_id)
+            return make_response(jsonify(flight.to_dict(expand)), 200)
+
+        # Check the client's ETag against the version column before loading the row
+        version = db.session.execute(
+            db.select(Flight.version).where(Flight.flight_id == flight_id)
+        ).scalar()
+        if version is None:
+            return make_response(jsonify({"error": "Flight not found"}), 404)
+        etag = f"flight-{flight_id}-{version}"
+        cached = not_modified(etag)
+        if cached:
+            return cached
         flight = Flight.query.get_or_404(flight_id)
-        return make_response(jsonify(flight.to_dict()), 200)
+        return with_validators(make_response(jsonify(flight.to_dict()), 200), f"flight-{flight_id}-{flight.version}")
 
     
     @jwt_required()
     @admin_required
     def patch(self, flight_id):
         flight = Flight.query.get_or_404(flight_id)
+        old_route = route_tag(flight.departure_city, flight.arrival_city)
         data = request.get_json()
         for key, value in data.items():
             setattr(flight, key, value)
         db.session.commit()
+        route_cache.invalidate(old_route, route_tag(flight.departure_city, flight.arrival_city))
+        route_index.upsert(flight)
         return make_response(jsonify(flight.to_dict()), 200)
 
     @jwt_required()
     @admin_required
     def delete(self, flight_id):
         flight = Flight.query.get_or_404(flight_id)
+        route = route_tag(flight.departure_city, flight.arrival_city)
         db.session.delete(flight)
         db.session.commit()
+        route_cache.invalidate(route)
+        route_index.remove(flight_id)
         return make_response(jsonify({"message": "Flight deleted"}), 200)
 
 api.add_resource(FlightByID, '/flights/<int:flight_id>')
 
+class FlightSearchCache(Resource):
+    @admin_required
+    def get(self):
+        return make_response(jsonify(route_cache.stats()), 200)
+
+    @admin_required
+    def delete(self):
+        route_cache.clear()
+        return make_response(jsonify({"message": "Flight search cache cleared"}), 200)
+
+api.add_resource(FlightSearchCache, '/flights/cache')
+
+class SlowQueries(Resource):
+    @admin_required
+    def get(self):
+        try:
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            return make_response(jsonify({"error": "limit must be an integer"}), 400)
+        entries = slow_queries.recent(limit)
+        return make_response(jsonify({"threshold_ms": slow_queries.threshold * 1000, "queries": entries}), 200)
+
+    @admin_required
+    def delete(self):
+        slow_queries.clear()
+        return make_response(jsonify({"message": "Slow query log cleared"}), 200)
+
+api.add_resource(SlowQueries, '/admin/slow-queries')
+
+# WHERE clauses for the ?amenities=, ?location=, ?min_price= and ?max_price= hotel filters
+def hotel_filters(args):
+    conditions = []
+    amenities = [name.strip() for name in args.get('amenities', '').split(',') if name.strip()]
+    for name in amenities:
+        if name not in AMENITY_VOCABULARY:
+            raise ValueError(f"Unknown amenity: {name}")
+    if amenities:
+        # Hotels that have every requested amenity, answered from the amenity index
+        matching = (
+            db.select(HotelAmenity.hotel_id)
+            .where(HotelAmenity.amenity.in_(amenities))
+            .group_by(HotelAmenity.hotel_id)
+            .having(db.func.count() == len(set(amenities)))
+        )
+        conditions.append(Hotel.hotel_id.in_(matching))
+    if args.get('location'):
+        conditions.append(Hotel.location.ilike(f"%{args['location']}%"))
+    try:
+        if args.get('min_price'):
+            conditions.append(Hotel.price_per_night >= float(args['min_price']))
+        if args.get('max_price'):
+            conditions.append(Hotel.price_per_night <= float(args['max_price']))
+    except ValueError:
+        raise ValueError("min_price and max_price must be numbers")
+    return conditions
+
+# Number of matching hotels per amenity, in a single grouped query
+def amenity_facets(conditions):
+    matching = db.select(Hotel.hotel_id).where(*conditions)
+    rows = db.session.execute(
+        db.select(HotelAmenity.amenity, db.func.count())
+        .where(HotelAmenity.hotel_id.in_(matching))
+        .group_by(HotelAmenity.amenity)
+    ).all()
+    return {amenity: count for amenity, count in rows}
+
 class Hotels(Resource):
     def get(self):
-        return jsonify([hotel.to_dict() for hotel in Hotel.query.all()])
+        try:
+            expand, options = parse_expand(Hotel)
+            conditions = hotel_filters(request.args)
+            query = Hotel.query.options(*options).filter(*conditions)
+            if wants_stream():
+                return stream_response(query.order_by(Hotel.hotel_id), expand)
+            if not expand:
+                etag, last_modified = collection_validators('hotels')
+                cached = not_modified(etag, last_modified)
+                if cached:
+                    return cached
+            hotels, next_cursor = paginate(query, Hotel.hotel_id, {
+                'hotel_id': Hotel.hotel_id,
+                'price_per_night': Hotel.price_per_night,
+            }, request.args)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        body = [hotel.to_dict(expand) for hotel in hotels]
+        if request.args.get('facets') == '1':
+            body = {"hotels": body, "facets": {"amenities": amenity_facets(conditions)}}
+        response = paginated_response(body, next_cursor)
+        return response if expand else with_validators(response, etag, last_modified)
     
     @jwt_required()
     @admin_required
@@ -275,10 +805,59 @@ class Hotels(Resource):
 
 api.add_resource(Hotels, '/hotels')
 
+class HotelSearch(Resource):
+    def get(self):
+        """Hotels matching ?q= in their name, location or amenities, best match first"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            return make_response(jsonify({"error": "q is required"}), 400)
+        try:
+            limit = parse_limit(request.args)
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor, 'relevance', None) if cursor else None
+        except PaginationError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+
+        matches = hotel_search.search(db.session.connection(), query, limit + 1, after)
+        next_cursor = None
+        if len(matches) > limit:
+            matches = matches[:limit]
+            next_cursor = encode_cursor('relevance', matches[-1][1], matches[-1][0])
+
+        hotels = {hotel.hotel_id: hotel for hotel in Hotel.query.filter(Hotel.hotel_id.in_([hotel_id for hotel_id, _ in matches]))}
+        return paginated_response([hotels[hotel_id].to_dict() for hotel_id, _ in matches if hotel_id in hotels], next_cursor)
+
+api.add_resource(HotelSearch, '/hotels/search')
+
+@app.cli.command('rebuild-hotel-search')
+def rebuild_hotel_search_command():
+    """Create the hotel full-text index if missing and rebuild it."""
+    with db.engine.begin() as connection:
+        hotel_search.install(connection)
+    click.echo("Hotel search index rebuilt")
+
 class HotelByID(Resource):
     def get(self, hotel_id):
+        try:
+            expand, options = parse_expand(Hotel)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        if expand:
+            hotel = Hotel.query.options(*options).get_or_404(hotel_id)
+            return make_response(jsonify(hotel.to_dict(expand)), 200)
+
+        # Check the client's ETag against the version column before loading the row
+        version = db.session.execute(
+            db.select(Hotel.version).where(Hotel.hotel_id == hotel_id)
+        ).scalar()
+        if version is None:
+            return make_response(jsonify({"error": "Hotel not found"}), 404)
+        etag = f"hotel-{hotel_id}-{version}"
+        cached = not_modified(etag)
+        if cached:
+            return cached
         hotel = Hotel.query.get_or_404(hotel_id)
-        return make_response(jsonify(hotel.to_dict()), 200)
+        return with_validators(make_response(jsonify(hotel.to_dict()), 200), f"hotel-{hotel_id}-{hotel.version}")
 
     @jwt_required()
     @admin_required
@@ -320,6 +899,15 @@ class HotelByID(Resource):
 
 api.add_resource(HotelByID, '/hotels/<int:hotel_id>')
 
+@app.cli.command('normalize-amenities')
+def normalize_amenities_command():
+    """Rebuild the normalized amenity rows for every hotel."""
+    hotels = Hotel.query.options(selectinload(Hotel.amenity_tags)).all()
+    for hotel in hotels:
+        hotel.sync_amenity_tags()
+    db.session.commit()
+    click.echo(f"Normalized amenities for {len(hotels)} hotels")
+
 class UserFlights(Resource):
     @jwt_required()
     def get(self):
@@ -362,29 +950,191 @@ class UserHotels(Resource):
 
 api.add_resource(UserHotels, '/user/hotels')
 
+def queue_booking_confirmation(bookings):
+    # In the booking's own transaction: the email is queued if and only if the booking commits
+    if mailer.enabled:
+        jobs.enqueue('booking_confirmation', {"booking_ids": [booking.booking_id for booking in bookings]})
+
+@jobs.handler('booking_confirmation', max_attempts=app.config['EMAIL_MAX_ATTEMPTS'],
+              concurrency=app.config['EMAIL_CONCURRENCY'])
+def send_booking_confirmation(payload):
+    if not mailer.enabled:
+        raise JobFailed("SENDGRID_API_KEY is not set")
+    bookings = (Booking.query
+                .options(selectinload(Booking.user), selectinload(Booking.flight), selectinload(Booking.hotel))
+                .filter(Booking.booking_id.in_(payload['booking_ids']))
+                .order_by(Booking.booking_id)
+                .all())
+    if not bookings:
+        raise JobFailed("Bookings not found")
+    user = bookings[0].user
+    subject, text = booking_confirmation(user, bookings)
+    try:
+        message_id = mailer.send(user.email, subject, text)
+    except MailError as e:
+        raise (RetryJob if e.retryable else JobFailed)(str(e)) from e
+    return {"message_id": message_id}
+
 class Bookings(Resource):
     @jwt_required()
     def get(self):
         user_id = get_jwt_identity()
+        if wants_stream():
+            return stream_response(Booking.query.filter_by(user_id=user_id).order_by(Booking.booking_id))
         bookings = Booking.query.filter_by(user_id=user_id).all()
         return make_response(jsonify([booking.to_dict() for booking in bookings]), 200)
 
     @jwt_required()
+    @idempotency.idempotent
     def post(self):
-        data = request.get_json()
         user_id = get_jwt_identity()
+        try:
+            itinerary = parse_itinerary(request.get_json())
+        except QuoteError as e:
+            return make_response(jsonify({"error": str(e)}), e.status)
+        flight_id, passengers, hotel_id, nights = itinerary
+
+        flight = None
+        if flight_id:
+            # Take the seats in the same transaction as the booking insert
+            if not Flight.reserve_seats(flight_id, passengers):
+                db.session.rollback()
+                if db.session.get(Flight, flight_id) is None:
+                    return make_response(jsonify({"error": "Flight not found"}), 404)
+                return make_response(jsonify({"error": "Not enough seats available"}), 409)
+            flight = db.session.get(Flight, flight_id)
+        # Priced on the server, with the same engine as POST /quotes
+        quote, = quote_itineraries([itinerary])
+        if isinstance(quote, QuoteError):
+            db.session.rollback()
+            return make_response(jsonify({"error": str(quote)}), quote.status)
+
         new_booking = Booking(
             user_id=user_id,
-            flight_id=data.get('flight_id'),
-            hotel_id=data.get('hotel_id'),
-            booking_date=datetime.utcnow()
+            flight_id=flight_id,
+            hotel_id=hotel_id,
+            booking_date=datetime.utcnow(),
+            total_price=quote['total_price'],
+            booking_type='package' if flight_id and hotel_id else ('flight' if flight_id else 'hotel'),
+            booking_status='confirmed'
         )
         db.session.add(new_booking)
+        db.session.flush()
+        queue_booking_confirmation([new_booking])
         db.session.commit()
+        if flight:
+            route_cache.invalidate(route_tag(flight.departure_city, flight.arrival_city))
+            route_index.upsert(flight)
         return make_response(jsonify(new_booking.to_dict()), 201)
 
 api.add_resource(Bookings, '/bookings')
 
+class GroupBookings(Resource):
+    @jwt_required()
+    @idempotency.idempotent
+    def post(self):
+        """Book every itinerary of a trip in one transaction: all of them or none"""
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True)
+        items = data.get('itineraries') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return make_response(jsonify({"error": "itineraries must be a non-empty list"}), 400)
+        if len(items) > app.config['GROUP_BOOKING_MAX_ITINERARIES']:
+            return make_response(jsonify({"error": f"At most {app.config['GROUP_BOOKING_MAX_ITINERARIES']} itineraries per group"}), 400)
+        itineraries = []
+        for index, item in enumerate(items):
+            try:
+                itineraries.append(parse_itinerary(item))
+            except QuoteError as e:
+                return make_response(jsonify({"error": str(e), "index": index}), e.status)
+
+        # Seats for every leg in one conditional UPDATE
+        seats_by_flight = {}
+        for itinerary in itineraries:
+            if itinerary.flight_id:
+                seats_by_flight[itinerary.flight_id] = seats_by_flight.get(itinerary.flight_id, 0) + itinerary.passengers
+        if seats_by_flight and not Flight.reserve_seats_many(seats_by_flight):
+            db.session.rollback()
+            available = dict(db.session.execute(
+                db.select(Flight.flight_id, Flight.seats_available).where(Flight.flight_id.in_(seats_by_flight))
+            ).all())
+            for flight_id, seats in seats_by_flight.items():
+                if flight_id not in available:
+                    return make_response(jsonify({"error": "Flight not found", "flight_id": flight_id}), 404)
+                if available[flight_id] < seats:
+                    return make_response(jsonify({"error": "Not enough seats available", "flight_id": flight_id}), 409)
+            return make_response(jsonify({"error": "Not enough seats available"}), 409)
+
+        quotes = quote_itineraries(itineraries)
+        for index, quote in enumerate(quotes):
+            if isinstance(quote, QuoteError):
+                db.session.rollback()
+                return make_response(jsonify({"error": str(quote), "index": index}), quote.status)
+
+        booked_at = datetime.utcnow()
+        bookings = db.session.scalars(db.insert(Booking).returning(Booking, sort_by_parameter_order=True), [{
+            "user_id": user_id,
+            "flight_id": itinerary.flight_id,
+            "hotel_id": itinerary.hotel_id,
+            "booking_date": booked_at,
+            "total_price": quote['total_price'],
+            "booking_type": 'package' if itinerary.flight_id and itinerary.hotel_id else ('flight' if itinerary.flight_id else 'hotel'),
+            "booking_status": 'confirmed',
+        } for itinerary, quote in zip(itineraries, quotes)]).all()
+        # One saved flight or hotel per distinct id, in request order
+        flight_ids = list(dict.fromkeys(itinerary.flight_id for itinerary in itineraries if itinerary.flight_id))
+        hotel_ids = list(dict.fromkeys(itinerary.hotel_id for itinerary in itineraries if itinerary.hotel_id))
+        user_flights = db.session.scalars(
+            db.insert(UserFlight).returning(UserFlight, sort_by_parameter_order=True),
+            [{"user_id": user_id, "flight_id": flight_id} for flight_id in flight_ids],
+        ).all() if flight_ids else []
+        user_hotels = db.session.scalars(
+            db.insert(UserHotel).returning(UserHotel, sort_by_parameter_order=True),
+            [{"user_id": user_id, "hotel_id": hotel_id} for hotel_id in hotel_ids],
+        ).all() if hotel_ids else []
+        # Serialized before the commit expires the rows
+        body = {
+            "bookings": [booking.to_dict() for booking in bookings],
+            "user_flights": [user_flight.to_dict() for user_flight in user_flights],
+            "user_hotels": [user_hotel.to_dict() for user_hotel in user_hotels],
+            "total_price": sum(quote['total_price'] for quote in quotes),
+        }
+        queue_booking_confirmation(bookings)
+        db.session.commit()
+
+        if flight_ids:
+            flights = Flight.query.filter(Flight.flight_id.in_(flight_ids)).all()
+            route_cache.invalidate(*{route_tag(flight.departure_city, flight.arrival_city) for flight in flights})
+            for flight in flights:
+                route_index.upsert(flight)
+        return make_response(jsonify(body), 201)
+
+api.add_resource(GroupBookings, '/bookings/group')
+
+class Quotes(Resource):
+    def post(self):
+        """Price many candidate itineraries at once; quotes come back in request order"""
+        data = request.get_json(silent=True)
+        itineraries = data.get('itineraries') if isinstance(data, dict) else None
+        if not isinstance(itineraries, list) or not itineraries:
+            return make_response(jsonify({"error": "itineraries must be a non-empty list"}), 400)
+        if len(itineraries) > app.config['QUOTE_MAX_ITINERARIES']:
+            return make_response(jsonify({"error": f"At most {app.config['QUOTE_MAX_ITINERARIES']} itineraries per request"}), 400)
+
+        parsed = []
+        for item in itineraries:
+            try:
+                parsed.append(parse_itinerary(item))
+            except QuoteError as e:
+                parsed.append(e)
+        priced = iter(quote_itineraries([item for item in parsed if not isinstance(item, QuoteError)]))
+        quotes = [item if isinstance(item, QuoteError) else next(priced) for item in parsed]
+        return make_response(jsonify({"quotes": [
+            {"error": str(quote)} if isinstance(quote, QuoteError) else quote for quote in quotes
+        ]}), 200)
+
+api.add_resource(Quotes, '/quotes')
+
 # class UserInfo(Resource):
 #     @jwt_required()
 #     def get(self):
@@ -400,8 +1150,20 @@ class Login(Resource):
         password = data['password']
 
         user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            access_token = create_access_token(identity=user.user_id)
+        try:
+            valid = user is not None and passwords.check(user.password, password)
+        except HashingBusy as e:
+            return busy_response(e)
+        # Move the stored hash to the configured cost on a successful login.
+        # Optional: when the pool is busy it waits for a later login.
+        if valid and passwords.needs_rehash(user.password):
+            try:
+                user.password = passwords.hash(password)
+                db.session.commit()
+            except HashingBusy:
+                pass
+        if valid:
+            access_token = create_user_token(user)
             response = {
                 "token": access_token,
                 "role": user.role,
@@ -422,7 +1184,7 @@ class UserProfile(Resource):
                 "id": user.user_id,
                 "email": user.email,
                 "role": user.role,
-                "name": user.name,  # Adjust according to your User model
+                "name": f"{user.first_name} {user.last_name}",
                 # Add any other fields you want to display
             }
             return jsonify(user_data)
@@ -430,19 +1192,44 @@ class UserProfile(Resource):
 
 api.add_resource(UserProfile, '/user/profile')
 
-def get_mpesa_token():
-
-    consumer_key = 'YXZhAOLvjYqmX7TkAirasXHJfTjUHHqQtIOAGXYTLjjVfvUK'
-    consumer_secret = 'c6SpWnqqHckfRGGGKQt56LKdwIDrMQXeHlGs9PEiSbfGLLAmnbUjc7niS8olHtJ2'
-
-    api_URL = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-
-    # make a get request using python requests liblary
-    r = requests.get(api_URL, auth=HTTPBasicAuth(consumer_key, consumer_secret))
-
-    # return access_token from response
-    return r.json()['access_token']
-
+def stk_push_request(phone, amount):
+    """Daraja's body for an STK push of ``amount`` to ``phone``"""
+    return {
+        "BusinessShortCode": "174379",
+        "Password": "MTc0Mzc5YmZiMjc5ZjlhYTliZGJjZjE1OGU5N2RkNzFhNDY3Y2QyZTBjODkzMDU5YjEwZjc4ZTZiNzJhZGExZWQyYzkxOTIwMTYwMjE2MTY1NjI3",
+        "Timestamp": "20160216165627",
+        "TransactionType": "CustomerPayBillOnline",
+        "Amount": amount,
+        "PartyA": phone,
+        "PartyB": "174379",
+        "PhoneNumber": phone,
+        "CallBackURL": "https://airspace-system-backend-4.vercel.app/mpesa/callback",
+
+        "AccountReference": "Test",
+        "TransactionDesc": "Test"
+    }
+
+# A push interrupted by a dying worker may already be on the customer's phone, so it is not re-sent
+@jobs.handler('stk_push', max_attempts=app.config['STK_PUSH_MAX_ATTEMPTS'],
+              concurrency=app.config['STK_PUSH_CONCURRENCY'], rerun_stale=False)
+def send_stk_push(payload):
+    try:
+        # make request (with a cached access token) and catch response
+        response = mpesa.stk_push(stk_push_request(payload['phone'], payload['amount']))
+    except DarajaError as e:
+        if e.retryable:
+            raise RetryJob(str(e)) from e
+        # The push may have reached the customer's phone; sending it again could charge them twice
+        raise JobFailed(str(e)) from e
+    if response.status_code in (429, 503):
+        # Refused before it was processed
+        raise RetryJob(f"Daraja answered {response.status_code}")
+    if response.status_code > 299:
+        raise JobFailed(f"Daraja answered {response.status_code}: {response.text[:500]}")
+    try:
+        return response.json()
+    except ValueError:
+        raise JobFailed(f"Daraja answered with invalid JSON: {response.text[:500]}")
 
 class MakeSTKPush(Resource):
     parser = reqparse.RequestParser()
@@ -456,72 +1243,52 @@ class MakeSTKPush(Resource):
                         required=True,
                         help="This field is required")
 
+    @idempotency.idempotent
     def post(self):
-        """Make an STK push to Daraja API"""
+        """Queue an STK push to Daraja API; poll the returned job for its outcome"""
 
         # get phone and amount from request body
         data = MakeSTKPush.parser.parse_args()
 
-        # encode business_shortcode, online_passkey and current_time (yyyyMMhhmmss) to base64
-        encode_data = b"<Business_shortcode><online_passkey><current timestamp>"
-        passkey = base64.b64encode(encode_data)
-
-        # make stk push
-        try:
-            # get access_token
-            access_token = get_mpesa_token()
-
-            # stk_push request url
-            api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-
-            # put access_token in request headers
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-
-            # define request body
-            request = {
-                "BusinessShortCode": "174379",
-                "Password": "MTc0Mzc5YmZiMjc5ZjlhYTliZGJjZjE1OGU5N2RkNzFhNDY3Y2QyZTBjODkzMDU5YjEwZjc4ZTZiNzJhZGExZWQyYzkxOTIwMTYwMjE2MTY1NjI3",
-                "Timestamp": "20160216165627",
-                "TransactionType": "CustomerPayBillOnline",
-                "Amount": data["amount"],
-                "PartyA": data["phone"],
-                "PartyB": "174379",
-                "PhoneNumber": data["phone"],
-                "CallBackURL": "https://airspace-system-backend-4.vercel.app/mpesa/callback",
-
-                "AccountReference": "Test",
-                "TransactionDesc": "Test"
-            }
-
-            # make request and catch response
-            response = requests.post(api_url, json=request, headers=headers)
-
-            # check response code for errors and return response
-            if response.status_code > 299:
-                return {
-                    "success": False,
-                    "message": "Sorry, something went wrong please try again later."
-                }, 400
-
-            
-            # return a response to your user
-            return {
-                "data": json.loads(response.text)
-            }, 200
-
-        except:
-            # catch error and return response
-            return {
-                "success": False,
-                "message": "Sorry something went wrong please try again."
-            }, 400
+        job = jobs.enqueue('stk_push', {"phone": data["phone"], "amount": data["amount"]})
+        db.session.commit()
+        response = make_response(jsonify({"job_id": job.job_id, "status": job.status}), 202)
+        response.headers['Location'] = url_for('jobstatus', job_id=job.job_id)
+        return response
 
 
 # stk push path [POST request to {baseURL}/stkpush]
 api.add_resource(MakeSTKPush, "/stkpush")
 
+class JobStatus(Resource):
+    def get(self, job_id):
+        """Status of a background job; the id is unguessable, so it is the only credential"""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return make_response(jsonify({"error": "Job not found"}), 404)
+        return make_response(jsonify(job.to_dict()), 200)
+
+api.add_resource(JobStatus, '/jobs/<string:job_id>')
+
+@app.cli.command('run-worker')
+@click.option('--concurrency', type=int, default=None, help="Jobs run at once by this worker.")
+@click.option('--poll-interval', type=float, default=None, help="Seconds between polls while the queue is empty.")
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(sorted(jobs.handlers)), help="Only run these kinds of job.")
+@click.option('--once', is_flag=True, help="Exit once no job is due instead of polling.")
+def run_worker_command(concurrency, poll_interval, kinds, once):
+    """Run queued background jobs (STK pushes, confirmation emails)."""
+    worker = Worker(app, jobs,
+                    concurrency=concurrency or app.config['JOB_WORKER_CONCURRENCY'],
+                    poll_interval=poll_interval or app.config['JOB_POLL_SECONDS'],
+                    kinds=kinds)
+    click.echo(f"Worker {worker.worker_id} running {', '.join(worker.kinds)} jobs, {worker.concurrency} at a time")
+    worker.run(once=once)
+
+@app.cli.command('requeue-dead-jobs')
+@click.option('--kind', type=click.Choice(sorted(jobs.handlers)), help="Only requeue this kind of job.")
+def requeue_dead_jobs_command(kind):
+    """Give dead jobs a fresh set of attempts."""
+    click.echo(f"Requeued {jobs.requeue_dead(kind)} jobs")
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,431 @@
+"""Endpoint benchmark suite.
+
+Builds a synthetic database (see ``dataset.py``), then drives every
+resource in app.py either in-process through the Flask test client or over
+HTTP against a real gunicorn server, and reports p50/p99 latency and
+throughput per scenario.
+
+    python benchmark.py --rows 10k --target client --save benchmarks/client-10k.json
+    python benchmark.py --rows 10k --target gunicorn --workers 4 --concurrency 8 \\
+        --compare benchmarks/gunicorn-10k.json
+
+``--compare`` exits with status 1 when any scenario's p50 or p99 is more
+than ``--tolerance`` times its baseline (and at least ``--min-delta-ms``
+slower). The database defaults to a fresh
+SQLite file; set ``DATABASE_URI`` to benchmark PostgreSQL instead.
+
+``--mixed`` runs the selected scenarios interleaved through one pool
+instead of one after another, which measures lock contention between
+concurrent readers and writers:
+
+    python benchmark.py --target gunicorn --workers 4 --concurrency 16 --mixed \
+        --only flights.list,hotels.get,bookings.list,bookings.create,hotels.patch
+
+DELETE endpoints and ``/stkpush`` (which queues real M-Pesa pushes) are not driven.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+DEFAULT_DATABASE = os.path.join(tempfile.gettempdir(), 'airescape-benchmark.db')
+
+
+class Scenario:
+    def __init__(self, name, method, build, token=None, expect=(200,), share=1.0):
+        self.name = name
+        self.method = method
+        # rng -> (url, json body or raw (content type, bytes), or None), or a list of
+        # (url, body) steps that are sent one after another and timed together
+        self.build = build
+        self.token = token  # 'admin', 'traveler' or None
+        self.expect = expect
+        self.share = share  # Fraction of --requests to run, for expensive endpoints
+
+
+def scenarios(dataset, admin_email):
+    counts = dataset.counts
+    days = [(dataset.start + timedelta(days=i)).isoformat() for i in range(dataset.days)]
+    months = sorted({day[:7] for day in days})
+    unique = iter(range(10 ** 9))
+
+    def flight_id(rng):
+        return rng.randint(1, counts['flights'])
+
+    def hotel_id(rng):
+        return rng.randint(1, counts['hotels'])
+
+    def new_flight(rng):
+        day = rng.choice(days)
+        return {
+            "flight_number": f"BENCH{os.getpid()}-{next(unique)}", "departure_city": "Nairobi",
+            "arrival_city": "Kisumu", "departure_date": day, "arrival_date": day,
+            "departure_time": "10:00:00", "arrival_time": "11:00:00", "price": 7000,
+            "seats_available": 100, "trip_type": "oneway",
+        }
+
+    def group_trip(rng, legs=4):
+        return [{"flight_id": flight_id(rng), "passengers": 2, "hotel_id": hotel_id(rng), "nights": 2}
+                for _ in range(legs)]
+
+    def import_body(rng):
+        lines = [json.dumps(new_flight(rng)) for _ in range(50)]
+        return ('application/x-ndjson', '\n'.join(lines).encode('utf-8'))
+
+    return [
+        Scenario('index', 'GET', lambda rng: ('/', None)),
+        Scenario('users.list', 'GET', lambda rng: ('/users?limit=50', None)),
+        Scenario('users.create', 'POST', lambda rng: ('/users', {
+            "first_name": "Bench", "last_name": "User", "email": f"bench{os.getpid()}-{next(unique)}@example.com",
+            "password": "password", "phone_number": "0712345678",
+        }), expect=(201,), share=0.1),
+        Scenario('users.get', 'GET', lambda rng: (f"/users/{rng.randint(1, counts['users'])}?expand=bookings", None), token='admin'),
+        Scenario('users.patch', 'PATCH', lambda rng: ('/users/2', {"title": rng.choice(["Mr", "Ms", "Dr"])}), token='traveler'),
+        Scenario('login', 'POST', lambda rng: ('/login/email', {"email": admin_email, "password": "password"}), share=0.1),
+        Scenario('profile', 'GET', lambda rng: ('/user/profile', None), token='traveler'),
+        Scenario('flights.list', 'GET', lambda rng: ('/flights?limit=50', None)),
+        Scenario('flights.list_by_price', 'GET', lambda rng: ('/flights?limit=50&sort=price', None)),
+        Scenario('flights.search', 'GET', lambda rng: (
+            f"/flights?from=Nairobi&to=Mombasa&outboundDate={rng.choice(days)}", None)),
+        Scenario('flights.search_roundtrip', 'GET', lambda rng: (
+            f"/flights?from=Nairobi&to=Kisumu&tripType=roundtrip&outboundDate={rng.choice(days)}"
+            f"&returnDate={rng.choice(days)}", None)),
+        Scenario('flights.create', 'POST', lambda rng: ('/flights', new_flight(rng)), token='admin', expect=(201,)),
+        Scenario('flights.import', 'POST', lambda rng: ('/flights/import', import_body(rng)), token='admin', share=0.2),
+        Scenario('flights.connections', 'GET', lambda rng: (
+            f"/flights/connections?from=Kisumu&to=Lamu&outboundDate={rng.choice(days)}&maxStops=2", None)),
+        Scenario('flights.calendar', 'GET', lambda rng: (
+            f"/flights/calendar?from=Nairobi&to=Mombasa&month={rng.choice(months)}", None)),
+        Scenario('flights.get', 'GET', lambda rng: (f"/flights/{flight_id(rng)}", None)),
+        Scenario('flights.patch', 'PATCH', lambda rng: (f"/flights/{flight_id(rng)}", {"price": rng.randint(3000, 30000)}),
+                 token='admin'),
+        Scenario('flights.cache', 'GET', lambda rng: ('/flights/cache', None), token='admin'),
+        Scenario('hotels.list', 'GET', lambda rng: ('/hotels?limit=50', None)),
+        Scenario('hotels.filter', 'GET', lambda rng: ('/hotels?amenities=wifi,pool&facets=1&limit=20', None)),
+        Scenario('hotels.create', 'POST', lambda rng: ('/hotels', {
+            "name": f"Bench Hotel {next(unique)}", "location": "Nairobi", "price_per_night": 9000,
+            "image_url": "https://example.com/hotel.jpg", "amenities": "Free WiFi, Pool, Gym",
+        }), token='admin', expect=(201,)),
+        Scenario('hotels.search', 'GET', lambda rng: (f"/hotels/search?q={rng.choice(['beach', 'nairobi spa', 'pool', 'lodge'])}", None)),
+        Scenario('hotels.get', 'GET', lambda rng: (f"/hotels/{hotel_id(rng)}", None)),
+        Scenario('hotels.patch', 'PATCH', lambda rng: (f"/hotels/{hotel_id(rng)}", {"price_per_night": rng.randint(3000, 30000)}),
+                 token='admin'),
+        Scenario('user_flights.list', 'GET', lambda rng: ('/user/flights', None), token='traveler'),
+        Scenario('user_flights.create', 'POST', lambda rng: ('/user/flights', {"flight_id": flight_id(rng)}),
+                 token='traveler', expect=(201,)),
+        Scenario('user_hotels.list', 'GET', lambda rng: ('/user/hotels', None), token='traveler'),
+        Scenario('user_hotels.create', 'POST', lambda rng: ('/user/hotels', {"hotel_id": hotel_id(rng)}),
+                 token='traveler', expect=(201,)),
+        Scenario('bookings.list', 'GET', lambda rng: ('/bookings', None), token='traveler'),
+        Scenario('bookings.create', 'POST', lambda rng: ('/bookings', {"hotel_id": hotel_id(rng), "nights": 2}),
+                 token='traveler', expect=(201,)),
+        # Some generated flights are sold out, so a four-leg trip is sometimes refused
+        Scenario('bookings.group', 'POST', lambda rng: ('/bookings/group', {"itineraries": group_trip(rng)}),
+                 token='traveler', expect=(201, 409)),
+        # The same trip booked the way clients had to before /bookings/group
+        Scenario('bookings.group_per_row', 'POST', lambda rng: [
+            step for itinerary in group_trip(rng) for step in (
+                ('/bookings', itinerary),
+                ('/user/flights', {"flight_id": itinerary['flight_id']}),
+                ('/user/hotels', {"hotel_id": itinerary['hotel_id']}),
+            )
+        ], token='traveler', expect=(201, 409)),
+        Scenario('quotes.batch', 'POST', lambda rng: ('/quotes', {"itineraries": [
+            {"flight_id": flight_id(rng), "passengers": rng.randint(1, 4), "hotel_id": hotel_id(rng), "nights": rng.randint(1, 7)}
+            for _ in range(100)
+        ]})),
+        Scenario('admin.slow_queries', 'GET', lambda rng: ('/admin/slow-queries?limit=20', None), token='admin'),
+        Scenario('metrics', 'GET', lambda rng: ('/metrics', None)),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, wall):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+    }
+
+
+class ClientTarget:
+    """Runs requests in-process through the Flask test client."""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+
+    def request(self, method, url, body, headers):
+        kwargs = {'headers': headers}
+        if isinstance(body, tuple):
+            kwargs.update(content_type=body[0], data=body[1])
+        elif body is not None:
+            kwargs['json'] = body
+        return self.client.open(url, method=method, **kwargs).status_code
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """Runs requests over HTTP against a gunicorn server started for the run."""
+
+    def __init__(self, workers, env):
+        import requests
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f"127.0.0.1:{port}",
+             '--log-level', 'warning', 'app:app'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        )
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=64)
+        self.session.mount('http://', adapter)
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                self.session.get(self.base_url + '/', timeout=5)
+                break
+            except requests.RequestException:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+    def request(self, method, url, body, headers):
+        kwargs = {'headers': dict(headers)}
+        if isinstance(body, tuple):
+            kwargs['headers']['Content-Type'] = body[0]
+            kwargs['data'] = body[1]
+        elif body is not None:
+            kwargs['json'] = body
+        return self.session.request(method, self.base_url + url, timeout=60, **kwargs).status_code
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+def run_scenario(target, scenario, tokens, count, concurrency, warmup, seed):
+    rng = random.Random(f"{seed}:{scenario.name}")
+    headers = {'Authorization': f"Bearer {tokens[scenario.token]}"} if scenario.token else {}
+    calls = [scenario.build(rng) for _ in range(warmup + count)]
+
+    def call(args):
+        started = time.perf_counter()
+        if isinstance(args, list):
+            statuses = [target.request(scenario.method, url, body, headers) for url, body in args]
+            status = next((status for status in statuses if status not in scenario.expect), statuses[-1])
+        else:
+            url, body = args
+            status = target.request(scenario.method, url, body, headers)
+        return time.perf_counter() - started, status
+
+    for args in calls[:warmup]:
+        call(args)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(call, calls[warmup:]))
+    else:
+        results = [call(args) for args in calls[warmup:]]
+    wall = time.perf_counter() - started
+    errors = sum(1 for _, status in results if status not in scenario.expect)
+    return summarize([latency for latency, _ in results], errors, wall)
+
+
+def run_mixed(target, selected, tokens, count, concurrency, warmup, seed):
+    """Run all ``selected`` scenarios interleaved through one pool, so reads and writes overlap."""
+    rng = random.Random(f"{seed}:mixed")
+    warm, measured = [], []
+    for scenario in selected:
+        scenario_rng = random.Random(f"{seed}:{scenario.name}")
+        headers = {'Authorization': f"Bearer {tokens[scenario.token]}"} if scenario.token else {}
+        warm.extend((scenario, headers, scenario.build(scenario_rng)) for _ in range(warmup))
+        measured.extend((scenario, headers, scenario.build(scenario_rng))
+                        for _ in range(max(1, int(count * scenario.share))))
+    rng.shuffle(warm)
+    rng.shuffle(measured)
+
+    def call(args):
+        scenario, headers, steps = args
+        if not isinstance(steps, list):
+            steps = [steps]
+        started = time.perf_counter()
+        statuses = [target.request(scenario.method, url, body, headers) for url, body in steps]
+        status = next((status for status in statuses if status not in scenario.expect), statuses[-1])
+        return scenario, time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, warm))
+        started = time.perf_counter()
+        results = list(pool.map(call, measured))
+    wall = time.perf_counter() - started
+    summaries = {}
+    for scenario in selected:
+        mine = [(latency, status) for s, latency, status in results if s is scenario]
+        errors = sum(1 for _, status in mine if status not in scenario.expect)
+        summaries[scenario.name] = summarize([latency for latency, _ in mine], errors, wall)
+    return summaries
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print the change against ``baseline`` and return the regressed scenario names."""
+    regressions = []
+    print(f"\n{'scenario':<26}{'p50 base':>10}{'p50 now':>10}{'p99 base':>10}{'p99 now':>10}")
+    for name, now in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            print(f"{name:<26}{'(new)':>10}")
+            continue
+        flag = ''
+        # Sub-millisecond jitter on fast endpoints is not a regression
+        slower = [key for key in ('p50_ms', 'p99_ms')
+                  if now[key] > base[key] * tolerance and now[key] - base[key] >= min_delta_ms]
+        if slower:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<26}{base['p50_ms']:>10.2f}{now['p50_ms']:>10.2f}{base['p99_ms']:>10.2f}{now['p99_ms']:>10.2f}{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', default='10k', help="Dataset size: 10k, 100k, 1m, 10m or a number")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start', type=date.fromisoformat, default=date.today(),
+                        help="First day of the generated schedule (default today, since the connections "
+                             "index only keeps upcoming flights in memory); pass the same date with --reuse")
+    parser.add_argument('--target', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    parser.add_argument('--concurrency', type=int, default=1, help="Concurrent requests (gunicorn target)")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario")
+    parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument('--only', help="Comma-separated scenario names or prefixes")
+    parser.add_argument('--mixed', action='store_true',
+                        help="Run the selected scenarios interleaved and concurrently instead of one after another")
+    parser.add_argument('--reuse', action='store_true', help="Keep the existing database instead of regenerating it")
+    parser.add_argument('--save', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="Allowed slowdown factor against the baseline")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DATABASE_URI', f"sqlite:///{DEFAULT_DATABASE}")
+    # Slow-query capture would skew the numbers it is measuring
+    os.environ.setdefault('SLOW_QUERY_MS', '60000')
+    from flask_migrate import upgrade
+    from app import app, db, passwords
+    from models import User
+    import dataset as datasets
+
+    rows = datasets.parse_rows(args.rows)
+    dataset = datasets.Dataset(rows, seed=args.seed, start=args.start)
+    with app.app_context():
+        if not args.reuse:
+            if db.engine.dialect.name == 'sqlite' and os.path.exists(db.engine.url.database or ''):
+                os.remove(db.engine.url.database)
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+            dataset.password_hash = passwords.hash('password')
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                datasets.write(connection, dataset, drop_indexes=rows >= 100000)
+            print(f"Generated {rows} rows in {time.perf_counter() - started:.1f}s")
+        emails = {'admin': db.session.get(User, 1).email, 'traveler': db.session.get(User, 2).email}
+        db.session.remove()
+
+    if args.target == 'gunicorn':
+        target = GunicornTarget(args.workers, dict(os.environ))
+    else:
+        target = ClientTarget(app)
+    try:
+        tokens = {}
+        for role, email in emails.items():
+            url, body = '/login/email', {"email": email, "password": "password"}
+            if isinstance(target, ClientTarget):
+                tokens[role] = target.client.post(url, json=body).json['token']
+            else:
+                tokens[role] = target.session.post(target.base_url + url, json=body).json()['token']
+
+        selected = scenarios(dataset, emails['admin'])
+        if args.only:
+            prefixes = [name.strip() for name in args.only.split(',')]
+            selected = [s for s in selected if any(s.name == p or s.name.startswith(p + '.') for p in prefixes)]
+
+        results = {
+            'meta': {
+                'rows': rows, 'seed': args.seed, 'start': args.start.isoformat(), 'target': args.target,
+                'workers': args.workers if args.target == 'gunicorn' else None,
+                'concurrency': args.concurrency if args.target == 'gunicorn' else 1, 'mixed': args.mixed,
+                'requests': args.requests, 'database': os.environ['DATABASE_URI'].split(':', 1)[0],
+                'commit': git_commit(), 'python': platform.python_version(),
+                'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            },
+            'scenarios': {},
+        }
+        concurrency = args.concurrency if args.target == 'gunicorn' else 1
+        print(f"\n{'scenario':<26}{'reqs':>6}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        if args.mixed:
+            mixed = run_mixed(target, selected, tokens, args.requests, concurrency, args.warmup, args.seed)
+        for scenario in selected:
+            if args.mixed:
+                summary = mixed[scenario.name]
+            else:
+                count = max(1, int(args.requests * scenario.share))
+                summary = run_scenario(target, scenario, tokens, count, concurrency, args.warmup, args.seed)
+            results['scenarios'][scenario.name] = summary
+            print(f"{scenario.name:<26}{summary['requests']:>6}{summary['errors']:>8}{summary['p50_ms']:>10.2f}"
+                  f"{summary['p99_ms']:>10.2f}{summary['throughput_rps']:>10.1f}")
+    finally:
+        target.close()
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) slower than {args.tolerance}x baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""SQL statements and latency of admin-only endpoints, by how the caller's role is found.
+
+Generates ``--rows`` synthetic rows in a scratch SQLite file, or the one
+given with ``--database`` (see scratch.py; all its data is replaced), logs
+in as the generated admin (user 1) and
+calls each admin endpoint ``--requests`` times through the Flask test
+client, counting statements with the metrics hooks (``g.db_statements``):
+
+* ``lookup``: the users row read on every request, as ``admin_required``
+  did before the role claim (a role cache that expires immediately);
+* ``cache``: the default without a shared store, the role read once and
+  then kept for ``ROLE_CACHE_TTL`` seconds;
+* ``claim``: with a shared record of role changes (``ROUTE_CACHE_URL``,
+  here fakeredis), the token's role claim trusted outright.
+
+    python benchmarks/admin_queries.py --rows 10k --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from flask import g
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scratch  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', default='10k', help="Dataset size: 10k, 100k, 1m or a number")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and mode")
+    parser.add_argument('--seed', type=int, default=42)
+    scratch.add_arguments(parser, 'airescape-admin-queries.db')
+    args = parser.parse_args(argv)
+
+    scratch.use_database(args)
+    os.environ.setdefault('SLOW_QUERY_MS', '60000')
+    os.environ['ROUTE_CACHE_URL'] = ''
+    from flask_migrate import upgrade
+    import app as app_module
+    from app import app, db, passwords
+    from cache import RedisTTLMap, TTLCache
+    from models import Flight, Hotel, User
+    import dataset as datasets
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite' and os.path.exists(db.engine.url.database or ''):
+            os.remove(db.engine.url.database)
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        dataset = datasets.Dataset(datasets.parse_rows(args.rows), seed=args.seed,
+                                   password_hash=passwords.hash('password'))
+        with db.engine.begin() as connection:
+            datasets.clear(connection)
+            datasets.write(connection, dataset)
+        email = db.session.get(User, 1).email
+        flight = db.session.scalars(db.select(Flight).limit(1)).one()
+        hotel = db.session.scalars(db.select(Hotel).limit(1)).one()
+        endpoints = [
+            ('GET', '/flights/cache', None),
+            ('GET', '/admin/slow-queries', None),
+            ('GET', '/users/3', None),
+            ('PATCH', f'/flights/{flight.flight_id}', {"price": flight.price}),
+            ('PATCH', f'/hotels/{hotel.hotel_id}', {"price_per_night": hotel.price_per_night}),
+        ]
+        db.session.remove()
+
+    client = app.test_client()
+    token = client.post('/login/email', json={"email": email, "password": "password"}).get_json()['token']
+    headers = {'Authorization': f"Bearer {token}"}
+
+    try:
+        import fakeredis
+    except ImportError:
+        fakeredis = None
+    modes = [
+        ('lookup', TTLCache(ttl=0), None),
+        ('cache', TTLCache(maxsize=4096, ttl=app.config['ROLE_CACHE_TTL']), None),
+    ]
+    if fakeredis is not None:
+        modes.append(('claim', TTLCache(maxsize=4096, ttl=app.config['ROLE_CACHE_TTL']),
+                      RedisTTLMap(fakeredis.FakeRedis(), prefix='rolechange:')))
+    else:
+        print("fakeredis is not installed; skipping the claim mode")
+
+    results = []
+    for mode, role_cache, role_changes in modes:
+        app_module.role_cache, app_module.role_changes = role_cache, role_changes
+        for method, path, body in endpoints:
+            call = lambda: client.open(path, method=method, json=body, headers=headers)
+            call()  # Warm-up, so a cached role is in place
+            timings = []
+            statements = []
+            for _ in range(args.requests):
+                with client:
+                    started = time.perf_counter()
+                    response = call()
+                    timings.append((time.perf_counter() - started) * 1000)
+                    statements.append(g.db_statements)
+                if response.status_code != 200:
+                    raise SystemExit(f"{method} {path} answered {response.status_code}: {response.get_data(as_text=True)}")
+            results.append((mode, f"{method} {path}", statistics.mean(statements), statistics.median(timings)))
+
+    print(f"{'mode':<8}{'endpoint':<28}{'statements':>12}{'p50 ms':>10}")
+    for mode, endpoint, statements, p50 in results:
+        print(f"{mode:<8}{endpoint:<28}{statements:>12.1f}{p50:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Route + date flight search with and without the route/departure index.
+
+Loads ``--flights`` synthetic flights (default 1M) into a scratch SQLite
+file, or the one given with ``--database`` (see scratch.py; its flights are
+deleted), and runs the outbound search of
+``GET /flights`` for the same random (route, day) pairs three ways:
+
+* ``before``: ``date(departure_date) = :day``, the filter search used to
+  have, without ``ix_flights_route_departure`` (dropped for this run and
+  created again afterwards), as before the index was added: a full scan;
+* ``date()``: the same filter with the index, which can only use its
+  route prefix and checks every departure on the route;
+* ``range``: ``departs_on(day)`` from app.py, a half-open range on the bare
+  column, answered from the index alone.
+
+    python benchmarks/flight_search.py --flights 1m
+    python benchmarks/flight_search.py --reuse --searches 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scratch  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', default='1m', help="Number of flights: 100k, 1m, 10m or a number")
+    parser.add_argument('--searches', type=int, default=200, help="Searches per variant")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse', action='store_true', help="Keep the existing database instead of regenerating it")
+    scratch.add_arguments(parser, 'airescape-flight-search.db')
+    args = parser.parse_args(argv)
+
+    scratch.use_database(args)
+    os.environ.setdefault('SLOW_QUERY_MS', '60000')
+    from flask_migrate import upgrade
+    from app import app, db, departs_on
+    from bulk_load import load_tables
+    from models import Flight
+    import dataset as datasets
+
+    flights = datasets.parse_rows(args.flights)
+    dataset = datasets.Dataset(int(flights / datasets.PROPORTIONS['flights']), seed=args.seed)
+    with app.app_context():
+        if not args.reuse:
+            if db.engine.dialect.name == 'sqlite' and os.path.exists(db.engine.url.database or ''):
+                os.remove(db.engine.url.database)
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                connection.execute(db.delete(Flight))
+                load_tables(connection, [(Flight.__table__, dataset.flights())], drop=True)
+            print(f"Loaded {dataset.counts['flights']} flights in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(args.seed)
+        cities = list(datasets.CITIES)
+        searches = [(*rng.sample(cities, 2), dataset.start + timedelta(days=rng.randrange(dataset.days)))
+                    for _ in range(args.searches)]
+        by_date = lambda day: (db.func.date(Flight.departure_date) == day.isoformat(),)
+        variants = [('before', by_date, False), ('date()', by_date, True), ('range', departs_on, True)]
+        columns = [Flight.flight_id, Flight.departure_time, Flight.price, Flight.seats_available]
+        index = next(index for index in Flight.__table__.indexes if index.name == 'ix_flights_route_departure')
+
+        def search(connection, day_filter, origin, destination, day):
+            return connection.execute(db.select(*columns).where(
+                Flight.departure_city == origin, Flight.arrival_city == destination, *day_filter(day),
+            )).all()
+
+        results = []
+        with db.engine.connect() as connection:
+            for name, day_filter, indexed in variants:
+                # checkfirst: a run that was interrupted may have left it dropped
+                if indexed:
+                    index.create(connection, checkfirst=True)
+                else:
+                    index.drop(connection, checkfirst=True)
+                connection.commit()
+                origin, destination, day = searches[0]
+                query = db.select(*columns).where(
+                    Flight.departure_city == origin, Flight.arrival_city == destination, *day_filter(day))
+                explain = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+                compiled = query.compile(connection, compile_kwargs={'literal_binds': True})
+                print(f"\n{name} plan:")
+                for row in connection.exec_driver_sql(explain + str(compiled)).all():
+                    print(f"  {row[-1]}")
+                timings = []
+                rows = 0
+                for origin, destination, day in searches:
+                    started = time.perf_counter()
+                    rows += len(search(connection, day_filter, origin, destination, day))
+                    timings.append((time.perf_counter() - started) * 1000)
+                connection.rollback()
+                results.append((name, len(timings), rows, statistics.median(timings), percentile(timings, 0.99)))
+
+        print(f"\n{'variant':<10}{'searches':>10}{'rows':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, count, rows, p50, p99 in results:
+            print(f"{name:<10}{count:>10}{rows:>8}{p50:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
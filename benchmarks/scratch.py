@@ -0,0 +1,40 @@
+"""The database a benchmark script may wipe.
+
+The scripts here delete and reload data, so they never use ``DATABASE_URI``
+(a deployment's ``.env`` points it at real data). They take ``--database``
+or ``BENCHMARK_DATABASE_URI`` instead, defaulting to a scratch SQLite file
+in the temp directory, and refuse any other database unless
+``--yes-destroy`` is given.
+"""
+import os
+import tempfile
+
+from sqlalchemy.engine import make_url
+
+
+def add_arguments(parser, filename):
+    default = os.environ.get('BENCHMARK_DATABASE_URI') or f"sqlite:///{os.path.join(tempfile.gettempdir(), filename)}"
+    parser.add_argument('--database', default=default,
+                        help="Database to wipe and load (default: BENCHMARK_DATABASE_URI or a scratch SQLite file)")
+    parser.add_argument('--yes-destroy', action='store_true',
+                        help="Allow a database other than a SQLite file in the temp directory; its data is deleted")
+
+
+def is_scratch(uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return False
+    scratch = os.path.realpath(tempfile.gettempdir())
+    return os.path.commonpath([os.path.realpath(url.database), scratch]) == scratch
+
+
+def use_database(args):
+    """Point the app at ``args.database``, or exit if it may hold data worth keeping.
+
+    Call before importing the app, which reads ``DATABASE_URI`` on import.
+    """
+    if not args.yes_destroy and not is_scratch(args.database):
+        shown = make_url(args.database).render_as_string(hide_password=True)
+        raise SystemExit(f"Refusing to wipe {shown}: not a SQLite file in {tempfile.gettempdir()}. "
+                         "Pass --yes-destroy if its data may be deleted.")
+    os.environ['DATABASE_URI'] = args.database
@@ -0,0 +1,138 @@
+"""STK pushes per second: token-per-push versus the pooled Daraja client.
+
+Runs a local stub of the Daraja OAuth and STK push endpoints, with
+``--token-ms`` and ``--push-ms`` of simulated latency, and sends
+``--pushes`` pushes from ``--concurrency`` threads two ways:
+
+* ``before``: what ``/stkpush`` used to do, a fresh OAuth request and then
+  the push, each with a plain ``requests`` call on a new connection;
+* ``after``: ``DarajaClient.stk_push``, as the job worker does now, with a
+  cached token and a pooled keep-alive session.
+
+    python benchmarks/stk_push.py --pushes 300 --concurrency 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from daraja import DarajaClient  # noqa: E402
+
+PUSH = {"BusinessShortCode": "174379", "Amount": "1", "PhoneNumber": "254708374149"}
+
+
+class Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, token_seconds, push_seconds):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.token_seconds = token_seconds
+        self.push_seconds = push_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {'connections': 0, 'tokens': 0, 'pushes': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def process_request_thread(self, request, client_address):
+        self.count('connections')
+        super().process_request_thread(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so a pooled client can reuse its connections
+    # Headers and body go out in separate writes; with Nagle on, keep-alive
+    # responses would stall on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count('tokens')
+        time.sleep(self.server.token_seconds)
+        self._send({"access_token": "token", "expires_in": "3599"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.count('pushes')
+        time.sleep(self.server.push_seconds)
+        self._send({"CheckoutRequestID": "ws_CO_1", "ResponseCode": "0"})
+
+    def _send(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def token_per_push(base_url):
+    """The push as /stkpush made it before the Daraja client."""
+    def push():
+        r = requests.get(f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
+                         auth=HTTPBasicAuth('key', 'secret'))
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}", "Content-Type": "application/json"}
+        return requests.post(f"{base_url}/mpesa/stkpush/v1/processrequest", json=PUSH, headers=headers)
+    return push
+
+
+def pooled_client(base_url, concurrency):
+    client = DarajaClient(base_url, 'key', 'secret', pool_size=concurrency)
+    return lambda: client.stk_push(PUSH)
+
+
+def run(push, pushes, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(lambda _: push().status_code, range(pushes)))
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(status != 200 for status in statuses)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pushes', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--token-ms', type=float, default=20, help="Simulated latency of the OAuth request")
+    parser.add_argument('--push-ms', type=float, default=5, help="Simulated latency of the STK push")
+    args = parser.parse_args(argv)
+
+    stub = Stub(args.token_ms / 1000, args.push_ms / 1000)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    variants = {
+        'before': token_per_push(stub.url),
+        'after': pooled_client(stub.url, args.concurrency),
+    }
+    print(f"{'variant':<10}{'pushes':>8}{'errors':>8}{'pushes/s':>10}{'tokens':>8}{'connections':>13}")
+    try:
+        for name, push in variants.items():
+            stub.reset()
+            elapsed, errors = run(push, args.pushes, args.concurrency)
+            print(f"{name:<10}{args.pushes:>8}{errors:>8}{args.pushes / elapsed:>10.1f}"
+                  f"{stub.counts['tokens']:>8}{stub.counts['connections']:>13}")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Peak memory and time to first byte of a full flight listing, streamed or built whole.
+
+Loads ``--flights`` synthetic flights (default 500,000) into a scratch SQLite
+file, or the one given with ``--database`` (see scratch.py; its flights are
+deleted), then reads every flight in a fresh child process per variant, so
+each peak RSS is its own:
+
+* ``before``: ``jsonify([f.to_dict() for f in Flight.query.all()])``, the
+  whole list and body in memory before the first byte, as the listing
+  was without ``?stream=1``;
+* ``stream``: ``GET /flights?stream=1`` through the Flask test client,
+  reading the NDJSON body chunk by chunk as a client would.
+
+    python benchmarks/stream_memory.py --flights 500000
+    python benchmarks/stream_memory.py --reuse
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scratch  # noqa: E402
+
+VARIANTS = ('before', 'stream')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(variant):
+    """Runs one variant in this process and prints its numbers as JSON."""
+    from flask import jsonify
+    from app import app
+    from models import Flight
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    if variant == 'before':
+        with app.test_request_context('/flights'):
+            response = jsonify([f.to_dict() for f in Flight.query.all()])
+            for chunk in response.iter_encoded():
+                first_byte = first_byte or time.perf_counter() - started
+                size += len(chunk)
+    else:
+        response = app.test_client().get('/flights?stream=1', buffered=False)
+        for chunk in response.iter_encoded():
+            first_byte = first_byte or time.perf_counter() - started
+            size += len(chunk)
+        response.close()
+    print(json.dumps({
+        'baseline_mb': baseline, 'peak_mb': peak_rss_mb(), 'first_byte_s': first_byte,
+        'total_s': time.perf_counter() - started, 'body_mb': size / 1024 / 1024,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', default='500000', help="Number of flights: 100k, 1m or a number")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse', action='store_true', help="Keep the existing database instead of regenerating it")
+    parser.add_argument('--measure', choices=VARIANTS, help=argparse.SUPPRESS)
+    scratch.add_arguments(parser, 'airescape-stream-memory.db')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SLOW_QUERY_MS', '60000')
+    if args.measure:
+        # DATABASE_URI comes from the parent, which checked it
+        return measure(args.measure)
+    scratch.use_database(args)
+
+    if not args.reuse:
+        from flask_migrate import upgrade
+        from app import app, db
+        from bulk_load import load_tables
+        from models import Flight
+        import dataset as datasets
+
+        flights = datasets.parse_rows(args.flights)
+        dataset = datasets.Dataset(int(flights / datasets.PROPORTIONS['flights']), seed=args.seed)
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite' and os.path.exists(db.engine.url.database or ''):
+                os.remove(db.engine.url.database)
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                connection.execute(db.delete(Flight))
+                load_tables(connection, [(Flight.__table__, dataset.flights())], drop=True)
+            print(f"Loaded {dataset.counts['flights']} flights in {time.perf_counter() - started:.1f}s")
+
+    print(f"\n{'variant':<10}{'start MB':>10}{'peak MB':>10}{'first byte s':>14}{'total s':>10}{'body MB':>10}")
+    for variant in VARIANTS:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', variant],
+                                check=True, capture_output=True, text=True, env=os.environ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{variant:<10}{result['baseline_mb']:>10.0f}{result['peak_mb']:>10.0f}"
+              f"{result['first_byte_s']:>14.2f}{result['total_s']:>10.2f}{result['body_mb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
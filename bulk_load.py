@@ -0,0 +1,239 @@
+"""Bulk loading for seeding, fixtures and synthetic datasets.
+
+Rows are written at the Core level, bypassing the ORM unit of work: COPY on
+PostgreSQL, and on other databases (SQLite) one executemany per batch of
+pre-converted tuples. For big loads the secondary indexes and the hotel
+search index can be dropped first and rebuilt once at the end, which is
+much cheaper than maintaining them row by row.
+
+Everything runs on the caller's connection, so a load is committed or
+rolled back as a whole, index changes included. ``bulk_transaction``
+opens that connection with SQLite's durability settings relaxed for the
+load.
+"""
+import csv
+import io
+import time
+from contextlib import contextmanager
+from itertools import repeat
+from operator import itemgetter, methodcaller
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+import hotel_search
+from models import db
+
+
+# C-level equivalents of SQLAlchemy's SQLite date/time bind processors; they
+# produce the same strings as the default storage formats, at a fraction of
+# the cost per value.
+_SQLITE_FORMATTERS = {
+    sqlite.DATETIME: methodcaller('isoformat', ' ', 'microseconds'),
+    sqlite.TIME: methodcaller('isoformat', 'microseconds'),
+    sqlite.DATE: methodcaller('isoformat'),
+}
+_MEMOIZED = frozenset(_SQLITE_FORMATTERS.values())
+
+
+def _bind_processor(column, dialect):
+    impl = column.type.dialect_impl(dialect)
+    for base, formatter in _SQLITE_FORMATTERS.items():
+        # _storage_format is private to SQLAlchemy; without it, fall back to its own processor
+        default_format = getattr(base, '_storage_format', None)
+        if isinstance(impl, base) and default_format and getattr(impl, '_storage_format', None) == default_format:
+            return formatter
+    return impl.bind_processor(dialect)
+
+
+def _skip_none(process):
+    return lambda value: None if value is None else process(value)
+
+
+class BulkLoader:
+    def __init__(self, connection, batch_size=10000):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.dialect = connection.dialect
+        self.use_copy = self.dialect.name == 'postgresql' and self.dialect.driver == 'psycopg2'
+        self._statements = {}  # (table, columns) -> (SQL, (row getter, default, bind processor) per parameter)
+        self.seconds = 0.0  # Spent converting and writing rows, producing them excluded
+
+    def load(self, table, rows):
+        """Insert every row dict from ``rows`` into ``table``. Returns the row count."""
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        columns = list(first)
+        count = 0
+        batch = [first]
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(table, columns, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._write(table, columns, batch)
+            count += len(batch)
+        return count
+
+    def _write(self, table, columns, batch):
+        started = time.perf_counter()
+        if self.use_copy:
+            self._copy(table, columns, batch)
+        else:
+            self._executemany(table, columns, batch)
+        self.seconds += time.perf_counter() - started
+
+    def _executemany(self, table, columns, batch):
+        key = (table.name, tuple(columns))
+        if key not in self._statements:
+            compiled = table.insert().compile(dialect=self.dialect, column_keys=columns)
+            fields = []
+            for name in compiled.positiontup:
+                # Apply the same conversions SQLAlchemy would (e.g. SQLite datetime strings)
+                process = _bind_processor(table.c[name], self.dialect)
+                if name in columns:
+                    fields.append((itemgetter(name), None, process))
+                else:
+                    # Columns the rows leave out but that have a Python-side default; callables
+                    # (e.g. datetime.utcnow) are evaluated once for the whole load
+                    default = table.c[name].default
+                    value = default.arg(None) if default.is_callable else default.arg
+                    fields.append((None, value if process is None or value is None else process(value), None))
+            self._statements[key] = (compiled.string, fields)
+        statement, fields = self._statements[key]
+        # Built column by column: map() over a whole column is far cheaper than
+        # converting every row in Python, and the rows are zipped up only once
+        values = []
+        for get, default, process in fields:
+            if get is None:
+                values.append(repeat(default, len(batch)))
+                continue
+            column = map(get, batch)
+            if process in _MEMOIZED:
+                # Generated rows share a few hundred dates and times, so each
+                # distinct value is formatted once per batch
+                column = list(column)
+                formatted = {value: process(value) for value in set(column) if value is not None}
+                formatted[None] = None
+                column = map(formatted.__getitem__, column)
+            elif process is not None:
+                column = map(_skip_none(process), column)
+            values.append(column)
+        self.connection.exec_driver_sql(statement, list(zip(*values)))
+
+    def _copy(self, table, columns, batch):
+        buffer = io.StringIO()
+        # Strings are quoted and None is written bare, so COPY can tell '' from NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerows([row[name] for name in columns] for row in batch)
+        buffer.seek(0)
+        preparer = self.dialect.identifier_preparer
+        cursor = self.connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+
+@contextmanager
+def bulk_transaction(engine):
+    """``engine.begin()`` for a bulk load that replaces data wholesale.
+
+    On SQLite the transaction runs with ``synchronous=OFF`` and the rollback
+    journal in memory, so clearing and loading the tables is not slowed by
+    fsyncs and journal writes; a crash mid-load can then corrupt the file,
+    which a reload fixes. SQLite refuses to change either setting inside a
+    transaction, so both are restored once it has ended, before the
+    connection goes back to the pool. Other databases get a plain
+    transaction.
+    """
+    with engine.connect() as connection:
+        saved = {}
+        if connection.dialect.name == 'sqlite':
+            for name, value in (('synchronous', 'OFF'), ('journal_mode', 'MEMORY')):
+                saved[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+            connection.commit()
+        try:
+            with connection.begin():
+                yield connection
+        finally:
+            for name, value in saved.items():
+                connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+            if saved:
+                connection.commit()
+
+
+def drop_indexes(connection, tables):
+    """Drop secondary indexes on ``tables``; returns a callable that recreates them.
+
+    Unique constraints and primary keys are kept so the load is still
+    validated. The hotel full-text index is dropped too when ``hotels`` is
+    among the tables, and rebuilt from scratch afterwards.
+    """
+    indexes = [index for table in tables for index in table.indexes]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    search = any(table.name == 'hotels' for table in tables) and hotel_search.installed(connection)
+    if search:
+        hotel_search.uninstall(connection)
+
+    def recreate():
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+        if search:
+            hotel_search.install(connection)
+        if connection.dialect.name == 'postgresql':
+            for table in tables:
+                connection.execute(text(f"ANALYZE {connection.dialect.identifier_preparer.format_table(table)}"))
+    return recreate
+
+
+def reset_sequences(connection, tables):
+    """Move PostgreSQL id sequences past ids that were inserted explicitly."""
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1 or not isinstance(pk[0].type, db.Integer):
+            continue
+        name = pk[0].name
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{name}'), "
+            f"COALESCE((SELECT MAX({name}) FROM {table.name}), 0) + 1, false)"
+        ))
+
+
+def load_tables(connection, tables, batch_size=10000, drop=False, progress=None, timings=None):
+    """Load ``(table, rows)`` pairs in order. Returns ``{table name: rows written}``.
+
+    When ``rows`` are generated lazily, the time spent producing them is
+    interleaved with the load; pass a dict as ``timings`` to get the seconds
+    spent in the database side alone: converting and writing the rows
+    (``'rows'``) and dropping and rebuilding indexes (``'indexes'``).
+    """
+    loader = BulkLoader(connection, batch_size)
+    started = time.perf_counter()
+    recreate = drop_indexes(connection, [table for table, _ in tables]) if drop else None
+    index_seconds = time.perf_counter() - started
+    written = {}
+    for table, rows in tables:
+        written[table.name] = loader.load(table, rows)
+        if progress:
+            progress(table.name, written[table.name])
+    started = time.perf_counter()
+    if recreate:
+        recreate()
+    reset_sequences(connection, [table for table, _ in tables])
+    if timings is not None:
+        timings['rows'] = loader.seconds
+        timings['indexes'] = index_seconds + time.perf_counter() - started
+    return written
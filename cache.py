@@ -0,0 +1,201 @@
+"""In-process and shared caches.
+
+Flight search results are cached per route: every cached search is tagged
+with the routes it read from, so a write to any flight on a route drops all
+the searches that could include it. The in-process ``LocalRouteCache`` is
+used by default; ``RedisRouteCache`` shares one cache between workers
+through any client exposing the redis-py API.
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU mapping whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisTTLMap:
+    """``TTLCache``'s get/set/delete kept in Redis, so every worker sees the same entries."""
+
+    def __init__(self, client, ttl=60, prefix='ttlmap:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        raw = self.client.get(f"{self.prefix}{key}")
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, key, value):
+        self.client.setex(f"{self.prefix}{key}", max(1, math.ceil(self.ttl)), json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+
+def create_role_changes(config):
+    """Shared record of when each user's role last changed, or None without a shared store.
+
+    Entries only need to outlive the tokens issued before the change. Uses
+    the Redis server of ``ROUTE_CACHE_URL`` when one is configured.
+    """
+    url = config.get('ROUTE_CACHE_URL')
+    if not url:
+        return None
+    import redis  # Only needed when a shared cache is configured
+    return RedisTTLMap(redis.Redis.from_url(url), ttl=config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds(),
+                       prefix='rolechange:')
+
+
+def route_tag(from_city, to_city):
+    return f"{from_city}|{to_city}"
+
+
+class LocalRouteCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        return {
+            "backend": "local",
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisRouteCache:
+    """Route cache stored in Redis (or a Redis-compatible server).
+
+    Values are JSON encoded and expire through ``SETEX``; each route tag is a
+    set of the keys built from it. Hit and miss counters live in Redis too
+    so they cover every worker.
+    """
+
+    def __init__(self, client, ttl=60, prefix='routecache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        self.client.incr(self.prefix + ('hits' if raw is not None else 'misses'))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, tags):
+        self.client.setex(self.prefix + key, self.ttl, json.dumps(value))
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            self.client.sadd(tag_key, self.prefix + key)
+            self.client.expire(tag_key, self.ttl)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "hits": int(self.client.get(self.prefix + 'hits') or 0),
+            "misses": int(self.client.get(self.prefix + 'misses') or 0),
+            "ttl": self.ttl,
+        }
+
+
+def create_route_cache(config):
+    """Build the cache selected by ``ROUTE_CACHE_URL`` (in-process when unset)."""
+    url = config.get('ROUTE_CACHE_URL')
+    if url:
+        import redis  # Only needed when a shared cache is configured
+        return RedisRouteCache(redis.Redis.from_url(url), ttl=config['ROUTE_CACHE_TTL'])
+    return LocalRouteCache(maxsize=config['ROUTE_CACHE_SIZE'], ttl=config['ROUTE_CACHE_TTL'])
@@ -0,0 +1,259 @@
+"""Connecting-itinerary search over the flight schedule.
+
+``RouteIndex`` keeps the flights departing from today to ``horizon_days``
+ahead in memory, bucketed by departure city and departure day and sorted
+by departure time. Writes made by this worker are applied to it
+incrementally. Every ``refresh_seconds`` a background thread reloads the
+window, picking up writes made by other workers, while searches keep
+using the previous index; only the very first search waits for a load.
+Searches for days outside the window read just the days they need.
+
+``RouteIndex.search`` is a best-first search over (city, time) states.
+Total price and total duration can only grow as legs are added, so the
+first ``limit`` itineraries that reach the destination are the ``limit``
+best ones.
+"""
+import bisect
+import heapq
+import threading
+import time as clock
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from models import db, Flight
+
+Leg = namedtuple('Leg', [
+    'departure', 'flight_id', 'flight_number', 'departure_city', 'arrival_city',
+    'arrival', 'price', 'seats_available',
+])
+
+SORT_KEYS = ('price', 'duration')
+
+
+def _leg(row):
+    return Leg(
+        departure=datetime.combine(row.departure_date.date(), row.departure_time),
+        flight_id=row.flight_id,
+        flight_number=row.flight_number,
+        departure_city=row.departure_city,
+        arrival_city=row.arrival_city,
+        arrival=datetime.combine(row.arrival_date.date(), row.arrival_time),
+        price=row.price,
+        seats_available=row.seats_available,
+    )
+
+
+def leg_to_dict(leg):
+    return {
+        'flight_id': leg.flight_id,
+        'flight_number': leg.flight_number,
+        'departure_city': leg.departure_city,
+        'arrival_city': leg.arrival_city,
+        'departure': leg.departure.isoformat(),
+        'arrival': leg.arrival.isoformat(),
+        'price': leg.price,
+        'seats_available': leg.seats_available,
+    }
+
+
+class RouteIndex:
+    def __init__(self, refresh_seconds=60, horizon_days=365):
+        self.refresh_seconds = refresh_seconds
+        self.horizon_days = horizon_days
+        self._buckets = None  # (departure_city, date) -> legs sorted by departure
+        self._legs = {}  # flight_id -> Leg
+        self._window = None  # (first, last) departure dates held in memory
+        self._loaded_at = None  # None once invalidated: stale whatever the time
+        self._generation = 0  # Bumped by invalidate(), so an older rebuild does not count as fresh
+        self._rebuilding = False
+        self._changes = None  # While a rebuild loads: writes to replay on its result
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            refresh_seconds=config['CONNECTIONS_REFRESH_SECONDS'],
+            horizon_days=config['CONNECTIONS_HORIZON_DAYS'],
+        )
+
+    def invalidate(self):
+        """Rebuild on the next search; until the rebuild is done searches use the current index."""
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def upsert(self, flight):
+        """Apply a flight insert or update made by this worker."""
+        leg = _leg(flight)
+        with self._lock:
+            self._record(leg.flight_id, leg)
+
+    def remove(self, flight_id):
+        with self._lock:
+            self._record(flight_id, None)
+
+    def search(self, origin, destination, day, passengers=1, max_stops=1,
+               min_connection=timedelta(minutes=45), max_layover=timedelta(hours=24),
+               sort='price', limit=10):
+        """Return up to ``limit`` itineraries, each a list of ``Leg``, best first."""
+        # Each leg lands within a day of leaving; the next leaves up to max_layover later
+        last_day = (datetime.combine(day, datetime.max.time()) + max_stops * (max_layover + timedelta(days=1))).date()
+        buckets, (window_first, window_last) = self._current()
+        if day < window_first or last_day > window_last:
+            # Outside the window kept in memory: load just the days this search can reach
+            buckets, _ = _load(day, last_day)
+        heap = []
+        counter = 0  # Tie-breaker so the heap never compares leg tuples
+
+        for leg in buckets.get((origin, day), ()):
+            if leg.seats_available >= passengers and leg.arrival > leg.departure:
+                cost = leg.price if sort == 'price' else (leg.arrival - leg.departure).total_seconds()
+                heapq.heappush(heap, (cost, counter, (leg,)))
+                counter += 1
+
+        results = []
+        while heap and len(results) < limit:
+            cost, _, path = heapq.heappop(heap)
+            last = path[-1]
+            if last.arrival_city == destination:
+                results.append(path)
+                continue
+            if len(path) > max_stops:
+                continue
+            visited = {leg.departure_city for leg in path}
+            earliest = last.arrival + min_connection
+            latest = last.arrival + max_layover
+            day_cursor = earliest.date()
+            while day_cursor <= latest.date():
+                bucket = buckets.get((last.arrival_city, day_cursor), ())
+                i = bisect.bisect_left(bucket, (earliest,))
+                for leg in bucket[i:]:
+                    if leg.departure > latest:
+                        break
+                    if leg.arrival_city in visited or leg.seats_available < passengers:
+                        continue
+                    if leg.arrival <= leg.departure:
+                        continue
+                    if sort == 'price':
+                        next_cost = cost + leg.price
+                    else:
+                        next_cost = (leg.arrival - path[0].departure).total_seconds()
+                    heapq.heappush(heap, (next_cost, counter, path + (leg,)))
+                    counter += 1
+                day_cursor += timedelta(days=1)
+        return [list(path) for path in results]
+
+    def _current(self):
+        """The in-memory buckets and their window, loading them on first use.
+
+        Later refreshes run in a background thread; searches keep using the
+        previous index until the new one is swapped in.
+        """
+        with self._lock:
+            buckets, window = self._buckets, self._window
+            stale = self._loaded_at is None or clock.monotonic() - self._loaded_at >= self.refresh_seconds
+            refresh = buckets is not None and stale and not self._rebuilding
+            if refresh:
+                self._rebuilding = True
+        if buckets is None:
+            self._rebuild(only_if_missing=True)
+            with self._lock:
+                return self._buckets, self._window
+        if refresh:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._rebuild_in_background, args=(app,), daemon=True).start()
+        return buckets, window
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self._rebuild()
+        except Exception:
+            app.logger.exception("Rebuilding the connections index failed")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _rebuild(self, only_if_missing=False):
+        with self._build_lock:
+            with self._lock:
+                if only_if_missing and self._buckets is not None:
+                    return
+                generation = self._generation
+                self._changes = []
+            first = date.today()
+            try:
+                buckets, legs = _load(first, first + timedelta(days=self.horizon_days))
+            except Exception:
+                with self._lock:
+                    self._changes = None
+                raise
+            with self._lock:
+                # Writes this worker made while the rows were being read
+                changes, self._changes = self._changes, None
+                self._buckets, self._legs = buckets, legs
+                self._window = (first, first + timedelta(days=self.horizon_days))
+                for flight_id, leg in changes:
+                    self._apply(flight_id, leg)
+                self._loaded_at = clock.monotonic() if generation == self._generation else None
+
+    def _record(self, flight_id, leg):
+        if self._changes is not None:
+            self._changes.append((flight_id, leg))
+        if self._buckets is not None:
+            self._apply(flight_id, leg)
+
+    def _apply(self, flight_id, leg):
+        self._discard(flight_id)
+        first, last = self._window
+        if leg is None or not first <= leg.departure.date() <= last:
+            return
+        self._legs[leg.flight_id] = leg
+        key = (leg.departure_city, leg.departure.date())
+        bucket = list(self._buckets.get(key, ()))
+        bisect.insort(bucket, leg)
+        self._buckets[key] = bucket
+
+    def _discard(self, flight_id):
+        old = self._legs.pop(flight_id, None)
+        if old is None:
+            return
+        key = (old.departure_city, old.departure.date())
+        # Buckets are replaced rather than edited so running searches see a consistent list
+        self._buckets[key] = [leg for leg in self._buckets.get(key, ()) if leg.flight_id != flight_id]
+
+
+def _load(first, last):
+    """Buckets and legs of the flights departing from ``first`` to ``last`` (inclusive)."""
+    # Always from the primary: a lagging replica could undo upserts this worker just applied
+    rows = db.session.execute(db.select(
+        Flight.flight_id, Flight.flight_number, Flight.departure_city, Flight.arrival_city,
+        Flight.departure_date, Flight.departure_time, Flight.arrival_date, Flight.arrival_time,
+        Flight.price, Flight.seats_available,
+    ).where(
+        Flight.departure_date >= datetime.combine(first, datetime.min.time()),
+        Flight.departure_date < datetime.combine(last + timedelta(days=1), datetime.min.time()),
+    ), bind_arguments={'bind': db.engine})
+    legs = {}
+    buckets = {}
+    for row in rows:
+        leg = _leg(row)
+        legs[leg.flight_id] = leg
+        buckets.setdefault((leg.departure_city, leg.departure.date()), []).append(leg)
+    for bucket in buckets.values():
+        bucket.sort()
+    return buckets, legs
+
+
+def itinerary_to_dict(legs, passengers):
+    return {
+        'legs': [leg_to_dict(leg) for leg in legs],
+        'stops': len(legs) - 1,
+        'departure': legs[0].departure.isoformat(),
+        'arrival': legs[-1].arrival.isoformat(),
+        'duration_minutes': int((legs[-1].arrival - legs[0].departure).total_seconds() // 60),
+        'total_price': sum(leg.price for leg in legs) * passengers,
+    }
@@ -0,0 +1,119 @@
+"""Client for the Safaricom Daraja (M-Pesa) API.
+
+One client is shared by the whole worker: it keeps a pooled HTTP session
+and caches the OAuth access token until shortly before it expires, so an
+STK push normally costs a single request.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
+
+
+class DarajaError(Exception):
+    """Raised when Daraja cannot be reached or rejects a request.
+
+    ``retryable`` is true only when the STK push was certainly not sent (the
+    token could not be fetched, or no connection could be opened), so that
+    sending it again cannot prompt the customer twice.
+    """
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class DarajaClient:
+    def __init__(self, base_url, consumer_key, consumer_secret, timeout=(3.05, 10),
+                 retries=2, pool_size=10, token_refresh_margin=60):
+        self.base_url = base_url.rstrip('/')
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.timeout = timeout
+        self.token_refresh_margin = token_refresh_margin
+
+        # Connection failures are always retried; bad statuses only for the
+        # token GET, since replaying an STK push could charge a customer twice
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            base_url=config['MPESA_BASE_URL'],
+            consumer_key=config['MPESA_CONSUMER_KEY'],
+            consumer_secret=config['MPESA_CONSUMER_SECRET'],
+            timeout=(config['MPESA_CONNECT_TIMEOUT'], config['MPESA_READ_TIMEOUT']),
+            retries=config['MPESA_RETRIES'],
+        )
+
+    def access_token(self):
+        """Return a cached token, fetching a new one when it is about to expire.
+
+        Only one thread refreshes at a time; the others wait for it and reuse
+        the new token instead of each making their own OAuth call.
+        """
+        if self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            try:
+                r = self.session.get(
+                    f"{self.base_url}/oauth/v1/generate",
+                    params={"grant_type": "client_credentials"},
+                    auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
+                    timeout=self.timeout,
+                )
+                r.raise_for_status()
+                body = r.json()
+                token = body['access_token']
+                expires_in = int(body.get('expires_in', 3599))
+            except (requests.RequestException, ValueError, KeyError) as e:
+                raise DarajaError(f"Unable to get M-Pesa access token: {e}", retryable=True) from e
+            self._token = token
+            self._token_expires_at = time.monotonic() + max(expires_in - self.token_refresh_margin, 0)
+            return token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0
+
+    def stk_push(self, payload):
+        """Send an STK push request and return the ``requests`` response."""
+        url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
+        try:
+            response = self._post(url, payload)
+            if response.status_code == 401:
+                # Token revoked before its expiry; refresh once and resend
+                self.invalidate_token()
+                response = self._post(url, payload)
+        except requests.RequestException as e:
+            reason = getattr(e.args[0], 'reason', None) if e.args else None
+            raise DarajaError(f"STK push failed: {e}", retryable=isinstance(reason, ConnectTimeoutError)) from e
+        return response
+
+    def _post(self, url, payload):
+        headers = {
+            "Authorization": f"Bearer {self.access_token()}",
+            "Content-Type": "application/json"
+        }
+        return self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
@@ -0,0 +1,108 @@
+"""Database engine tuning.
+
+``engine_options()`` turns the ``DB_*`` settings into Flask-SQLAlchemy's
+``SQLALCHEMY_ENGINE_OPTIONS``: connection pool size, overflow, timeout and
+recycle age, and ``pool_pre_ping`` so connections killed by the server or a
+proxy are replaced instead of failing a request.
+
+``StatementTimeout`` sets PostgreSQL's ``statement_timeout`` on connections
+while they serve a request. CLI commands (``flask db upgrade``, ``flask
+generate-dataset``), the job worker and background threads keep the
+server's default, so index builds and bulk loads are not cut off.
+
+``SQLitePragmas`` configures every new SQLite connection. WAL lets readers
+and a writer work at the same time (the default rollback journal locks the
+whole file for each write), ``busy_timeout`` makes a second writer wait for
+the lock instead of failing with "database is locked", and
+``synchronous=NORMAL`` is safe under WAL while skipping an fsync per
+commit.
+"""
+import sqlite3
+
+from flask import has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+
+def engine_options(config):
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        return {}
+    url = make_url(uri)
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory databases live in a single connection; there is no pool to size
+        return options
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+    )
+    return options
+
+
+class StatementTimeout:
+    def __init__(self, timeout_ms=30000):
+        self.timeout_ms = timeout_ms
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(timeout_ms=config['DB_STATEMENT_TIMEOUT_MS'])
+
+    def install(self, target=Engine):
+        """Apply the timeout to PostgreSQL connections used inside a request, on any engine."""
+        if self.timeout_ms:
+            event.listen(target, 'engine_connect', self._on_connect)
+
+    def _on_connect(self, connection):
+        if connection.dialect.name != 'postgresql':
+            return
+        wanted = self.timeout_ms if has_request_context() else None
+        # The pooled connection remembers its setting, so only a connection
+        # moving between request and other use pays for a SET
+        if connection.info.get('statement_timeout') == wanted:
+            return
+        dbapi_connection = connection.connection.dbapi_connection
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET statement_timeout = {int(wanted)}" if wanted else "SET statement_timeout TO DEFAULT")
+        finally:
+            cursor.close()
+        # Committed at once, or the pool's rollback on checkin would undo it
+        dbapi_connection.commit()
+        connection.info['statement_timeout'] = wanted
+
+
+class SQLitePragmas:
+    def __init__(self, journal_mode='WAL', busy_timeout_ms=5000, synchronous='NORMAL', mmap_size=256 * 1024 * 1024):
+        self.pragmas = [
+            ('journal_mode', journal_mode),
+            ('busy_timeout', busy_timeout_ms),
+            ('synchronous', synchronous),
+            ('mmap_size', mmap_size),
+        ]
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            journal_mode=config['SQLITE_JOURNAL_MODE'],
+            busy_timeout_ms=config['SQLITE_BUSY_TIMEOUT_MS'],
+            synchronous=config['SQLITE_SYNCHRONOUS'],
+            mmap_size=config['SQLITE_MMAP_SIZE'],
+        )
+
+    def install(self):
+        """Apply the pragmas to every new SQLite connection on any engine."""
+        event.listen(Engine, 'connect', self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in self.pragmas:
+                # Values come from config, not requests; pragmas cannot be bound
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
@@ -0,0 +1,296 @@
+"""Reproducible synthetic datasets for load testing.
+
+``Dataset(rows, seed)`` describes a database of roughly ``rows`` rows in
+total, split across the tables in fixed proportions. Each table is produced
+by its own seeded generator, so the same ``(rows, seed)`` always yields the
+same data and a table can be regenerated without the others.
+
+Traffic is skewed the way real schedules are: routes are weighted by the
+size of both cities (Nairobi dominates), departures cluster in the morning
+and evening peaks, on Fridays and Sundays and in the December and August
+holidays, and fares follow distance, season and noise.
+"""
+import math
+import random
+import re
+from array import array
+from datetime import date, datetime, time, timedelta
+
+from faker import Faker
+
+from amenities import canonical_amenities
+from bulk_load import load_tables
+from models import db, User, Flight, Hotel, HotelAmenity, Booking, UserFlight, UserHotel, ChangeCounter
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Share of the total row count given to each table
+PROPORTIONS = {
+    'users': 0.10,
+    'hotels': 0.005,
+    'flights': 0.50,
+    'bookings': 0.25,
+    'user_flights': 0.08,
+    'user_hotels': 0.04,
+}
+
+# City -> (latitude, longitude, relative traffic)
+CITIES = {
+    'Nairobi': (-1.319, 36.928, 100),
+    'Mombasa': (-4.035, 39.594, 40),
+    'Kisumu': (-0.086, 34.729, 20),
+    'Eldoret': (0.404, 35.239, 14),
+    'Malindi': (-3.229, 40.102, 10),
+    'Ukunda': (-4.297, 39.571, 8),
+    'Lamu': (-2.252, 40.913, 6),
+    'Nakuru': (-0.298, 36.160, 5),
+    'Kitale': (0.972, 34.959, 3),
+    'Lodwar': (3.122, 35.609, 3),
+    'Wajir': (1.733, 40.092, 2),
+    'Entebbe': (0.042, 32.444, 14),
+    'Kigali': (-1.969, 30.139, 10),
+    'Dar es Salaam': (-6.878, 39.203, 14),
+    'Zanzibar': (-6.222, 39.225, 8),
+    'Addis Ababa': (8.978, 38.799, 12),
+}
+
+AIRLINES = ('KQ', 'JM', 'P2', '5H', 'FD', 'RW')
+HOTEL_SUFFIXES = ('Hotel', 'Lodge', 'Resort', 'Suites', 'Inn', 'Camp', 'Beach Resort', 'Residences')
+AMENITY_PHRASES = (
+    'Free WiFi', 'Outdoor swimming pool', 'Free on-site parking', 'Fitness center Gym', 'Spa',
+    'Sauna', 'Jacuzzi', 'Free Breakfast', 'Restaurant', 'Bar', 'Room service', 'Airport shuttle',
+    'Air conditioning', 'Family rooms', 'Beach access', 'Minibar', 'Tea/coffee maker in all rooms',
+    'Flat-screen TV', 'Laundry', 'Facilities for disabled guests', 'Safety deposit box', 'Garden',
+)
+
+# Monday first
+WEEKDAY_TRAFFIC = (1.0, 0.85, 0.85, 0.95, 1.3, 0.8, 1.2)
+MONTH_TRAFFIC = (1.1, 0.8, 0.85, 0.9, 0.8, 0.9, 1.15, 1.35, 1.0, 0.95, 1.0, 1.5)
+HOUR_TRAFFIC = (0.1, 0.05, 0.05, 0.1, 0.3, 0.8, 1.6, 1.8, 1.5, 1.0, 0.9, 0.9,
+                0.9, 0.9, 1.0, 1.1, 1.3, 1.6, 1.5, 1.2, 0.8, 0.5, 0.3, 0.2)
+
+
+def parse_rows(value):
+    """Accept a named scale (``10k``, ``1m``, ...) or a plain row count."""
+    value = str(value).strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    rows = int(value.replace('_', ''))
+    if rows < 100:
+        raise ValueError("A dataset needs at least 100 rows")
+    return rows
+
+
+def distance_km(a, b):
+    lat1, lon1, _ = CITIES[a]
+    lat2, lon2, _ = CITIES[b]
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def _cumulative(weights):
+    total = 0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+class Dataset:
+    def __init__(self, rows, seed=42, start=date(2024, 9, 1), days=365, password_hash='password'):
+        self.rows = rows
+        self.seed = seed
+        self.start = start
+        self.days = days
+        self.password_hash = password_hash
+        self.counts = {name: max(1, int(rows * share)) for name, share in PROPORTIONS.items()}
+        self._flight_summary = None  # (price, departure day) per flight, filled by flights()
+
+    def _random(self, table):
+        return random.Random(f"{self.seed}:{table}")
+
+    def _names(self, table, method, size):
+        # Faker is slow per call, so draw a pool once and sample from it
+        fake = Faker('en_US')
+        fake.seed_instance(f"{self.seed}:{table}:{method}")
+        return [getattr(fake, method)() for _ in range(size)]
+
+    def tables(self):
+        """``(table, rows)`` pairs in an order that satisfies the foreign keys."""
+        return [
+            (User.__table__, self.users()),
+            (Hotel.__table__, self.hotels()),
+            (HotelAmenity.__table__, self.hotel_amenities()),
+            (Flight.__table__, self.flights()),
+            (Booking.__table__, self.bookings()),
+            (UserFlight.__table__, self.user_flights()),
+            (UserHotel.__table__, self.user_hotels()),
+        ]
+
+    def users(self):
+        rng = self._random('users')
+        firsts = [(name, re.sub(r'[^a-z]', '', name.lower())) for name in self._names('users', 'first_name', 1000)]
+        lasts = [(name, re.sub(r'[^a-z]', '', name.lower())) for name in self._names('users', 'last_name', 2000)]
+        for user_id in range(1, self.counts['users'] + 1):
+            (first, first_local), (last, last_local) = rng.choice(firsts), rng.choice(lasts)
+            yield {
+                'user_id': user_id,
+                'title': None,
+                'first_name': first,
+                'last_name': last,
+                'email': f"{first_local}{last_local}{user_id}@example.com",
+                'password': self.password_hash,
+                'role': 'admin' if user_id == 1 else 'traveler',
+                'phone_number': f"07{rng.randrange(10 ** 8):08d}",
+            }
+
+    def _hotel_rows(self):
+        rng = self._random('hotels')
+        names = self._names('hotels', 'last_name', 300)
+        streets = self._names('hotels', 'street_name', 300)
+        cities = list(CITIES)
+        cumulative = _cumulative(CITIES[city][2] for city in cities)
+        for hotel_id in range(1, self.counts['hotels'] + 1):
+            city = rng.choices(cities, cum_weights=cumulative)[0]
+            amenities = ', '.join(rng.sample(AMENITY_PHRASES, rng.randint(3, 10)))
+            yield {
+                'hotel_id': hotel_id,
+                'name': f"{rng.choice(names)} {rng.choice(HOTEL_SUFFIXES)}",
+                'location': f"{rng.choice(streets)}, {city}",
+                'price_per_night': round(rng.lognormvariate(math.log(9000), 0.5), -2),
+                'amenities': amenities,
+                'image_url': f"https://picsum.photos/seed/hotel{hotel_id}/800/600",
+                'version': 1,
+            }
+
+    def hotels(self):
+        return self._hotel_rows()
+
+    def hotel_amenities(self):
+        for hotel in self._hotel_rows():
+            for amenity in canonical_amenities(hotel['amenities']):
+                yield {'hotel_id': hotel['hotel_id'], 'amenity': amenity}
+
+    def flights(self):
+        rng = self._random('flights')
+        cities = list(CITIES)
+        routes = [(a, b) for a in cities for b in cities if a != b]
+        route_weights = _cumulative(CITIES[a][2] * CITIES[b][2] for a, b in routes)
+        # Route -> (block minutes rounded to 5, base fare)
+        route_info = {}
+        for route in routes:
+            distance = distance_km(*route)
+            minutes = int(distance / 750 * 60 + 25)
+            route_info[route] = (minutes - minutes % 5, 2500 + distance * 9)
+        days = [self.start + timedelta(days=i) for i in range(self.days + 1)]
+        midnights = [datetime.combine(day, time()) for day in days]
+        seasons = [MONTH_TRAFFIC[day.month - 1] for day in days]
+        day_weights = _cumulative(WEEKDAY_TRAFFIC[d.weekday()] * MONTH_TRAFFIC[d.month - 1] for d in days[:-1])
+        minute_weights = _cumulative(HOUR_TRAFFIC[m // 60] for m in range(0, 1440, 5))
+        clock = [time(m // 60, m % 60) for m in range(1440)]
+        capacities = (50, 72, 120, 180)
+
+        prices = array('d')
+        departure_days = array('l')
+        batch = 1024
+        flight_id = 0
+        while flight_id < self.counts['flights']:
+            n = min(batch, self.counts['flights'] - flight_id)
+            picked_routes = rng.choices(routes, cum_weights=route_weights, k=n)
+            picked_days = rng.choices(range(self.days), cum_weights=day_weights, k=n)
+            picked_minutes = rng.choices(range(0, 1440, 5), cum_weights=minute_weights, k=n)
+            picked_capacities = rng.choices(capacities, k=n)
+            for route, day_index, departs, capacity in zip(picked_routes, picked_days, picked_minutes, picked_capacities):
+                flight_id += 1
+                minutes, fare = route_info[route]
+                arrives = departs + minutes
+                price = round(fare * seasons[day_index] * rng.lognormvariate(0, 0.2), -1)
+                prices.append(price)
+                departure_days.append(day_index)
+                yield {
+                    'flight_id': flight_id,
+                    'flight_number': f"{AIRLINES[flight_id % len(AIRLINES)]}{flight_id:08d}",
+                    'departure_city': route[0],
+                    'arrival_city': route[1],
+                    'departure_date': midnights[day_index],
+                    'arrival_date': midnights[day_index + arrives // 1440],
+                    'departure_time': clock[departs],
+                    'arrival_time': clock[arrives % 1440],
+                    'price': price,
+                    'seats_available': int(rng.random() * (capacity + 1)),
+                    'trip_type': 'roundtrip' if rng.random() < 0.15 else 'oneway',
+                    'version': 1,
+                }
+        self._flight_summary = (prices, departure_days)
+
+    def _flights_summary(self):
+        if self._flight_summary is None:
+            for _ in self.flights():
+                pass
+        return self._flight_summary
+
+    def _skewed_id(self, rng, count):
+        # Popularity follows a power law: low ids are picked far more often
+        return min(count, int(count ** rng.random()))
+
+    def bookings(self):
+        rng = self._random('bookings')
+        prices, departure_days = self._flights_summary()
+        hotel_prices = [hotel['price_per_night'] for hotel in self._hotel_rows()]
+        midnights = [datetime.combine(self.start + timedelta(days=i), time()) for i in range(self.days)]
+        users = self.counts['users']
+        statuses = rng.choices(('confirmed', 'pending', 'cancelled'), weights=(70, 20, 10), k=64)
+        for booking_id in range(1, self.counts['bookings'] + 1):
+            row = {
+                'booking_id': booking_id,
+                'user_id': int(rng.random() * users) + 1,
+                'booking_status': statuses[booking_id % 64],
+            }
+            if rng.random() < 0.7:
+                flight_id = self._skewed_id(rng, len(prices))
+                # Booked up to 90 days before departure
+                row.update(booking_type='flight', flight_id=flight_id, hotel_id=None,
+                           total_price=prices[flight_id - 1] * (int(rng.random() * 4) + 1),
+                           booking_date=midnights[departure_days[flight_id - 1]]
+                           - timedelta(minutes=int(rng.random() * 91 * 1440)))
+            else:
+                hotel_id = self._skewed_id(rng, len(hotel_prices))
+                row.update(booking_type='hotel', flight_id=None, hotel_id=hotel_id,
+                           total_price=hotel_prices[hotel_id - 1] * (int(rng.random() * 7) + 1),
+                           booking_date=midnights[0] + timedelta(minutes=int(rng.random() * self.days * 1440)))
+            yield row
+
+    def user_flights(self):
+        rng = self._random('user_flights')
+        for user_flight_id in range(1, self.counts['user_flights'] + 1):
+            yield {
+                'user_flight_id': user_flight_id,
+                'user_id': rng.randint(1, self.counts['users']),
+                'flight_id': self._skewed_id(rng, self.counts['flights']),
+            }
+
+    def user_hotels(self):
+        rng = self._random('user_hotels')
+        for user_hotel_id in range(1, self.counts['user_hotels'] + 1):
+            yield {
+                'user_hotel_id': user_hotel_id,
+                'user_id': rng.randint(1, self.counts['users']),
+                'hotel_id': self._skewed_id(rng, self.counts['hotels']),
+            }
+
+
+def clear(connection):
+    """Delete every row the dataset generates, children first."""
+    for model in (UserFlight, UserHotel, Booking, HotelAmenity, Flight, Hotel, User):
+        connection.execute(db.delete(model.__table__))
+
+
+def write(connection, dataset, batch_size=10000, drop_indexes=False, progress=None, timings=None):
+    """Bulk load ``dataset``. Returns rows written per table; see ``load_tables`` for ``timings``."""
+    written = load_tables(connection, dataset.tables(), batch_size, drop=drop_indexes, progress=progress,
+                          timings=timings)
+    ChangeCounter.bump(connection, 'flights', 'hotels')
+    return written
@@ -0,0 +1,70 @@
+"""Transactional email through SendGrid.
+
+Mail is only sent from background jobs (see jobs.py), never while a request
+is open. Without ``SENDGRID_API_KEY`` the mailer is disabled and nothing is
+queued.
+"""
+from python_http_client.exceptions import HTTPError
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import Mail
+
+# SendGrid answers these when it is overloaded or rate limiting; anything
+# else in the 4xx range means the message itself will never be accepted
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class MailError(Exception):
+    """Raised when SendGrid does not accept a message; ``retryable`` says whether sending it again may work."""
+
+    def __init__(self, message, retryable):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Mailer:
+    def __init__(self, api_key, sender, host='https://api.sendgrid.com', timeout=10):
+        self.sender = sender
+        self.client = SendGridAPIClient(api_key, host=host) if api_key else None
+        if self.client:
+            self.client.client.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            api_key=config['SENDGRID_API_KEY'],
+            sender=config['SENDGRID_FROM'],
+            host=config['SENDGRID_HOST'],
+            timeout=config['SENDGRID_TIMEOUT'],
+        )
+
+    @property
+    def enabled(self):
+        return self.client is not None
+
+    def send(self, to, subject, text):
+        """Send a plain-text message and return SendGrid's message id."""
+        message = Mail(from_email=self.sender, to_emails=to, subject=subject, plain_text_content=text)
+        try:
+            response = self.client.send(message)
+        except HTTPError as e:
+            raise MailError(f"SendGrid answered {e.status_code}: {e.body!r}", e.status_code in RETRYABLE_STATUSES) from e
+        except OSError as e:  # Connection refused, timeouts, TLS errors
+            raise MailError(f"SendGrid could not be reached: {e}", True) from e
+        return response.headers.get('X-Message-Id')
+
+
+def booking_confirmation(user, bookings):
+    """Subject and body of the confirmation for ``bookings``, all made by ``user`` at once."""
+    lines = [f"Hello {user.first_name},", "", "Your booking is confirmed:", ""]
+    for booking in bookings:
+        parts = []
+        if booking.flight:
+            flight = booking.flight
+            parts.append(f"flight {flight.flight_number} {flight.departure_city} to {flight.arrival_city} "
+                         f"on {flight.departure_date:%d %b %Y}")
+        if booking.hotel:
+            parts.append(f"{booking.hotel.name}, {booking.hotel.location}")
+        lines.append(f"  #{booking.booking_id}: {' + '.join(parts)} ({booking.total_price:.2f})")
+    lines += ["", f"Total: {sum(booking.total_price for booking in bookings):.2f}"]
+    reference = ', '.join(f"#{booking.booking_id}" for booking in bookings)
+    return f"Booking confirmed: {reference}", "\n".join(lines)
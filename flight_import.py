@@ -0,0 +1,175 @@
+"""Flight validation and streaming bulk import.
+
+``parse_flight`` holds the rules used by both ``Flights.post`` and the bulk
+import. The importer reads NDJSON or CSV one line at a time and upserts on
+``flight_number`` in fixed-size batches, so memory use does not depend on
+the size of the file.
+"""
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Flight, ChangeCounter
+
+REQUIRED_FIELDS = [
+    'flight_number', 'departure_city', 'arrival_city',
+    'departure_date', 'arrival_date', 'departure_time',
+    'arrival_time', 'price', 'seats_available'
+]
+
+# Only the first errors are returned in full; the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class FlightDataError(ValueError):
+    """Raised when a flight payload fails validation."""
+
+
+def parse_flight(data):
+    """Validate a flight payload and return the column values for a ``Flight``."""
+    if not isinstance(data, dict):
+        raise FlightDataError("Expected a JSON object")
+    for field in REQUIRED_FIELDS:
+        if field not in data or data[field] in (None, ''):
+            raise FlightDataError(f"Missing field: {field}")
+
+    # Convert date and time strings to datetime objects
+    try:
+        departure_date = datetime.fromisoformat(data['departure_date'])
+        arrival_date = datetime.fromisoformat(data['arrival_date'])
+        departure_time = datetime.strptime(data['departure_time'], '%H:%M:%S').time()
+        arrival_time = datetime.strptime(data['arrival_time'], '%H:%M:%S').time()
+    except (TypeError, ValueError):
+        raise FlightDataError("Invalid date or time format")
+
+    try:
+        price = float(data['price'])
+        seats_available = int(data['seats_available'])
+    except (TypeError, ValueError):
+        raise FlightDataError("Invalid price or seats_available")
+
+    return {
+        'flight_number': data['flight_number'],
+        'departure_city': data['departure_city'],
+        'arrival_city': data['arrival_city'],
+        'departure_date': departure_date,
+        'arrival_date': arrival_date,
+        'departure_time': departure_time,
+        'arrival_time': arrival_time,
+        'price': price,
+        'seats_available': seats_available,
+        'trip_type': data.get('trip_type') or 'oneway',
+    }
+
+
+def _lines(stream):
+    # Only readline() is relied on: WSGI input streams (gunicorn's included)
+    # are not full io objects, so io.TextIOWrapper cannot wrap them
+    for line in iter(stream.readline, b''):
+        yield line.decode('utf-8')
+
+
+def read_ndjson(stream):
+    """Yield ``(line_number, record)`` from a binary NDJSON stream."""
+    for line_number, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, FlightDataError("Invalid JSON")
+
+
+def read_csv(stream):
+    """Yield ``(line_number, record)`` from a binary CSV stream with a header row."""
+    reader = csv.DictReader(_lines(stream))
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _upsert_statement(rows):
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert(Flight)
+    update_columns = {
+        name: stmt.excluded[name] for name in rows[0] if name != 'flight_number'
+    }
+    update_columns['version'] = stmt.table.c.version + 1
+    return stmt.on_conflict_do_update(index_elements=['flight_number'], set_=update_columns)
+
+
+class FlightImporter:
+    """Validates and upserts flights in batches, collecting per-row errors."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.routes = set()  # (departure_city, arrival_city) before and after the import
+        self._batch = {}  # flight_number -> (line_number, values)
+
+    def run(self, records):
+        for line_number, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                values = parse_flight(record)
+            except FlightDataError as e:
+                self._error(line_number, str(e))
+                continue
+            # A later row for the same flight number in one batch replaces the earlier one
+            self._batch[values['flight_number']] = (line_number, values)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+        self._flush()
+        return self
+
+    def result(self):
+        return {
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    def _flush(self):
+        if not self._batch:
+            return
+        batch = list(self._batch.values())
+        self._batch = {}
+        rows = [values for _, values in batch]
+        try:
+            self._upsert(rows)
+        except SQLAlchemyError:
+            db.session.rollback()
+            # Find the offending rows by retrying the batch one row at a time
+            for line_number, values in batch:
+                try:
+                    self._upsert([values])
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    self._error(line_number, str(e.orig) if getattr(e, 'orig', None) else str(e))
+
+    def _upsert(self, rows):
+        # An update can move a flight number to another route, so the routes
+        # the flights had before are stale too
+        previous = db.session.execute(
+            db.select(Flight.departure_city, Flight.arrival_city)
+            .where(Flight.flight_number.in_([values['flight_number'] for values in rows]))
+            .distinct()
+        ).all()
+        db.session.execute(_upsert_statement(rows), rows)
+        ChangeCounter.mark(db.session, 'flights')
+        db.session.commit()
+        self.imported += len(rows)
+        self.routes.update(tuple(route) for route in previous)
+        for values in rows:
+            self.routes.add((values['departure_city'], values['arrival_city']))
+
+    def _error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
@@ -0,0 +1,18 @@
+# Gunicorn settings. Run with: gunicorn app:app
+import os
+
+from prometheus_client import multiprocess
+
+# Threaded workers: a request waiting on bcrypt, the database or an outbound
+# call only holds its own thread, and the per-process hashing limit in
+# passwords.py (PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE, below this
+# thread count) is reachable, so a login burst gets 503s instead of
+# occupying every thread. Keep threads within DB_POOL_SIZE + DB_MAX_OVERFLOW.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the shared metrics directory
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
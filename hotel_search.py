@@ -0,0 +1,127 @@
+"""Ranked full-text search over hotel names, locations and amenities.
+
+SQLite (dev) uses an external-content FTS5 table kept in sync by triggers
+and ranked with BM25. PostgreSQL (prod) uses a generated, weighted
+tsvector column with a GIN index, ranked with ts_rank_cd. In both cases
+the database keeps the index in sync on every insert, update and delete
+of a hotel, whichever code path makes the change.
+
+Name matches weigh more than location matches, and location matches more
+than amenity matches.
+"""
+import re
+
+from sqlalchemy import text
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS hotels_fts USING fts5(
+        name, location, amenities,
+        content='hotels', content_rowid='hotel_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS hotels_fts_ai AFTER INSERT ON hotels BEGIN
+        INSERT INTO hotels_fts(rowid, name, location, amenities)
+        VALUES (new.hotel_id, new.name, new.location, new.amenities);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS hotels_fts_ad AFTER DELETE ON hotels BEGIN
+        INSERT INTO hotels_fts(hotels_fts, rowid, name, location, amenities)
+        VALUES ('delete', old.hotel_id, old.name, old.location, old.amenities);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS hotels_fts_au AFTER UPDATE ON hotels BEGIN
+        INSERT INTO hotels_fts(hotels_fts, rowid, name, location, amenities)
+        VALUES ('delete', old.hotel_id, old.name, old.location, old.amenities);
+        INSERT INTO hotels_fts(rowid, name, location, amenities)
+        VALUES (new.hotel_id, new.name, new.location, new.amenities);
+    END""",
+    "INSERT INTO hotels_fts(hotels_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS hotels_fts_au",
+    "DROP TRIGGER IF EXISTS hotels_fts_ad",
+    "DROP TRIGGER IF EXISTS hotels_fts_ai",
+    "DROP TABLE IF EXISTS hotels_fts",
+]
+
+POSTGRESQL_DDL = [
+    """ALTER TABLE hotels ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(amenities, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_hotels_search_vector ON hotels USING GIN (search_vector)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS ix_hotels_search_vector",
+    "ALTER TABLE hotels DROP COLUMN IF EXISTS search_vector",
+]
+
+# Lower scores rank first in both queries
+SQLITE_SEARCH = """
+    SELECT hotel_id, score FROM (
+        SELECT rowid AS hotel_id, bm25(hotels_fts, 10.0, 5.0, 1.0) AS score
+        FROM hotels_fts WHERE hotels_fts MATCH :query
+    )
+    WHERE :after_score IS NULL OR score > :after_score OR (score = :after_score AND hotel_id > :after_id)
+    ORDER BY score, hotel_id
+    LIMIT :limit
+"""
+
+POSTGRESQL_SEARCH = """
+    SELECT hotel_id, score FROM (
+        SELECT hotel_id, -ts_rank_cd(search_vector, to_tsquery('simple', :query)) AS score
+        FROM hotels WHERE search_vector @@ to_tsquery('simple', :query)
+    ) AS matches
+    WHERE CAST(:after_score AS double precision) IS NULL OR score > :after_score
+        OR (score = :after_score AND hotel_id > :after_id)
+    ORDER BY score, hotel_id
+    LIMIT :limit
+"""
+
+
+def install(connection):
+    """Create the search index for the connection's database."""
+    for statement in POSTGRESQL_DDL if connection.dialect.name == 'postgresql' else SQLITE_DDL:
+        connection.execute(text(statement))
+
+
+def installed(connection):
+    if connection.dialect.name == 'postgresql':
+        statement = ("SELECT 1 FROM information_schema.columns "
+                     "WHERE table_name = 'hotels' AND column_name = 'search_vector'")
+    else:
+        statement = "SELECT 1 FROM sqlite_master WHERE name = 'hotels_fts'"
+    return connection.execute(text(statement)).first() is not None
+
+
+def uninstall(connection):
+    for statement in POSTGRESQL_DROP if connection.dialect.name == 'postgresql' else SQLITE_DROP:
+        connection.execute(text(statement))
+
+
+def search_terms(query):
+    """Split free text into words; each is matched as a prefix and all must match."""
+    return re.findall(r'\w+', query.lower())
+
+
+def search(connection, query, limit, after=None):
+    """Return ``[(hotel_id, score)]`` for ``query``, best first.
+
+    ``after`` is the ``(score, hotel_id)`` of the last row of the previous
+    page, so pages are fetched by keyset rather than by offset.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.dialect.name == 'postgresql':
+        statement = POSTGRESQL_SEARCH
+        match = ' & '.join(f"{term}:*" for term in terms)
+    else:
+        statement = SQLITE_SEARCH
+        match = ' '.join(f'"{term}"*' for term in terms)
+    after_score, after_id = after if after else (None, None)
+    rows = connection.execute(text(statement), {
+        'query': match, 'limit': limit, 'after_score': after_score, 'after_id': after_id,
+    })
+    return [(row.hotel_id, row.score) for row in rows]
@@ -0,0 +1,220 @@
+"""Idempotency keys for retried POSTs.
+
+A client that may retry a request sends the same ``Idempotency-Key``
+header each time. The first request claims the key by inserting an
+``idempotency_keys`` row in its own transaction (so every worker sees it
+at once), runs, and stores its response on the row. Later requests with
+the key:
+
+* get the stored response replayed, with ``Idempotent-Replayed: true``;
+* wait while the first one is still running, up to ``wait`` seconds, then
+  get its response (or 409 if it is still not done);
+* get 422 if the key was first used for a different request (method,
+  path or body).
+
+Keys are scoped to the authenticated user, or for anonymous requests to
+the client's address and User-Agent, so one client can never replay
+another's response by reusing its key.
+
+The request's own transaction, when it commits, also turns the claim into
+a placeholder response that lives for ``ttl``: a 409 saying the request
+went through but its response was not recorded. So once its work is
+committed a request is never run again, even if the worker dies or the
+handler fails before the real response is stored over the placeholder.
+Duplicates that are waiting treat a placeholder younger than
+``lock_timeout`` as still running, since the real response normally
+follows within moments.
+
+Until then, 5xx responses and exceptions are not stored: the claim is
+released so a retry runs the request again, and a claim left behind by a
+worker that died is taken over after ``lock_timeout`` seconds. Rows expire
+``ttl`` seconds after the response was stored; each worker deletes expired
+rows at most once per ``sweep_interval`` seconds.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from flask_restful import unpack
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+CLAIM = 'idempotency_claim'  # session.info key of the claim held by the running request
+UNRECORDED = json.dumps({"error": "This request was already processed, but its response was not recorded; "
+                                  f"check its outcome before retrying with a new {HEADER}"})
+
+
+class IdempotencyStore:
+    def __init__(self, ttl=86400, wait=10.0, lock_timeout=60, sweep_interval=300):
+        self.ttl = timedelta(seconds=ttl)
+        self.wait = wait
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+        self.sweep_interval = sweep_interval
+        self._swept_at = None
+        self.table = IdempotencyKey.__table__
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            ttl=config['IDEMPOTENCY_TTL'],
+            wait=config['IDEMPOTENCY_WAIT_SECONDS'],
+            lock_timeout=config['IDEMPOTENCY_LOCK_SECONDS'],
+            sweep_interval=config['IDEMPOTENCY_SWEEP_SECONDS'],
+        )
+
+    def idempotent(self, fn):
+        """Decorate a resource method so requests carrying an Idempotency-Key run at most once."""
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return fn(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return make_response(jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400)
+            scope = self._scope()
+            fingerprint = self._fingerprint()
+
+            deadline = time.monotonic() + self.wait
+            delay = 0.05
+            while True:
+                existing = self._claim(scope, key, fingerprint)
+                if existing is None:
+                    return self._run(fn, args, kwargs, scope, key)
+                if existing.fingerprint != fingerprint:
+                    return make_response(jsonify({"error": f"{HEADER} was already used for a different request"}), 422)
+                if existing.status_code is not None and not self._storing(existing):
+                    return self._replay(existing)
+                if time.monotonic() >= deadline:
+                    response = make_response(jsonify({"error": f"A request with this {HEADER} is still in progress"}), 409)
+                    response.headers['Retry-After'] = '1'
+                    return response
+                # The first request is still running; poll until it stores its response
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        return wrapper
+
+    def _scope(self):
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:  # No JWT verified on this request
+            identity = None
+        if identity is not None:
+            return f"user:{identity}"
+        # Unauthenticated callers only share keys with requests from the same address and client
+        client = f"{request.remote_addr}\0{request.user_agent.string}"
+        return f"anonymous:{hashlib.sha256(client.encode()).hexdigest()[:32]}"
+
+    def _fingerprint(self):
+        digest = hashlib.sha256()
+        for part in (request.method, request.full_path):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        digest.update(request.get_data())
+        return digest.hexdigest()
+
+    def _claim(self, scope, key, fingerprint):
+        """Claim the key; returns None on success, otherwise the row that holds it."""
+        now = datetime.utcnow()
+        self._sweep(now)
+        table = self.table
+        try:
+            with db.engine.begin() as connection:
+                # Expired rows, including claims abandoned by a dead worker, no longer count
+                connection.execute(delete(table).where(
+                    table.c.scope == scope, table.c.key == key, table.c.expires_at < now,
+                ))
+                connection.execute(insert(table).values(
+                    scope=scope, key=key, fingerprint=fingerprint,
+                    # Until a response is stored, the row only lives as long as the lock
+                    created_at=now, expires_at=now + self.lock_timeout,
+                ))
+            return None
+        except IntegrityError:
+            pass
+        with db.engine.connect() as connection:
+            existing = connection.execute(
+                select(table).where(table.c.scope == scope, table.c.key == key)
+            ).first()
+        # Released between our insert and this read: try to claim it again
+        return existing if existing is not None else self._claim(scope, key, fingerprint)
+
+    def _run(self, fn, args, kwargs, scope, key):
+        claim = {'store': self, 'scope': scope, 'key': key, 'committed': False}
+        session = db.session()
+        session.info[CLAIM] = claim
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            if not claim['committed']:
+                self._release(scope, key)
+            raise
+        finally:
+            session.info.pop(CLAIM, None)
+        response = result if hasattr(result, 'status_code') else make_response(*unpack(result))
+        if response.status_code >= 500 or response.is_streamed:
+            # Once committed, the placeholder stays: running the request again could repeat its work
+            if not claim['committed']:
+                self._release(scope, key)
+            return response
+        table = self.table
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.scope == scope, table.c.key == key).values(
+                status_code=response.status_code,
+                content_type=response.content_type,
+                body=response.get_data(as_text=True),
+                expires_at=datetime.utcnow() + self.ttl,
+            ))
+        return response
+
+    def _storing(self, row):
+        """True while a committed request may still store its response over the placeholder."""
+        return row.body == UNRECORDED and datetime.utcnow() < row.created_at + self.lock_timeout
+
+    def _release(self, scope, key):
+        table = self.table
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.scope == scope, table.c.key == key))
+
+    def _replay(self, row):
+        response = make_response(row.body, row.status_code)
+        response.content_type = row.content_type
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _sweep(self, now):
+        if self._swept_at is not None and time.monotonic() - self._swept_at < self.sweep_interval:
+            return
+        self._swept_at = time.monotonic()
+        with db.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.expires_at < now))
+
+
+@event.listens_for(Session, 'before_commit')
+def _record_commit(session):
+    """In the request's own transaction, keep its claim from being released or taken over."""
+    claim = session.info.get(CLAIM)
+    if claim is None or claim['committed']:
+        return
+    table = claim['store'].table
+    session.execute(update(table).where(table.c.scope == claim['scope'], table.c.key == claim['key']).values(
+        status_code=409,
+        content_type='application/json',
+        body=UNRECORDED,
+        expires_at=datetime.utcnow() + claim['store'].ttl,
+    ))
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_committed(session):
+    claim = session.info.get(CLAIM)
+    if claim is not None:
+        claim['committed'] = True
@@ -0,0 +1,234 @@
+"""Background jobs stored in the database.
+
+Requests enqueue work (an STK push, a confirmation email) as a ``jobs`` row,
+usually in the same transaction as the data it belongs to, and answer
+straight away; ``flask run-worker`` runs the jobs outside the request.
+
+A worker claims jobs with one ``UPDATE ... WHERE job_id IN (SELECT ...
+FOR UPDATE SKIP LOCKED) RETURNING``, so several workers never take the
+same job and never wait on each other's locks. SQLite has no SKIP LOCKED,
+but it runs one write at a time, which gives the same guarantee.
+
+A handler that raises ``RetryJob`` (or any unexpected exception) is retried
+with exponential backoff until its ``max_attempts`` are used up; one that
+raises ``JobFailed`` is not retried. Either way a job that will not run
+again is left with status ``dead`` and its last error, for inspection and
+``flask requeue-dead-jobs``. Only the exception's message is stored, since
+anyone holding the job id can read it; tracebacks go to the server log.
+
+A job whose worker died is claimed again once its lock is ``lock_timeout``
+seconds old, unless its handler was registered with ``rerun_stale=False``:
+such a job may have done its work before the worker died (an STK push may
+have reached the customer's phone), so it is left ``dead`` for someone to
+check instead.
+
+Each worker runs at most ``concurrency`` jobs at a time, and at most the
+handler's own ``concurrency`` of any one kind, which keeps a slow or
+rate-limited API from taking every thread.
+"""
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from models import db, Job
+
+Handler = namedtuple('Handler', ['fn', 'max_attempts', 'concurrency', 'rerun_stale'])
+
+STALE_ERROR = "The worker stopped while running this job; check whether it took effect before requeuing it"
+
+
+class RetryJob(Exception):
+    """Raised by a handler when the job failed but may succeed later."""
+
+
+class JobFailed(Exception):
+    """Raised by a handler when retrying the job cannot help."""
+
+
+class JobQueue:
+    def __init__(self, retry_base=5, retry_max=3600, lock_timeout=300):
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+        self.handlers = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            retry_base=config['JOB_RETRY_BASE_SECONDS'],
+            retry_max=config['JOB_RETRY_MAX_SECONDS'],
+            lock_timeout=config['JOB_LOCK_SECONDS'],
+        )
+
+    def handler(self, kind, max_attempts=5, concurrency=1, rerun_stale=True):
+        """Register ``fn(payload)`` as the handler for ``kind``; its return value is stored as the result.
+
+        With ``rerun_stale=False`` a job whose worker died mid-run is marked
+        dead rather than run again.
+        """
+        def register(fn):
+            self.handlers[kind] = Handler(fn, max_attempts, concurrency, rerun_stale)
+            return fn
+        return register
+
+    def enqueue(self, kind, payload):
+        """Add a job to ``db.session``; it is queued when the caller commits.
+
+        The handler's ``max_attempts`` at this moment is stored on the job.
+        """
+        now = datetime.utcnow()
+        job = Job(
+            job_id=uuid.uuid4().hex, kind=kind, payload=json.dumps(payload), status='queued',
+            attempts=0, max_attempts=self.handlers[kind].max_attempts,
+            run_at=now, created_at=now, updated_at=now,
+        )
+        db.session.add(job)
+        return job
+
+    def claim(self, kind, limit, worker_id):
+        """Mark up to ``limit`` due jobs of ``kind`` as running by ``worker_id`` and return them."""
+        table = Job.__table__
+        now = datetime.utcnow()
+        # Left running by a worker that died
+        stale = and_(table.c.status == 'running', table.c.locked_at < now - self.lock_timeout)
+        queued = and_(table.c.status == 'queued', table.c.run_at <= now)
+        rerun_stale = self.handlers[kind].rerun_stale
+        due = (
+            select(table.c.job_id)
+            .where(table.c.kind == kind, or_(queued, stale) if rerun_stale else queued)
+            .order_by(table.c.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        with db.engine.begin() as connection:
+            if not rerun_stale:
+                connection.execute(
+                    update(table)
+                    .where(table.c.kind == kind, stale)
+                    .values(status='dead', last_error=STALE_ERROR, locked_at=None, locked_by=None, updated_at=now)
+                )
+            return connection.execute(
+                update(table)
+                .where(table.c.job_id.in_(due))
+                .values(status='running', locked_at=now, locked_by=worker_id,
+                        attempts=table.c.attempts + 1, updated_at=now)
+                .returning(table.c.job_id, table.c.kind, table.c.payload, table.c.attempts, table.c.max_attempts)
+            ).all()
+
+    def run(self, job, worker_id):
+        """Run a claimed job and record how it went."""
+        try:
+            result = self.handlers[job.kind].fn(json.loads(job.payload))
+        except JobFailed as e:
+            self._finish(job, worker_id, status='dead', last_error=str(e))
+        except Exception as e:
+            if not isinstance(e, RetryJob):
+                current_app.logger.exception("Job %s (%s) raised", job.job_id, job.kind)
+            error = str(e) or type(e).__name__
+            if job.attempts >= job.max_attempts:
+                self._finish(job, worker_id, status='dead', last_error=error)
+            else:
+                self._finish(job, worker_id, status='queued', last_error=error,
+                             run_at=datetime.utcnow() + timedelta(seconds=self.backoff(job.attempts)))
+        else:
+            self._finish(job, worker_id, status='succeeded', result=json.dumps(result), last_error=None)
+        finally:
+            db.session.remove()
+
+    def backoff(self, attempts):
+        """Seconds before attempt ``attempts + 1``: doubling from ``retry_base``, with jitter."""
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def requeue_dead(self, kind=None):
+        """Give dead jobs a fresh set of attempts; returns how many were requeued."""
+        table = Job.__table__
+        now = datetime.utcnow()
+        statement = update(table).where(table.c.status == 'dead')
+        if kind:
+            statement = statement.where(table.c.kind == kind)
+        with db.engine.begin() as connection:
+            return connection.execute(
+                statement.values(status='queued', attempts=0, run_at=now, updated_at=now)
+            ).rowcount
+
+    def _finish(self, job, worker_id, **values):
+        table = Job.__table__
+        with db.engine.begin() as connection:
+            # Only if no other worker has taken the job over in the meantime
+            connection.execute(
+                update(table)
+                .where(table.c.job_id == job.job_id, table.c.locked_by == worker_id)
+                .values(locked_at=None, locked_by=None, updated_at=datetime.utcnow(), **values)
+            )
+
+
+class Worker:
+    def __init__(self, app, queue, concurrency=4, poll_interval=1.0, kinds=None):
+        self.app = app
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.kinds = list(kinds or queue.handlers)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = {kind: 0 for kind in self.kinds}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+
+    def run(self, once=False):
+        """Claim and run jobs until stopped; with ``once``, until nothing is due."""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stopping.is_set():
+                claimed = 0
+                for kind in self.kinds:
+                    slots = self._free_slots(kind)
+                    if slots <= 0:
+                        continue
+                    with self.app.app_context():
+                        jobs = self.queue.claim(kind, slots, self.worker_id)
+                    for job in jobs:
+                        with self._lock:
+                            self._running[kind] += 1
+                        pool.submit(self._run, job)
+                    claimed += len(jobs)
+                if claimed:
+                    continue
+                with self._lock:
+                    if once and not any(self._running.values()):
+                        break
+                    # Wake up when a job finishes (a slot is free) or after the poll interval
+                    self._idle.wait(self.poll_interval)
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            self._idle.notify_all()
+
+    def _free_slots(self, kind):
+        with self._lock:
+            total = self.concurrency - sum(self._running.values())
+            return min(total, self.queue.handlers[kind].concurrency - self._running[kind])
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                self.queue.run(job, self.worker_id)
+        except Exception:
+            self.app.logger.exception("Job %s could not be recorded", job.job_id)
+        finally:
+            with self._lock:
+                self._running[job.kind] -= 1
+                self._idle.notify_all()
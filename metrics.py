@@ -0,0 +1,97 @@
+"""Per-resource request metrics in Prometheus format.
+
+Every request records its latency, status code, number of SQL statements
+and total time spent in the database, labelled by Flask-RESTful resource
+(the endpoint name) and HTTP method. SQL timings come from SQLAlchemy
+engine events, so every engine the app creates is covered.
+
+Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty writable
+directory: each worker then writes its samples there and ``/metrics``
+aggregates all of them (see ``gunicorn.conf.py``).
+"""
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LABELS = ['resource', 'method']
+
+REQUEST_LATENCY = Histogram(
+    'airescape_request_duration_seconds', 'Request latency by resource and method', LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    'airescape_requests_total', 'Requests by resource, method and status code', LABELS + ['status'],
+)
+REQUEST_STATEMENTS = Histogram(
+    'airescape_request_db_statements', 'SQL statements executed per request', LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+DB_STATEMENTS = Counter(
+    'airescape_db_statements_total', 'SQL statements executed by resource and method', LABELS,
+)
+DB_TIME = Counter(
+    'airescape_db_time_seconds_total', 'Time spent executing SQL by resource and method', LABELS,
+)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    _record_statement(conn.info['statement_start'].pop())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_statement(context):
+    # A statement that raised never reaches after_cursor_execute; without this
+    # its start time would stay on the pooled connection for good
+    if context.execution_context is not None and context.connection.info.get('statement_start'):
+        _record_statement(context.connection.info['statement_start'].pop())
+
+
+def _record_statement(started):
+    if has_request_context() and 'metrics_start' in g:
+        g.db_statements += 1
+        g.db_time += time.perf_counter() - started
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.db_statements = 0
+    g.db_time = 0.0
+
+
+def _after_request(response):
+    if 'metrics_start' not in g or request.endpoint == 'metrics':
+        return response
+    labels = (request.endpoint or 'unmatched', request.method)
+    REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - g.metrics_start)
+    REQUESTS.labels(*labels, str(response.status_code)).inc()
+    REQUEST_STATEMENTS.labels(*labels).observe(g.db_statements)
+    DB_STATEMENTS.labels(*labels).inc(g.db_statements)
+    DB_TIME.labels(*labels).inc(g.db_time)
+    return response
+
+
+def metrics_view():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -51,6 +51,22 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the full-text search objects of hotel_search.py out of autogenerate.
+
+    They are created with raw DDL by their migration, so the models do not
+    describe them and autogenerate would otherwise try to drop them.
+    """
+    if type_ == 'table' and name.startswith('hotels_fts'):
+        # The FTS5 table and its shadow tables (SQLite)
+        return False
+    if type_ == 'column' and name == 'search_vector' and object.table.name == 'hotels':
+        return False
+    if type_ == 'index' and name == 'ix_hotels_search_vector':
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +81,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +110,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,28 @@
+"""Add hotel full-text search
+
+Revision ID: e17b0c4d8a52
+Revises: c5d83f27a916
+Create Date: 2026-10-18 13:05:44.120376
+
+"""
+from alembic import op
+
+import hotel_search
+
+
+# revision identifiers, used by Alembic.
+revision = 'e17b0c4d8a52'
+down_revision = 'c5d83f27a916'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 table and sync triggers on SQLite, generated tsvector and GIN index on PostgreSQL.
+    # Note that batch_alter_table on hotels recreates the table on SQLite and drops
+    # the triggers; run `flask rebuild-hotel-search` after such a migration.
+    hotel_search.install(op.get_bind())
+
+
+def downgrade():
+    hotel_search.uninstall(op.get_bind())
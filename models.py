@@ -1,9 +1,13 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
-from sqlalchemy.orm import validates, relationship
+from sqlalchemy import MetaData, event, inspect
+from sqlalchemy.orm import validates, relationship, Session
 from sqlalchemy_serializer import SerializerMixin
 from datetime import datetime
+import json
 import re
+from amenities import canonical_amenities
+from replicas import RoutingSession
 
 
 metadata = MetaData(
@@ -12,7 +16,7 @@ metadata = MetaData(
     }
 )
 
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 
 class User(db.Model, SerializerMixin):
     __tablename__ = 'users'
@@ -30,6 +34,9 @@ class User(db.Model, SerializerMixin):
     hotels = db.relationship('UserHotel', back_populates='user', cascade="all, delete-orphan")
     bookings = db.relationship('Booking', back_populates='user', cascade="all, delete-orphan")
 
+    # Relationships that may be requested with ?expand=
+    expandable = ('flights', 'hotels', 'bookings')
+
     @validates('email')
     def validate_email(self, key, email):
         regex = r'^\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
@@ -43,8 +50,8 @@ class User(db.Model, SerializerMixin):
             raise ValueError("Phone number must be between 10 and 15 characters")
         return value
 
-    def to_dict(self):
-        return {
+    def to_dict(self, expand=()):
+        data = {
             'user_id': self.user_id,
             'title': self.title,
             'first_name': self.first_name,
@@ -52,16 +59,19 @@ class User(db.Model, SerializerMixin):
             'email': self.email,
             'role': self.role,
             'phone_number': self.phone_number,
-
-            'flights': [uf.to_dict() for uf in self.flights],
-            'hotels': [uh.to_dict() for uh in self.hotels],
-            'bookings': [b.to_dict() for b in self.bookings]
         }
+        for name in expand:
+            data[name] = [item.to_dict() for item in getattr(self, name)]
+        return data
 
     def __repr__(self):
         return f'<User {self.user_id}, {self.first_name}, {self.email}, {self.role}>'
 class Flight(db.Model, SerializerMixin):
     __tablename__ = 'flights'
+    __table_args__ = (
+        # Serves the route + date search in Flights.get
+        db.Index('ix_flights_route_departure', 'departure_city', 'arrival_city', 'departure_date'),
+    )
     
     flight_id = db.Column(db.Integer, primary_key=True, unique=True)
     flight_number = db.Column(db.String, nullable=False, unique=True)
@@ -74,12 +84,17 @@ class Flight(db.Model, SerializerMixin):
     price = db.Column(db.Float, nullable=False)
     seats_available = db.Column(db.Integer, nullable=False)
     trip_type = db.Column(db.String(10), nullable=False)  # New field
+    # Bumped on every write so clients can revalidate with If-None-Match
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     user_flights = db.relationship('UserFlight', back_populates='flight', cascade="all, delete-orphan")
     bookings = db.relationship('Booking', back_populates='flight', cascade="all, delete-orphan")
 
-    def to_dict(self):
-        return {
+    # Relationships that may be requested with ?expand=
+    expandable = ('user_flights', 'bookings')
+
+    def to_dict(self, expand=()):
+        data = {
             'flight_id': self.flight_id,
             'flight_number': self.flight_number,
             'departure_city': self.departure_city,
@@ -91,9 +106,44 @@ class Flight(db.Model, SerializerMixin):
             'price': self.price,
             'seats_available': self.seats_available,
             'trip_type': self.trip_type,
-            'user_flights': [uf.to_dict() for uf in self.user_flights],
-            'bookings': [b.to_dict() for b in self.bookings]
         }
+        for name in expand:
+            data[name] = [item.to_dict() for item in getattr(self, name)]
+        return data
+
+    @classmethod
+    def reserve_seats(cls, flight_id, seats):
+        # A single conditional UPDATE, so concurrent bookings can never take
+        # seats_available below zero. Runs in the caller's transaction.
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.flight_id == flight_id, cls.seats_available >= seats)
+            .values(seats_available=cls.seats_available - seats, version=cls.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        ChangeCounter.mark(db.session, 'flights')
+        return True
+
+    @classmethod
+    def reserve_seats_many(cls, seats_by_flight):
+        """Take seats on several flights at once: all of them or none.
+
+        One conditional UPDATE covers every flight; if any flight is missing
+        or short of seats the rowcount tells, and the caller rolls back.
+        """
+        seats = db.case(seats_by_flight, value=cls.flight_id)
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.flight_id.in_(seats_by_flight), cls.seats_available >= seats)
+            .values(seats_available=cls.seats_available - seats, version=cls.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(seats_by_flight):
+            return False
+        ChangeCounter.mark(db.session, 'flights')
+        return True
 
     def __repr__(self):
         return f'<Flight {self.flight_id}, {self.flight_number}, {self.trip_type}>'
@@ -109,26 +159,61 @@ class Hotel(db.Model, SerializerMixin):
     price_per_night = db.Column(db.Float, nullable=False)
     amenities = db.Column(db.Text, nullable=True)
     image_url = db.Column(db.Text, nullable=True)
+    # Bumped on every write so clients can revalidate with If-None-Match
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     user_hotels = db.relationship('UserHotel', back_populates='hotel', cascade="all, delete-orphan")
     bookings = db.relationship('Booking', back_populates='hotel', cascade="all, delete-orphan")
+    amenity_tags = db.relationship('HotelAmenity', back_populates='hotel', cascade="all, delete-orphan")
 
-    def to_dict(self):
-        return {
+    # Relationships that may be requested with ?expand=
+    expandable = ('user_hotels', 'bookings', 'amenity_tags')
+
+    def sync_amenity_tags(self):
+        # Rebuild the normalized amenity rows from the free-text amenities column
+        wanted = set(canonical_amenities(self.amenities))
+        self.amenity_tags = [tag for tag in self.amenity_tags if tag.amenity in wanted]
+        existing = {tag.amenity for tag in self.amenity_tags}
+        for name in sorted(wanted - existing):
+            self.amenity_tags.append(HotelAmenity(amenity=name))
+
+    def to_dict(self, expand=()):
+        data = {
             'hotel_id': self.hotel_id,
             'name': self.name,
             'location': self.location,
             'price_per_night': self.price_per_night,
             'amenities': self.amenities,
             'image_url': self.image_url,
-            
-            'user_hotels': [uh.to_dict() for uh in self.user_hotels],
-            'bookings': [b.to_dict() for b in self.bookings]
         }
+        for name in expand:
+            data[name] = [item.to_dict() for item in getattr(self, name)]
+        return data
 
     def __repr__(self):
         return f'<Hotel {self.hotel_id}, {self.name}, {self.location}>'
 
+class HotelAmenity(db.Model, SerializerMixin):
+    __tablename__ = 'hotel_amenities'
+    __table_args__ = (
+        # Serves amenity filters and facet counts in Hotels.get
+        db.Index('ix_hotel_amenities_amenity', 'amenity', 'hotel_id'),
+    )
+
+    hotel_id = db.Column(db.Integer, db.ForeignKey('hotels.hotel_id'), primary_key=True)
+    amenity = db.Column(db.String(50), primary_key=True)
+
+    hotel = db.relationship('Hotel', back_populates='amenity_tags')
+
+    def to_dict(self):
+        return {
+            'hotel_id': self.hotel_id,
+            'amenity': self.amenity
+        }
+
+    def __repr__(self):
+        return f'<HotelAmenity {self.hotel_id}, {self.amenity}>'
+
 class UserFlight(db.Model, SerializerMixin):
     __tablename__ = 'user_flights'
     
@@ -187,8 +272,8 @@ class Booking(db.Model, SerializerMixin):
     flight = db.relationship('Flight', back_populates='bookings')
     hotel = db.relationship('Hotel', back_populates='bookings')
 
-    def to_dict(self):
-        return {
+    def to_dict(self, expand=()):
+        data = {
             'booking_id': self.booking_id,
             'user_id': self.user_id,
             'booking_date': self.booking_date.isoformat() if self.booking_date else None,
@@ -199,6 +284,172 @@ class Booking(db.Model, SerializerMixin):
             'hotel_id': self.hotel_id
             
         }
+        for name in expand:
+            data[name] = [item.to_dict() for item in getattr(self, name)]
+        return data
 
     def __repr__(self):
         return f'<Booking {self.booking_id}, {self.user_id}, {self.total_price}, {self.booking_type}, {self.booking_status}>'
+
+
+class ChangeCounter(db.Model):
+    """Per-table write counter used to build ETags for collection responses.
+
+    Session writes only ``mark`` the tables they changed; the counters are
+    bumped in a short transaction of their own once the session commits.
+    Bumping inside the writer's transaction would hold the lock on the
+    table's single counter row until commit, so every booking on every
+    flight would queue behind the one before it.
+    """
+    __tablename__ = 'change_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def bump(cls, connection, *names):
+        now = datetime.utcnow()
+        for name in names:
+            result = connection.execute(
+                db.update(cls.__table__)
+                .where(cls.__table__.c.name == name)
+                .values(version=cls.__table__.c.version + 1, updated_at=now)
+            )
+            if result.rowcount == 0:
+                connection.execute(db.insert(cls.__table__).values(name=name, version=1, updated_at=now))
+
+    @classmethod
+    def mark(cls, session, *names):
+        """Bump ``names`` after ``session`` commits (and not at all if it rolls back)."""
+        session.info.setdefault('changed_tables', set()).update(names)
+
+    @classmethod
+    def current(cls, name):
+        """Return ``(version, updated_at)`` for a table, without touching its rows."""
+        row = db.session.execute(
+            db.select(cls.version, cls.updated_at).where(cls.name == name)
+        ).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    def __repr__(self):
+        return f'<ChangeCounter {self.name}, {self.version}>'
+
+
+class IdempotencyKey(db.Model):
+    """A client's Idempotency-Key and the response its first request produced."""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # Serves the sweep of expired keys
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    scope = db.Column(db.String(64), primary_key=True)  # "user:<id>" or "anonymous:<hash of address and User-Agent>"
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL while the first request is still running
+    status_code = db.Column(db.Integer, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.scope}, {self.key}, {self.status_code}>'
+
+
+class Job(db.Model):
+    """Outbound work (STK push, email) run by ``flask run-worker``; see jobs.py."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Serves the worker's claim of due jobs
+        db.Index('ix_jobs_kind_status_run_at', 'kind', 'status', 'run_at'),
+    )
+
+    job_id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, so ids cannot be guessed
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    # queued, running, succeeded or dead
+    status = db.Column(db.String(20), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'last_error': self.last_error,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+    def __repr__(self):
+        return f'<Job {self.job_id}, {self.kind}, {self.status}>'
+
+
+# Tables whose changes are tracked by version column and ChangeCounter
+VERSIONED_TABLES = {Flight: 'flights', Hotel: 'hotels'}
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_row_versions(session, flush_context, instances):
+    changed = session.info.setdefault('changed_tables', set())
+    for obj in session.new:
+        if type(obj) in VERSIONED_TABLES:
+            changed.add(VERSIONED_TABLES[type(obj)])
+        if isinstance(obj, Hotel):
+            obj.sync_amenity_tags()
+    for obj in list(session.dirty):
+        if type(obj) in VERSIONED_TABLES and session.is_modified(obj, include_collections=False):
+            # Evaluated by the database, so concurrent writers never reuse a version
+            obj.version = type(obj).version + 1
+            changed.add(VERSIONED_TABLES[type(obj)])
+        if isinstance(obj, Hotel) and inspect(obj).attrs.amenities.history.has_changes():
+            obj.sync_amenity_tags()
+    for obj in session.deleted:
+        if type(obj) in VERSIONED_TABLES:
+            changed.add(VERSIONED_TABLES[type(obj)])
+
+
+@event.listens_for(Session, 'after_commit')
+def _commit_change_counters(session):
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        session.info['committed_tables'] = changed
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _bump_change_counters(session, transaction):
+    # Only once the session has given its connection back: taking a second
+    # one while holding the first can empty the pool under load
+    if transaction.parent is not None:
+        return
+    changed = session.info.pop('committed_tables', None)
+    if not changed:
+        return
+    try:
+        # Its own transaction on the primary, so the counter row is locked only for the bump
+        with db.engine.begin() as connection:
+            ChangeCounter.bump(connection, *sorted(changed))
+    except Exception:
+        # The data is committed; failing the caller's commit now would report a
+        # saved booking as an error and invite a retry. Until the next write to
+        # these tables their ETags stay unchanged.
+        current_app.logger.exception("Could not bump the change counters of %s", ', '.join(sorted(changed)))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_change_counters(session):
+    session.info.pop('changed_tables', None)
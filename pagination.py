@@ -0,0 +1,90 @@
+"""Keyset (cursor) pagination for the collection endpoints.
+
+Pages are read with ``WHERE (sort_key, pk) > (last_sort_key, last_pk)``
+instead of ``OFFSET``, so fetching page N costs the same as page 1.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    """Raised for a bad ``limit``, ``sort`` or ``cursor`` query argument."""
+
+
+def encode_cursor(sort, value, pk):
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "v": value, "k": pk}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, column):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload["s"] != sort:
+            raise PaginationError("Cursor does not match the requested sort order")
+        value = payload["v"]
+        if column is not None and column.type.python_type is datetime and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, payload["k"]
+    except PaginationError:
+        raise
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate(query, pk, sort_keys, args):
+    """Return ``(rows, next_cursor)`` for one page of ``query``.
+
+    ``sort_keys`` maps the names accepted in ``?sort=`` to columns. A leading
+    ``-`` sorts descending. The primary key ``pk`` is always used as the
+    tie-breaker so the ordering is total and stable between pages.
+    """
+    sort = args.get('sort', pk.key)
+    descending = sort.startswith('-')
+    name = sort[1:] if descending else sort
+    if name not in sort_keys:
+        raise PaginationError(f"Cannot sort by: {name}")
+    column = sort_keys[name]
+    limit = parse_limit(args)
+
+    cursor = args.get('cursor')
+    if cursor:
+        value, last_pk = decode_cursor(cursor, sort, column)
+        if column is pk:
+            query = query.filter(pk < last_pk if descending else pk > last_pk)
+        elif descending:
+            query = query.filter(or_(column < value, and_(column == value, pk < last_pk)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, pk > last_pk)))
+
+    if descending:
+        query = query.order_by(column.desc(), pk.desc())
+    else:
+        query = query.order_by(column.asc(), pk.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, column.key), getattr(last, pk.key))
+    return rows, next_cursor
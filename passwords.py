@@ -0,0 +1,60 @@
+"""Bounded bcrypt hashing for login and signup.
+
+Hashes run on a small thread pool so that only ``max_workers`` of them use
+the CPU at once. Callers beyond the pool size wait in a queue of at most
+``max_queue``; anything past that is turned away with ``HashingBusy``
+instead of starving cheap endpoints of worker time.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, bcrypt, rounds=12, max_workers=2, max_queue=16, retry_after=1):
+        self.bcrypt = bcrypt
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    @classmethod
+    def from_config(cls, bcrypt, config):
+        return cls(
+            bcrypt,
+            rounds=config['BCRYPT_LOG_ROUNDS'],
+            max_workers=config['PASSWORD_HASH_WORKERS'],
+            max_queue=config['PASSWORD_HASH_QUEUE'],
+            retry_after=config['PASSWORD_HASH_RETRY_AFTER'],
+        )
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
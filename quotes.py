@@ -0,0 +1,82 @@
+"""Server-side fare quotes.
+
+An itinerary is a flight plus a passenger count, a hotel plus a number of
+nights, or both. ``quote_itineraries`` prices any number of them with one
+query for all referenced flights and one for all referenced hotels, then a
+single pass over the batch; ``POST /quotes`` and ``Bookings.post`` both go
+through it, so a booking's ``total_price`` is always computed here.
+"""
+from collections import namedtuple
+
+from models import db, Flight, Hotel
+
+Itinerary = namedtuple('Itinerary', ['flight_id', 'passengers', 'hotel_id', 'nights'])
+
+
+class QuoteError(ValueError):
+    """Raised for an itinerary that cannot be priced; ``status`` is the HTTP code to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_itinerary(data):
+    """Validate an itinerary payload (the same fields ``POST /bookings`` takes)."""
+    if not isinstance(data, dict):
+        raise QuoteError("Expected a JSON object")
+    flight_id = data.get('flight_id')
+    hotel_id = data.get('hotel_id')
+    if not flight_id and not hotel_id:
+        raise QuoteError("flight_id or hotel_id is required")
+    try:
+        flight_id = int(flight_id) if flight_id else None
+        hotel_id = int(hotel_id) if hotel_id else None
+    except (TypeError, ValueError):
+        raise QuoteError("flight_id and hotel_id must be integers")
+    try:
+        passengers = int(data.get('passengers', 1))
+        nights = int(data.get('nights', 1))
+    except (TypeError, ValueError):
+        raise QuoteError("passengers and nights must be integers")
+    if passengers < 1 or nights < 1:
+        raise QuoteError("passengers and nights must be at least 1")
+    return Itinerary(flight_id, passengers if flight_id else None, hotel_id, nights if hotel_id else None)
+
+
+def _prices(column, price, extra, ids):
+    if not ids:
+        return {}
+    rows = db.session.execute(db.select(column, price, *extra).where(column.in_(ids)))
+    return {row[0]: row[1:] for row in rows}
+
+
+def quote_itineraries(itineraries):
+    """Price ``itineraries`` in order; an unknown flight or hotel gives a ``QuoteError`` in its place."""
+    flights = _prices(Flight.flight_id, Flight.price, [Flight.seats_available],
+                      {itinerary.flight_id for itinerary in itineraries if itinerary.flight_id})
+    hotels = _prices(Hotel.hotel_id, Hotel.price_per_night, [],
+                     {itinerary.hotel_id for itinerary in itineraries if itinerary.hotel_id})
+
+    quotes = []
+    for flight_id, passengers, hotel_id, nights in itineraries:
+        quote = {'flight_id': flight_id, 'hotel_id': hotel_id, 'total_price': 0}
+        if flight_id:
+            flight = flights.get(flight_id)
+            if flight is None:
+                quotes.append(QuoteError("Flight not found", 404))
+                continue
+            price, seats = flight
+            quote.update(passengers=passengers, fare=price, flight_total=price * passengers,
+                         bookable=seats >= passengers)
+            quote['total_price'] += price * passengers
+        if hotel_id:
+            hotel = hotels.get(hotel_id)
+            if hotel is None:
+                quotes.append(QuoteError("Hotel not found", 404))
+                continue
+            price_per_night, = hotel
+            quote.update(nights=nights, price_per_night=price_per_night, hotel_total=price_per_night * nights)
+            quote['total_price'] += price_per_night * nights
+        quotes.append(quote)
+    return quotes
@@ -0,0 +1,155 @@
+"""Read-replica routing.
+
+When ``SQLALCHEMY_BINDS`` has a ``replica`` engine, GET and HEAD requests
+read through it and everything else uses the primary. ``RoutingSession``
+makes the choice per statement: flushes and INSERT/UPDATE/DELETE always go
+to the primary, so a GET that happens to write still works.
+
+A request stays on the primary when:
+
+* the client's requests wrote to the database in the last
+  ``sticky_seconds`` (read your own writes). Writers are remembered by JWT
+  identity in this worker and by a short-lived cookie that follows the
+  client to other workers;
+* the replica is more than ``max_lag`` seconds behind, or unreachable.
+
+Lag is measured every ``check_interval`` seconds by comparing the
+``change_counters`` rows of both databases: while the replica has an older
+version of any counter, its lag is taken as the time since the last bump
+of that counter the replica has applied. Under steady writes that
+overstates a small lag rather than hiding a large one, so the error is
+always towards reading from the primary. This works for any backend,
+including two SQLite files standing in for a primary and a replica.
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import UpdateBase, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import TTLCache
+
+BIND_KEY = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+STICKY_COOKIE = 'read_primary_until'
+
+
+class RoutingSession(Session):
+    """``db.session`` that sends a request's reads to the replica when the router allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and 'replica_router' in current_app.extensions:
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.wrote_primary = True
+            elif current_app.extensions['replica_router'].use_replica():
+                return self._db.engines[BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, db, max_lag=5.0, check_interval=1.0, sticky_seconds=10):
+        self.db = db
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.recent_writers = TTLCache(maxsize=100000, ttl=sticky_seconds)
+        self._lag = 0.0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, db, config):
+        return cls(
+            db,
+            max_lag=config['REPLICA_MAX_LAG_SECONDS'],
+            check_interval=config['REPLICA_LAG_CHECK_SECONDS'],
+            sticky_seconds=config['REPLICA_STICKY_SECONDS'],
+        )
+
+    def init_app(self, app):
+        if BIND_KEY not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            return
+        app.extensions['replica_router'] = self
+        app.after_request(self._after_request)
+
+    def use_replica(self):
+        """Whether this request should read from the replica; decided once, on its first query."""
+        if 'read_replica' not in g:
+            g.read_replica = request.method in READ_METHODS and not self._sticky() and self.lag() <= self.max_lag
+        return g.read_replica
+
+    def lagging(self):
+        """True when this request read from a replica that was behind at the last check.
+
+        Responses built from such reads can be served, but should not be
+        put in shared caches that writes have already invalidated.
+        """
+        return bool(g.get('read_replica')) and self._lag > 0
+
+    def lag(self):
+        """Seconds the replica is behind the primary (``inf`` if it cannot be reached)."""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            # One worker thread measures while the others use the previous value
+            if self._lock.acquire(blocking=self._checked_at is None):
+                try:
+                    self._lag = self._measure()
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._lag
+
+    def _measure(self):
+        query = text("SELECT name, version, updated_at FROM change_counters")
+        try:
+            with self.db.engines[None].connect() as connection:
+                primary = {name: version for name, version, _ in connection.execute(query)}
+            with self.db.engines[BIND_KEY].connect() as connection:
+                replica = {name: (version, updated_at) for name, version, updated_at in connection.execute(query)}
+        except SQLAlchemyError as e:
+            current_app.logger.warning("Replica lag check failed, reading from the primary: %s", e)
+            return math.inf
+        applied = []
+        for name, version in primary.items():
+            if name not in replica:
+                return math.inf  # Not one of this counter's bumps has reached the replica
+            replica_version, updated_at = replica[name]
+            if replica_version < version:
+                applied.append(_as_datetime(updated_at))
+        if not applied:
+            return 0.0
+        return max((datetime.utcnow() - min(applied)).total_seconds(), 0.0)
+
+    def _identity(self):
+        try:
+            return get_jwt_identity()
+        except RuntimeError:  # No JWT verified on this request
+            return None
+
+    def _sticky(self):
+        identity = self._identity()
+        if identity is not None and self.recent_writers.get(identity):
+            return True
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _after_request(self, response):
+        if g.get('wrote_primary') and response.status_code < 400:
+            identity = self._identity()
+            if identity is not None:
+                self.recent_writers.set(identity, True)
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + self.sticky_seconds)),
+                                max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+def _as_datetime(value):
+    # SQLite returns DATETIME columns read through text() as strings
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
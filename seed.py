@@ -1,106 +1,162 @@
-from app import app
-from models import db, User, Flight, Hotel, Booking, UserFlight, UserHotel
+"""Seed the database.
+
+    python seed.py                      # the small demo data set below
+    python seed.py --rows 1m --seed 42  # a synthetic data set (see dataset.py)
+
+Rows are written with the Core bulk loader in bulk_load.py, in a single
+transaction. Loads of --index-threshold rows or more drop the secondary
+indexes first and rebuild them at the end.
+"""
+import argparse
+import time as clock
 from datetime import datetime, time
 
-with app.app_context():
+from app import app, passwords
+from amenities import canonical_amenities
+from bulk_load import bulk_transaction, load_tables
+from models import db, User, Flight, Hotel, HotelAmenity, Booking, UserFlight, UserHotel, ChangeCounter
+import dataset as datasets
+
+
+def user(user_id, first_name, last_name, email, role, phone_number):
+    return {"user_id": user_id, "title": None, "first_name": first_name, "last_name": last_name,
+            "email": email, "role": role, "phone_number": phone_number}
+
+
+def flight(flight_id, number, origin, destination, day, departs, arrives, price, seats, trip_type="oneway"):
+    return {"flight_id": flight_id, "flight_number": number, "departure_city": origin, "arrival_city": destination,
+            "departure_date": day, "arrival_date": day, "departure_time": departs, "arrival_time": arrives,
+            "price": price, "seats_available": seats, "trip_type": trip_type, "version": 1}
+
+
+def hotel(hotel_id, name, image_url, location, price_per_night, amenities):
+    return {"hotel_id": hotel_id, "name": name, "image_url": image_url, "location": location,
+            "price_per_night": price_per_night, "amenities": amenities, "version": 1}
+
+
+def demo_tables(password):
+    users = [dict(row, password=password) for row in (
+        user(1, "Alice", "Johnson", "alice@gmail.com", "traveler", "0734567890"),
+        user(2, "Bob", "Smith", "bob@gmail.com", "traveler", "0787654321"),
+        user(3, "Admin", "User", "admin@gmail.com", "admin", "0722334455"),
+        user(4, "Charlie", "Brown", "charlie@gmail.com", "traveler", "0733445566"),
+        user(5, "Diana", "Prince", "diana@gmail.com", "traveler", "0744556677"),
+        user(6, "Eve", "Polastri", "eve@gmail.com", "traveler", "0755667788"),
+        user(7, "Frank", "Castle", "frank@gmail.com", "traveler", "0766778899"),
+        user(8, "Grace", "Hopper", "grace@gmail.com", "traveler", "0777889900"),
+        user(9, "Hank", "Pym", "hank@gmail.com", "traveler", "0788990011"),
+        user(10, "Ivy", "Green", "ivy@gmail.com", "traveler", "0799001122"),
+    )]
 
-    print("Deleting data...")
-    UserFlight.query.delete()
-    UserHotel.query.delete()
-    Booking.query.delete()
-    Flight.query.delete()
-    Hotel.query.delete()
-    User.query.delete()
-
-    print("Creating users...")
-    user1 = User(first_name="Alice", last_name="Johnson", email="alice@gmail.com", password="password", role="traveler", phone_number="0734567890")
-    user2 = User(first_name="Bob", last_name="Smith", email="bob@gmail.com", password="password", role="traveler", phone_number="0787654321")
-    user3 = User(first_name="Admin", last_name="User", email="admin@gmail.com", password="password", role="admin", phone_number="0722334455")
-    user4 = User(first_name="Charlie", last_name="Brown", email="charlie@gmail.com", password="password", role="traveler", phone_number="0733445566")
-    user5 = User(first_name="Diana", last_name="Prince", email="diana@gmail.com", password="password", role="traveler", phone_number="0744556677")
-    user6 = User(first_name="Eve", last_name="Polastri", email="eve@gmail.com", password="password", role="traveler", phone_number="0755667788")
-    user7 = User(first_name="Frank", last_name="Castle", email="frank@gmail.com", password="password", role="traveler", phone_number="0766778899")
-    user8 = User(first_name="Grace", last_name="Hopper", email="grace@gmail.com", password="password", role="traveler", phone_number="0777889900")
-    user9 = User(first_name="Hank", last_name="Pym", email="hank@gmail.com", password="password", role="traveler", phone_number="0788990011")
-    user10 = User(first_name="Ivy", last_name="Green", email="ivy@gmail.com", password="password", role="traveler", phone_number="0799001122")
-
-    users = [user1, user2, user3, user4, user5, user6, user7, user8, user9, user10]
-
-
-    print("Creating flights...")
     flights = [
-        Flight(flight_number="AA123", departure_city="Nairobi", arrival_city="Kisumu", departure_date=datetime(2024, 8, 15), arrival_date=datetime(2024, 8, 15), departure_time=time(10, 0), arrival_time=time(11, 0), price=7420, seats_available=10, trip_type="oneway"),
-        Flight(flight_number="BA456", departure_city="Mombasa", arrival_city="Nairobi", departure_date=datetime(2024, 9, 10), arrival_date=datetime(2024, 9, 10), departure_time=time(9, 0), arrival_time=time(10, 0), price=7000, seats_available=80, trip_type="oneway"),
-        Flight(flight_number="BA457", departure_city="Eldoret", arrival_city="Nairobi", departure_date=datetime(2024, 8, 20), arrival_date=datetime(2024, 8, 20), departure_time=time(9, 0), arrival_time=time(10, 0), price=1, seats_available=80, trip_type="oneway"),
-        
-        
+        flight(1, "AA123", "Nairobi", "Kisumu", datetime(2024, 8, 15), time(10, 0), time(11, 0), 7420, 10),
+        flight(2, "BA456", "Mombasa", "Nairobi", datetime(2024, 9, 10), time(9, 0), time(10, 0), 7000, 80),
+        flight(3, "BA457", "Eldoret", "Nairobi", datetime(2024, 8, 20), time(9, 0), time(10, 0), 1, 80),
 
         # Roundtrip flights: Nairobi to Kisumu and back
-        Flight(flight_number="RT123-OUT", departure_city="Nairobi", arrival_city="Kisumu", departure_date=datetime(2024, 12, 15), arrival_date=datetime(2024, 12, 15), departure_time=time(8, 0), arrival_time=time(9, 0), price=5000, seats_available=20, trip_type="roundtrip"),
-        Flight(flight_number="RT123-RET", departure_city="Kisumu", arrival_city="Nairobi", departure_date=datetime(2024, 12, 20), arrival_date=datetime(2024, 12, 20), departure_time=time(10, 0), arrival_time=time(11, 0), price=5000, seats_available=20, trip_type="roundtrip"),
-        
+        flight(4, "RT123-OUT", "Nairobi", "Kisumu", datetime(2024, 12, 15), time(8, 0), time(9, 0), 5000, 20, "roundtrip"),
+        flight(5, "RT123-RET", "Kisumu", "Nairobi", datetime(2024, 12, 20), time(10, 0), time(11, 0), 5000, 20, "roundtrip"),
+
         # Roundtrip flights: Mombasa to Nairobi and back
-        Flight(flight_number="RT456-OUT", departure_city="Mombasa", arrival_city="Nairobi", departure_date=datetime(2024, 9, 10), arrival_date=datetime(2024, 9, 10), departure_time=time(9, 0), arrival_time=time(10, 0), price=7000, seats_available=80, trip_type="roundtrip"),
-        Flight(flight_number="RT456-RET", departure_city="Nairobi", arrival_city="Mombasa", departure_date=datetime(2024, 11, 20), arrival_date=datetime(2024, 11, 20), departure_time=time(7, 0), arrival_time=time(8, 0), price=9940, seats_available=12, trip_type="roundtrip"),
-        
+        flight(6, "RT456-OUT", "Mombasa", "Nairobi", datetime(2024, 9, 10), time(9, 0), time(10, 0), 7000, 80, "roundtrip"),
+        flight(7, "RT456-RET", "Nairobi", "Mombasa", datetime(2024, 11, 20), time(7, 0), time(8, 0), 9940, 12, "roundtrip"),
+
         # Roundtrip flights: Eldoret to Mombasa and back
-        Flight(flight_number="RT789-OUT", departure_city="Eldoret", arrival_city="Mombasa", departure_date=datetime(2024, 12, 25), arrival_date=datetime(2024, 12, 25), departure_time=time(2, 0), arrival_time=time(3, 0), price=7999, seats_available=50, trip_type="roundtrip"),
-        Flight(flight_number="RT789-RET", departure_city="Mombasa", arrival_city="Eldoret", departure_date=datetime(2024, 12, 30), arrival_date=datetime(2024, 12, 30), departure_time=time(1, 0), arrival_time=time(2, 0), price=6400, seats_available=11, trip_type="roundtrip"),
-        
-        Flight(flight_number="CA789", departure_city="Eldoret", arrival_city="Nairobi", departure_date=datetime(2024, 10, 5), arrival_date=datetime(2024, 10, 5), departure_time=time(8, 0), arrival_time=time(9, 0), price=8025, seats_available=6, trip_type="oneway"),
-        Flight(flight_number="DA321", departure_city="Nairobi", arrival_city="Mombasa", departure_date=datetime(2024, 11, 20), arrival_date=datetime(2024, 11, 20), departure_time=time(7, 0), arrival_time=time(8, 0), price=9940, seats_available=12, trip_type="oneway"),
-        Flight(flight_number="EA654", departure_city="Kisumu", arrival_city="Nairobi", departure_date=datetime(2024, 12, 1), arrival_date=datetime(2024, 12, 1), departure_time=time(6, 0), arrival_time=time(7, 0), price=9560, seats_available=12, trip_type="oneway"),
-        Flight(flight_number="FA987", departure_city="Nairobi", arrival_city="Eldoret", departure_date=datetime(2024, 12, 10), arrival_date=datetime(2024, 12, 10), departure_time=time(5, 0), arrival_time=time(6, 0), price=6999, seats_available=7, trip_type="oneway"),
-        Flight(flight_number="GA123", departure_city="Mombasa", arrival_city="Kisumu", departure_date=datetime(2024, 12, 15), arrival_date=datetime(2024, 12, 15), departure_time=time(4, 0), arrival_time=time(5, 0), price=7500, seats_available=5, trip_type="oneway"),
-        Flight(flight_number="HA456", departure_city="Kisumu", arrival_city="Eldoret", departure_date=datetime(2024, 12, 20), arrival_date=datetime(2024, 12, 20), departure_time=time(3, 0), arrival_time=time(4, 0), price=8175, seats_available=9, trip_type="oneway"),
-        Flight(flight_number="JA321", departure_city="Nairobi", arrival_city="Nakuru", departure_date=datetime(2024, 12, 30), arrival_date=datetime(2024, 12, 30), departure_time=time(1, 0), arrival_time=time(2, 0), price=6400, seats_available=11, trip_type="oneway"),
-        Flight(flight_number="KA654", departure_city="Nakuru", arrival_city="Nairobi", departure_date=datetime(2024, 12, 31), arrival_date=datetime(2024, 12, 31), departure_time=time(0, 0), arrival_time=time(1, 0), price=6740, seats_available=15, trip_type="oneway")
+        flight(8, "RT789-OUT", "Eldoret", "Mombasa", datetime(2024, 12, 25), time(2, 0), time(3, 0), 7999, 50, "roundtrip"),
+        flight(9, "RT789-RET", "Mombasa", "Eldoret", datetime(2024, 12, 30), time(1, 0), time(2, 0), 6400, 11, "roundtrip"),
+
+        flight(10, "CA789", "Eldoret", "Nairobi", datetime(2024, 10, 5), time(8, 0), time(9, 0), 8025, 6),
+        flight(11, "DA321", "Nairobi", "Mombasa", datetime(2024, 11, 20), time(7, 0), time(8, 0), 9940, 12),
+        flight(12, "EA654", "Kisumu", "Nairobi", datetime(2024, 12, 1), time(6, 0), time(7, 0), 9560, 12),
+        flight(13, "FA987", "Nairobi", "Eldoret", datetime(2024, 12, 10), time(5, 0), time(6, 0), 6999, 7),
+        flight(14, "GA123", "Mombasa", "Kisumu", datetime(2024, 12, 15), time(4, 0), time(5, 0), 7500, 5),
+        flight(15, "HA456", "Kisumu", "Eldoret", datetime(2024, 12, 20), time(3, 0), time(4, 0), 8175, 9),
+        flight(16, "JA321", "Nairobi", "Nakuru", datetime(2024, 12, 30), time(1, 0), time(2, 0), 6400, 11),
+        flight(17, "KA654", "Nakuru", "Nairobi", datetime(2024, 12, 31), time(0, 0), time(1, 0), 6740, 15),
     ]
 
-    print("Creating hotels....")
     hotels = [
-        Hotel(name="Southern Palms Beach Resort", image_url="https://cf.bstatic.com/xdata/images/hotel/max1024x768/221320289.jpg?k=1203f024f73c994f979bc9aea38a85e531a038f988994c1681df935203e83845&o=&hp=1", location="Diani Beach Road Diani, Ukunda", price_per_night=25000, amenities="2 outdoor swimming pools, Free on-site parking, Air conditioning, Private Bathroom, Free Wifi, Room service, Family rooms, 5 restaurants, Breakfast, Spa, Gym"),
-        Hotel(name="Kilili Baharini Resort & Spa", image_url="https://www.kililibaharini.com/wp-content/uploads/2019/11/mainpool-slide.jpg", location="Casuarina Road, Malindi, Kenya", price_per_night=18000, amenities="Beach Access, Free Breakfast, Gym, Free Parking"),
-        Hotel(name="Hemingways Watamu", image_url="https://www.shadesofafricasafaris.com/images/hemingways-watamu4.jpg", location="Watamu, Kenya", price_per_night=15000, amenities="2 swimming pools, Free Wifi, Beachfront, Family rooms, Airport shuttle, Restaurant, Fitness center, Tea/Coffee Maker in All Rooms, Bar, Breakfast, Free Breakfast"),
-        Hotel(name="Mnarani Beach Club", image_url="https://dynamic-media-cdn.tripadvisor.com/media/photo-o/2b/61/9a/9d/caption.jpg?w=700&h=-1&s=1", location="Kilifi, Kenya", price_per_night=15000, amenities="Free WiFi, Gym, Valet Parking, Restaurant"),
-        Hotel(name="Movenpick Hotel & Residences Nairobi", image_url="https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRoJx9UPSgJCe-qvNHQ0bVD3U6oX5NI-be40A&s", location="Nairobi, Kenya", price_per_night=29000, amenities="Free WiFi, Bowling offsite, Airport shuttle, Chapel/shrine, Sauna, Fitness center Gym, Tea/coffee maker in all rooms, Free Parking"),
-        Hotel(name="Villa Rosa Kempinski Nairobi", image_url="https://cf.bstatic.com/xdata/images/hotel/max1024x768/43569297.jpg?k=1cb33050f9949454276dc0b61159c39405baaf58b823b4c1201136894efefb7f&o=&hp=1", location="Chiromo Road, Nairobi, Kenya", price_per_night=25000, amenities="9 treatment rooms, a lounge area for relaxing after treatments, a jacuzzi, sauna, steam room, heated swimming pool, and well-equipped gym."),
-        Hotel(name="Sarova Imperial Kisumu", image_url="https://dynamic-media-cdn.tripadvisor.com/media/photo-o/27/57/9b/66/imperial-hotel.jpg?w=700&h=-1&s=1", location="Achieng' Oneko Rd, Kisumu", price_per_night=15000, amenities="Free WiFi, Airport shuttle, Fitness center Gym, Facilities for disabled guests, Tea/coffee maker in all rooms, Free Parking"),
-        Hotel(name="Eka Hotel, Eldoret", image_url="https://tembeatujengekenya.com/wp-content/uploads/2022/05/DJI_0968.jpg", location="Eldoret, Kenya", price_per_night=13000, amenities="TV with DSTV connection, complimentary high-speed Wi-fi, minibar, safety deposit box, coffee/tea making facilities, telephone, hair dryers and Iron/Ironing boards on request, bathroom with toiletries."),
-        Hotel(name="Lake Nakuru Lodge", image_url="https://dynamic-media-cdn.tripadvisor.com/media/photo-o/1a/bf/51/8f/lake-nakuru-lodge.jpg?w=500&h=-1&s=1", location="Lake Nakuru National Park, Kenya", price_per_night=10000, amenities="Free WiFi, seating area and flat-screen TV. There is a private bathroom with bath and free toiletries in each unit, along with a hair dryer."),
-        Hotel(name="Little Governors' Camp", image_url="https://dynamic-media-cdn.tripadvisor.com/media/photo-o/2b/33/57/d6/caption.jpg?w=700&h=-1&s=1", location="Maasai Mara National Reserve, Kenya", price_per_night=30000, amenities="A restaurant, 2 bars/lounges, and dry cleaning are available at this campground. Free buffet breakfast, free WiFi in public areas, and free self parking are also provided. Additionally, laundry facilities, wedding services, and a garden are onsite. The accommodation features a furnished patio, room service, and free bottled water. Amenities also include a shower and free toiletries."),
-        Hotel(name="The Majlis Resort", image_url="https://cf.bstatic.com/xdata/images/hotel/max1024x768/263081767.jpg?k=c2fc50d5eff98ac2f4d7f8eeec1ce289c651aa1e681d4de75c9ef124da0a8873&o=&hp=1", location="Lamu, Kenya", price_per_night=15000, amenities="Free WiFi, Airport shuttle, Fitness center Gym, minibar, air conditioning and safe, Tea/coffee maker in all rooms, Free Parking"),
-        Hotel(name="Enashipai Resort & Spa", image_url="https://media-cdn.tripadvisor.com/media/photo-s/12/50/82/63/aerial-view-of-enashipai.jpg", location="Moi S Lake Rd, Naivasha", price_per_night=12000, amenities="Free WiFi, Airport shuttle, Fitness center Gym, minibar, air conditioning and safe, Tea/coffee maker in all rooms, Free Parking")
+        hotel(1, "Southern Palms Beach Resort", "https://cf.bstatic.com/xdata/images/hotel/max1024x768/221320289.jpg?k=1203f024f73c994f979bc9aea38a85e531a038f988994c1681df935203e83845&o=&hp=1", "Diani Beach Road Diani, Ukunda", 25000, "2 outdoor swimming pools, Free on-site parking, Air conditioning, Private Bathroom, Free Wifi, Room service, Family rooms, 5 restaurants, Breakfast, Spa, Gym"),
+        hotel(2, "Kilili Baharini Resort & Spa", "https://www.kililibaharini.com/wp-content/uploads/2019/11/mainpool-slide.jpg", "Casuarina Road, Malindi, Kenya", 18000, "Beach Access, Free Breakfast, Gym, Free Parking"),
+        hotel(3, "Hemingways Watamu", "https://www.shadesofafricasafaris.com/images/hemingways-watamu4.jpg", "Watamu, Kenya", 15000, "2 swimming pools, Free Wifi, Beachfront, Family rooms, Airport shuttle, Restaurant, Fitness center, Tea/Coffee Maker in All Rooms, Bar, Breakfast, Free Breakfast"),
+        hotel(4, "Mnarani Beach Club", "https://dynamic-media-cdn.tripadvisor.com/media/photo-o/2b/61/9a/9d/caption.jpg?w=700&h=-1&s=1", "Kilifi, Kenya", 15000, "Free WiFi, Gym, Valet Parking, Restaurant"),
+        hotel(5, "Movenpick Hotel & Residences Nairobi", "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRoJx9UPSgJCe-qvNHQ0bVD3U6oX5NI-be40A&s", "Nairobi, Kenya", 29000, "Free WiFi, Bowling offsite, Airport shuttle, Chapel/shrine, Sauna, Fitness center Gym, Tea/coffee maker in all rooms, Free Parking"),
+        hotel(6, "Villa Rosa Kempinski Nairobi", "https://cf.bstatic.com/xdata/images/hotel/max1024x768/43569297.jpg?k=1cb33050f9949454276dc0b61159c39405baaf58b823b4c1201136894efefb7f&o=&hp=1", "Chiromo Road, Nairobi, Kenya", 25000, "9 treatment rooms, a lounge area for relaxing after treatments, a jacuzzi, sauna, steam room, heated swimming pool, and well-equipped gym."),
+        hotel(7, "Sarova Imperial Kisumu", "https://dynamic-media-cdn.tripadvisor.com/media/photo-o/27/57/9b/66/imperial-hotel.jpg?w=700&h=-1&s=1", "Achieng' Oneko Rd, Kisumu", 15000, "Free WiFi, Airport shuttle, Fitness center Gym, Facilities for disabled guests, Tea/coffee maker in all rooms, Free Parking"),
+        hotel(8, "Eka Hotel, Eldoret", "https://tembeatujengekenya.com/wp-content/uploads/2022/05/DJI_0968.jpg", "Eldoret, Kenya", 13000, "TV with DSTV connection, complimentary high-speed Wi-fi, minibar, safety deposit box, coffee/tea making facilities, telephone, hair dryers and Iron/Ironing boards on request, bathroom with toiletries."),
+        hotel(9, "Lake Nakuru Lodge", "https://dynamic-media-cdn.tripadvisor.com/media/photo-o/1a/bf/51/8f/lake-nakuru-lodge.jpg?w=500&h=-1&s=1", "Lake Nakuru National Park, Kenya", 10000, "Free WiFi, seating area and flat-screen TV. There is a private bathroom with bath and free toiletries in each unit, along with a hair dryer."),
+        hotel(10, "Little Governors' Camp", "https://dynamic-media-cdn.tripadvisor.com/media/photo-o/2b/33/57/d6/caption.jpg?w=700&h=-1&s=1", "Maasai Mara National Reserve, Kenya", 30000, "A restaurant, 2 bars/lounges, and dry cleaning are available at this campground. Free buffet breakfast, free WiFi in public areas, and free self parking are also provided. Additionally, laundry facilities, wedding services, and a garden are onsite. The accommodation features a furnished patio, room service, and free bottled water. Amenities also include a shower and free toiletries."),
+        hotel(11, "The Majlis Resort", "https://cf.bstatic.com/xdata/images/hotel/max1024x768/263081767.jpg?k=c2fc50d5eff98ac2f4d7f8eeec1ce289c651aa1e681d4de75c9ef124da0a8873&o=&hp=1", "Lamu, Kenya", 15000, "Free WiFi, Airport shuttle, Fitness center Gym, minibar, air conditioning and safe, Tea/coffee maker in all rooms, Free Parking"),
+        hotel(12, "Enashipai Resort & Spa", "https://media-cdn.tripadvisor.com/media/photo-s/12/50/82/63/aerial-view-of-enashipai.jpg", "Moi S Lake Rd, Naivasha", 12000, "Free WiFi, Airport shuttle, Fitness center Gym, minibar, air conditioning and safe, Tea/coffee maker in all rooms, Free Parking"),
+    ]
+
+    hotel_amenities = [
+        {"hotel_id": h["hotel_id"], "amenity": amenity}
+        for h in hotels for amenity in canonical_amenities(h["amenities"])
     ]
 
-    print("Creating bookings...")
     bookings = [
-        Booking(user=user1, booking_date=datetime.now(), total_price=1000.00, booking_type="flight", booking_status="confirmed", flight=flights[0]),
-        Booking(user=user2, booking_date=datetime.now(), total_price=1500.00, booking_type="hotel", booking_status="pending", hotel=hotels[0])
+        {"booking_id": 1, "user_id": 1, "booking_date": datetime.now(), "total_price": 1000.00, "booking_type": "flight",
+         "booking_status": "confirmed", "flight_id": 1, "hotel_id": None},
+        {"booking_id": 2, "user_id": 2, "booking_date": datetime.now(), "total_price": 1500.00, "booking_type": "hotel",
+         "booking_status": "pending", "flight_id": None, "hotel_id": 1},
     ]
 
-    print("Creating user flights...")
     user_flights = [
-        UserFlight(user=user1, flight=flights[0]),
-        UserFlight(user=user2, flight=flights[1]),
-        UserFlight(user=user1, flight=flights[2]),
-        UserFlight(user=user2, flight=flights[3])
+        {"user_flight_id": 1, "user_id": 1, "flight_id": 1},
+        {"user_flight_id": 2, "user_id": 2, "flight_id": 2},
+        {"user_flight_id": 3, "user_id": 1, "flight_id": 3},
+        {"user_flight_id": 4, "user_id": 2, "flight_id": 4},
     ]
 
-    print("Creating user hotels...")
     user_hotels = [
-        UserHotel(user=user1, hotel=hotels[0]),
-        UserHotel(user=user2, hotel=hotels[1]),
-        UserHotel(user=user1, hotel=hotels[2]),
-        UserHotel(user=user2, hotel=hotels[3])
+        {"user_hotel_id": 1, "user_id": 1, "hotel_id": 1},
+        {"user_hotel_id": 2, "user_id": 2, "hotel_id": 2},
+        {"user_hotel_id": 3, "user_id": 1, "hotel_id": 3},
+        {"user_hotel_id": 4, "user_id": 2, "hotel_id": 4},
     ]
 
-    print("Adding data to the database...")
-    db.session.add_all(users)
-    db.session.add_all(flights)
-    db.session.add_all(hotels)
-    db.session.add_all(bookings)
-    db.session.add_all(user_flights)
-    db.session.add_all(user_hotels)
-    db.session.commit()
-    print("Data added successfully.")
+    return [
+        (User.__table__, users),
+        (Hotel.__table__, hotels),
+        (HotelAmenity.__table__, hotel_amenities),
+        (Flight.__table__, flights),
+        (Booking.__table__, bookings),
+        (UserFlight.__table__, user_flights),
+        (UserHotel.__table__, user_hotels),
+    ]
+
+
+parser = argparse.ArgumentParser(description="Seed the database.")
+parser.add_argument('--rows', help="Load a synthetic data set of this size (10k, 100k, 1m, 10m or a number) instead of the demo data")
+parser.add_argument('--seed', type=int, default=42, help="Random seed for --rows")
+parser.add_argument('--batch-size', type=int, default=10000, help="Rows per INSERT batch or COPY")
+parser.add_argument('--index-threshold', type=int, default=100000,
+                    help="Drop and rebuild secondary indexes for loads of at least this many rows")
+args = parser.parse_args()
+
+with app.app_context():
+    # One hash for every seeded user; all of them log in with "password"
+    password = passwords.hash("password")
+    if args.rows:
+        dataset = datasets.Dataset(datasets.parse_rows(args.rows), seed=args.seed, password_hash=password)
+        tables, rows = dataset.tables(), dataset.rows
+    else:
+        tables = demo_tables(password)
+        rows = sum(len(table_rows) for _, table_rows in tables)
+
+    started = clock.perf_counter()
+    timings = {}
+    with bulk_transaction(db.engine) as connection:
+        print("Deleting data...")
+        datasets.clear(connection)
+        print(f"Loading {rows} rows...")
+        written = load_tables(connection, tables, args.batch_size, drop=rows >= args.index_threshold,
+                              progress=lambda table, count: print(f"  {table}: {count}"), timings=timings)
+        ChangeCounter.bump(connection, 'flights', 'hotels')
+    elapsed = clock.perf_counter() - started
+    total = sum(written.values())
+    # Generation is interleaved with the load, so the load's own time is reported apart
+    load = timings['rows'] + timings['indexes']
+    print(f"Data added successfully: {total} rows in {elapsed:.1f}s, of which loading took {load:.1f}s "
+          f"({total / load:,.0f} rows/s) and the rest went to generating rows and committing.")
@@ -0,0 +1,145 @@
+"""Slow-query recorder.
+
+Every statement is timed with SQLAlchemy engine events. Statements slower
+than ``threshold_ms`` are, with probability ``sample_rate``, recorded with
+their bound parameters, the endpoint that ran them and the query plan
+(``EXPLAIN`` on PostgreSQL, ``EXPLAIN QUERY PLAN`` on SQLite).
+
+Entries are written as JSON lines to a rotating log file and the most
+recent ones are kept in memory for ``GET /admin/slow-queries``. The plan
+of a given SQL string is captured at most once per ``explain_interval``
+seconds, so a hot slow query does not pay for an EXPLAIN on every run.
+"""
+import json
+import logging
+import logging.handlers
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAINABLE = ('select', 'with')
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=250, sample_rate=1.0, path=None, max_bytes=10 * 1024 * 1024,
+                 backups=5, keep=200, explain_interval=300):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.explain_interval = explain_interval
+        self._recent = deque(maxlen=keep)
+        self._explained_at = {}  # SQL string -> (monotonic time, plan)
+        self._lock = threading.Lock()
+
+        self.logger = logging.getLogger('airescape.slow_queries')
+        self.logger.propagate = False
+        if path and not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold_ms=config['SLOW_QUERY_MS'],
+            sample_rate=config['SLOW_QUERY_SAMPLE_RATE'],
+            path=config['SLOW_QUERY_LOG'],
+            max_bytes=config['SLOW_QUERY_LOG_BYTES'],
+            backups=config['SLOW_QUERY_LOG_BACKUPS'],
+            explain_interval=config['SLOW_QUERY_EXPLAIN_INTERVAL'],
+        )
+
+    def install(self):
+        """Start timing statements on every engine."""
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        event.listen(Engine, 'handle_error', self._failed_execute)
+
+    def recent(self, limit=None):
+        """Return the most recent entries recorded by this worker, newest first."""
+        with self._lock:
+            entries = list(self._recent)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._explained_at.clear()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def _failed_execute(self, context):
+        # Failed statements never reach after_cursor_execute; drop their start time
+        if context.execution_context is not None and context.connection.info.get('slow_query_start'):
+            context.connection.info['slow_query_start'].pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if elapsed < self.threshold or random.random() >= self.sample_rate:
+            return
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'statement': statement,
+            # Bulk inserts can carry thousands of rows; the first few are enough to reproduce
+            'parameters': parameters[:10] if executemany else parameters,
+            'executemany': executemany,
+            'endpoint': request.endpoint if has_request_context() else None,
+            'method': request.method if has_request_context() else None,
+            'plan': None if executemany else self._plan(conn, statement, parameters),
+        }
+        with self._lock:
+            self._recent.append(entry)
+        self.logger.info(json.dumps(entry, default=str))
+
+    def _plan(self, conn, statement, parameters):
+        if not statement.lstrip().lower().startswith(EXPLAINABLE):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._explained_at.get(statement)
+            if cached and now - cached[0] < self.explain_interval:
+                return cached[1]
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        with self._lock:
+            self._explained_at[statement] = (now, plan)
+        return plan
+
+
+def explain(conn, statement, parameters):
+    """Return the plan of ``statement`` as a list of lines.
+
+    The EXPLAIN runs on the statement's own DBAPI connection, so it sees the
+    same transaction and does not go through the engine events again. On
+    PostgreSQL it is wrapped in a savepoint so a failure cannot abort the
+    caller's transaction.
+    """
+    dbapi_connection = conn.connection.dbapi_connection
+    cursor = dbapi_connection.cursor()
+    try:
+        if conn.dialect.name == 'postgresql':
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute("EXPLAIN " + statement, parameters)
+                plan = [row[0] for row in cursor.fetchall()]
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
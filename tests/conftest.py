@@ -0,0 +1,77 @@
+"""Shared fixtures.
+
+The app reads its configuration from the environment when app.py is first
+imported, so the test database and fast settings are set here, before any
+test module imports it. Set ``TEST_DATABASE_URI`` to run against another
+database than a scratch SQLite file.
+
+    python -m pytest -q
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH = tempfile.mkdtemp(prefix='airescape-tests-')
+os.environ['DATABASE_URI'] = os.environ.get('TEST_DATABASE_URI', f"sqlite:///{os.path.join(SCRATCH, 'test.db')}")
+os.environ['SLOW_QUERY_LOG'] = os.path.join(SCRATCH, 'slow_queries.log')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+# Nothing shared with a developer's own services
+os.environ['ROUTE_CACHE_URL'] = ''
+os.environ.pop('REPLICA_DATABASE_URI', None)
+os.environ.pop('SENDGRID_API_KEY', None)
+
+from flask_migrate import upgrade  # noqa: E402
+
+from app import app as flask_app, db, passwords  # noqa: E402
+from models import User  # noqa: E402
+import dataset as datasets  # noqa: E402
+
+DATASET_ROWS = 2000
+
+
+def load_dataset():
+    """Replace the data with the shared test dataset; tests that load their own call it afterwards."""
+    with flask_app.app_context():
+        dataset = datasets.Dataset(DATASET_ROWS, seed=7, password_hash=passwords.hash('password'))
+        with db.engine.begin() as connection:
+            datasets.clear(connection)
+            datasets.write(connection, dataset)
+        db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    load_dataset()
+    yield flask_app
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def tokens(app):
+    """Access tokens for the generated admin (user 1) and a traveler (user 2)."""
+    client = app.test_client()
+    with app.app_context():
+        emails = {'admin': db.session.get(User, 1).email, 'traveler': db.session.get(User, 2).email}
+        db.session.remove()
+    return {role: client.post('/login/email', json={"email": email, "password": "password"}).get_json()['token']
+            for role, email in emails.items()}
+
+
+@pytest.fixture
+def auth(tokens):
+    def headers(role):
+        return {'Authorization': f"Bearer {tokens[role]}"}
+    return headers
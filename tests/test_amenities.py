@@ -0,0 +1,86 @@
+from collections import Counter
+
+import pytest
+
+from amenities import canonical_amenities
+from models import db, Hotel
+
+
+def test_free_text_is_mapped_onto_the_vocabulary():
+    text = "2 outdoor swimming pools, Free Wi-Fi and Airport shuttle; Fitness centre. Flat-screen TV"
+    assert canonical_amenities(text) == ['airport_shuttle', 'gym', 'pool', 'tv', 'wifi']
+    assert canonical_amenities("Bathtub, Desk") == []
+    assert canonical_amenities(None) == []
+
+
+@pytest.fixture(scope='module')
+def hotels(app):
+    """Every hotel as (hotel_id, location, canonical amenities of its free text)."""
+    with app.app_context():
+        rows = [(h.hotel_id, h.location, set(canonical_amenities(h.amenities)))
+                for h in db.session.scalars(db.select(Hotel))]
+        db.session.remove()
+    return rows
+
+
+def all_pages(client, url):
+    """The hotels of every page of ``url``, and the facets of the first page."""
+    found, facets = [], None
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        if isinstance(body, dict):
+            facets = facets if facets is not None else body['facets']['amenities']
+            body = body['hotels']
+        found += [hotel['hotel_id'] for hotel in body]
+        url = response.headers.get('Link', '').partition('<')[2].partition('>')[0]
+    return found, facets
+
+
+def test_filter_returns_hotels_with_every_amenity(client, hotels):
+    found, _ = all_pages(client, '/hotels?amenities=pool,wifi&limit=200')
+    expected = [hotel_id for hotel_id, _, amenities in hotels if {'pool', 'wifi'} <= amenities]
+    assert expected
+    assert sorted(found) == sorted(expected)
+
+
+def test_facets_count_the_matching_hotels(client, hotels):
+    location = Counter(location for _, location, _ in hotels).most_common(1)[0][0]
+    matching = [amenities for _, hotel_location, amenities in hotels if location.lower() in hotel_location.lower()]
+    found, facets = all_pages(client, f'/hotels?location={location}&facets=1&limit=200')
+    assert len(found) == len(matching)
+    assert facets == Counter(name for amenities in matching for name in amenities)
+
+    # Facets follow the other filters, amenities included
+    _, facets = all_pages(client, f'/hotels?location={location}&amenities=spa&facets=1&limit=200')
+    with_spa = [amenities for amenities in matching if 'spa' in amenities]
+    assert facets == Counter(name for amenities in with_spa for name in amenities)
+
+
+def test_unknown_amenity_is_rejected(client):
+    response = client.get('/hotels?amenities=pool,helipad')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Unknown amenity: helipad"}
+
+
+def test_amenity_index_follows_hotel_writes(client, auth):
+    def with_amenities(names):
+        found, _ = all_pages(client, f'/hotels?amenities={names}&location=Amenityville&limit=200')
+        return found
+
+    response = client.post('/hotels', json={
+        "name": "Facet Lodge", "location": "Amenityville", "price_per_night": 80,
+        "image_url": "https://example.com/lodge.jpg", "amenities": "Sauna, free parking",
+    }, headers=auth('admin'))
+    assert response.status_code == 201
+    hotel_id = response.get_json()['hotel_id']
+    try:
+        assert with_amenities('sauna,parking') == [hotel_id]
+        assert with_amenities('pool') == []
+        assert client.patch(f'/hotels/{hotel_id}', json={"amenities": "Indoor pool, free parking"},
+                            headers=auth('admin')).status_code == 200
+        assert with_amenities('sauna') == []
+        assert with_amenities('pool,parking') == [hotel_id]
+    finally:
+        assert client.delete(f'/hotels/{hotel_id}', headers=auth('admin')).status_code == 200
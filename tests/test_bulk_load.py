@@ -0,0 +1,70 @@
+from datetime import date, datetime, time
+
+import sqlalchemy as sa
+
+from bulk_load import BulkLoader, bulk_transaction
+from conftest import load_dataset
+from models import db, Flight, User
+
+metadata = sa.MetaData()
+events = sa.Table(
+    'events', metadata,
+    sa.Column('event_id', sa.Integer, primary_key=True),
+    sa.Column('starts_at', sa.DateTime, nullable=True),
+    sa.Column('day', sa.Date),
+    sa.Column('at', sa.Time),
+    sa.Column('price', sa.Float),
+    sa.Column('version', sa.Integer, default=1),
+)
+
+
+def rows(count):
+    return [{
+        'event_id': n,
+        'starts_at': None if n % 3 == 0 else datetime(2025, 1, 1 + n % 5, 8, 30, 0, n % 2),
+        'day': date(2025, 2, 1 + n % 7),
+        'at': time(n % 24, 15),
+        'price': n / 4,
+    } for n in range(1, count + 1)]
+
+
+def test_rows_are_stored_as_sqlalchemy_would_store_them(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        # Batches smaller than the load, so repeated values span several of them
+        assert BulkLoader(connection, batch_size=7).load(events, rows(50)) == 50
+        bulk = connection.exec_driver_sql("SELECT * FROM events ORDER BY event_id").all()
+        connection.execute(events.delete())
+        connection.execute(events.insert(), rows(50))
+        orm = connection.exec_driver_sql("SELECT * FROM events ORDER BY event_id").all()
+    assert bulk == orm
+    assert bulk[2][1] is None and bulk[0][5] == 1
+
+
+def test_bulk_transaction_restores_the_sqlite_settings(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    metadata.create_all(engine)
+    pragmas = lambda connection: (connection.exec_driver_sql("PRAGMA journal_mode").scalar(),
+                                  connection.exec_driver_sql("PRAGMA synchronous").scalar())
+    with engine.connect() as connection:
+        before = pragmas(connection)
+    with bulk_transaction(engine) as connection:
+        assert pragmas(connection) == ('memory', 0)
+        BulkLoader(connection).load(events, rows(10))
+    with engine.connect() as connection:
+        assert pragmas(connection) == before
+        assert connection.exec_driver_sql("SELECT count(*) FROM events").scalar() == 10
+
+
+def test_generate_dataset_command(app):
+    try:
+        result = app.test_cli_runner().invoke(args=['generate-dataset', '--rows', '1000', '--seed', '3'])
+        assert result.exit_code == 0, result.output
+        assert "Generated 1000 rows" in result.output
+        with app.app_context():
+            assert db.session.scalar(db.select(db.func.count()).select_from(User)) == 100
+            assert db.session.scalar(db.select(db.func.count()).select_from(Flight)) == 500
+            db.session.remove()
+    finally:
+        load_dataset()
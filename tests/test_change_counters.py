@@ -0,0 +1,107 @@
+from sqlalchemy import event
+
+import app as app_module
+from cache import LocalRouteCache
+from models import db, Booking, ChangeCounter, Flight
+
+
+def test_booking_changes_the_flights_etag(client, auth):
+    before = client.get('/flights?limit=5').headers['ETag']
+    with client.application.app_context():
+        flight_id = db.session.scalar(db.select(Flight.flight_id).where(Flight.seats_available > 0).limit(1))
+        db.session.remove()
+    response = client.post('/bookings', json={"flight_id": flight_id, "passengers": 1}, headers=auth('traveler'))
+    assert response.status_code == 201
+    assert client.get('/flights?limit=5').headers['ETag'] != before
+
+
+def test_counter_is_bumped_outside_the_booking_transaction(app):
+    events = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        events.append(' '.join(statement.split()[:2]))
+
+    def commit(conn):
+        events.append('COMMIT')
+
+    with app.app_context():
+        flight_id = db.session.scalar(db.select(Flight.flight_id).where(Flight.seats_available > 0).limit(1))
+        version, _ = ChangeCounter.current('flights')
+        db.session.commit()
+        event.listen(db.engine, 'before_cursor_execute', record)
+        event.listen(db.engine, 'commit', commit)
+        try:
+            assert Flight.reserve_seats(flight_id, 1)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+            event.remove(db.engine, 'commit', commit)
+        assert ChangeCounter.current('flights')[0] == version + 1
+        db.session.remove()
+
+    # The booking transaction commits before the counter row is touched
+    assert events.index('UPDATE flights') < events.index('COMMIT') < events.index('UPDATE change_counters')
+
+
+def test_rolled_back_reservation_does_not_bump(app):
+    with app.app_context():
+        flight_id = db.session.scalar(db.select(Flight.flight_id).where(Flight.seats_available > 0).limit(1))
+        version, _ = ChangeCounter.current('flights')
+        db.session.commit()
+        assert Flight.reserve_seats(flight_id, 1)
+        db.session.rollback()
+        db.session.commit()
+        assert ChangeCounter.current('flights')[0] == version
+        db.session.remove()
+
+
+def test_failed_bump_does_not_fail_the_committed_booking(app, client, auth, monkeypatch, caplog):
+    def fail(connection, *names):
+        raise RuntimeError("counter row locked")
+
+    with app.app_context():
+        flight_id = db.session.scalar(db.select(Flight.flight_id).where(Flight.seats_available > 0).limit(1))
+        bookings = db.session.scalar(db.select(db.func.count()).select_from(Booking))
+        db.session.remove()
+    monkeypatch.setattr(ChangeCounter, 'bump', fail)
+    response = client.post('/bookings', json={"flight_id": flight_id, "passengers": 1}, headers=auth('traveler'))
+    assert response.status_code == 201
+    assert "Could not bump the change counters of flights" in caplog.text
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(Booking)) == bookings + 1
+        db.session.remove()
+
+
+def test_cached_search_keeps_the_etag_it_was_built_under(app, client, auth, monkeypatch):
+    """Two workers' route caches over one database: the write on one leaves the other's entry in place."""
+    mine, other = LocalRouteCache(), LocalRouteCache()
+    with app.app_context():
+        flight = db.session.scalars(db.select(Flight).where(Flight.seats_available > 0).limit(1)).one()
+        search = (f"/flights?from={flight.departure_city}&to={flight.arrival_city}"
+                  f"&outboundDate={flight.departure_date:%Y-%m-%d}")
+        flight_id, price = flight.flight_id, flight.price
+        db.session.remove()
+
+    def prices(response):
+        return {f['flight_id']: f['price'] for f in response.get_json()['outbound_flights']}
+
+    monkeypatch.setattr(app_module, 'route_cache', mine)
+    first = client.get(search)
+    assert prices(first)[flight_id] == price
+
+    # The other worker changes the flight; only its own cache is cleared
+    monkeypatch.setattr(app_module, 'route_cache', other)
+    assert client.patch(f'/flights/{flight_id}', json={"price": price + 1}, headers=auth('admin')).status_code == 200
+
+    monkeypatch.setattr(app_module, 'route_cache', mine)
+    stale = client.get(search)
+    assert prices(stale)[flight_id] == price
+    assert stale.headers['ETag'] == first.headers['ETag']
+
+    # Once the entry is gone the fresh body comes with the new ETag, and the old one no longer matches
+    mine.clear()
+    fresh = client.get(search, headers={'If-None-Match': first.headers['ETag']})
+    assert fresh.status_code == 200
+    assert prices(fresh)[flight_id] == price + 1
+    assert fresh.headers['ETag'] != first.headers['ETag']
+    assert client.patch(f'/flights/{flight_id}', json={"price": price}, headers=auth('admin')).status_code == 200
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+import pytest
+
+import connections
+from connections import RouteIndex
+from models import db, Flight
+
+TODAY = date.today()
+
+
+def flight(number, origin, destination, day, departs, arrives, price=100.0):
+    return Flight(
+        flight_number=number, departure_city=origin, arrival_city=destination,
+        departure_date=datetime.combine(day, dt_time()), arrival_date=datetime.combine(day, dt_time()),
+        departure_time=dt_time(departs), arrival_time=dt_time(arrives),
+        price=price, seats_available=10, trip_type='one-way',
+    )
+
+
+@pytest.fixture
+def schedule(app):
+    """Flights between made-up cities: past, tomorrow (with a connection) and two months out."""
+    flights = {
+        'past': flight('CX1', 'Alphaville', 'Betatown', TODAY - timedelta(days=3), 8, 9),
+        'first_leg': flight('CX2', 'Alphaville', 'Betatown', TODAY + timedelta(days=1), 8, 9),
+        'second_leg': flight('CX3', 'Betatown', 'Gammaburg', TODAY + timedelta(days=1), 11, 12),
+        'far': flight('CX4', 'Alphaville', 'Gammaburg', TODAY + timedelta(days=60), 8, 10),
+    }
+    with app.app_context():
+        db.session.add_all(flights.values())
+        db.session.commit()
+        ids = {name: f.flight_id for name, f in flights.items()}
+        db.session.remove()
+    yield ids
+    with app.app_context():
+        db.session.execute(db.delete(Flight).where(Flight.flight_id.in_(ids.values())))
+        db.session.commit()
+
+
+def flight_ids(itineraries):
+    return [[leg.flight_id for leg in legs] for legs in itineraries]
+
+
+def test_only_upcoming_flights_are_kept_in_memory(app, schedule):
+    index = RouteIndex(horizon_days=30)
+    with app.app_context():
+        found = index.search('Alphaville', 'Gammaburg', TODAY + timedelta(days=1))
+    assert flight_ids(found) == [[schedule['first_leg'], schedule['second_leg']]]
+    assert schedule['past'] not in index._legs
+    assert schedule['far'] not in index._legs
+
+
+def test_days_outside_the_window_are_read_from_the_database(app, schedule):
+    index = RouteIndex(horizon_days=30)
+    with app.app_context():
+        assert flight_ids(index.search('Alphaville', 'Gammaburg', TODAY + timedelta(days=60))) == [[schedule['far']]]
+        assert flight_ids(index.search('Alphaville', 'Betatown', TODAY - timedelta(days=3))) == [[schedule['past']]]
+
+
+def test_refresh_runs_off_the_request_path(app, schedule, monkeypatch):
+    index = RouteIndex(refresh_seconds=0, horizon_days=30)
+    day = TODAY + timedelta(days=1)
+    with app.app_context():
+        index.search('Alphaville', 'Betatown', day)
+
+    load = connections._load
+    release = threading.Event()
+    loaded = threading.Event()
+
+    def slow_load(first, last):
+        result = load(first, last)
+        loaded.set()
+        release.wait(5)
+        return result
+
+    monkeypatch.setattr(connections, '_load', slow_load)
+    late = flight('CX5', 'Alphaville', 'Betatown', day, 6, 7, price=50.0)
+    with app.app_context():
+        started = time.perf_counter()
+        # Starts the reload and answers from the index already in memory
+        assert flight_ids(index.search('Alphaville', 'Betatown', day)) == [[schedule['first_leg']]]
+        assert time.perf_counter() - started < 1
+        assert loaded.wait(5)
+        # A write this worker makes after the reload read its rows survives the swap
+        late.flight_id = 10 ** 9
+        index.upsert(late)
+    release.set()
+    for _ in range(100):
+        if not index._rebuilding:
+            break
+        time.sleep(0.01)
+    index.refresh_seconds = 3600
+    with app.app_context():
+        found = index.search('Alphaville', 'Betatown', day)
+    assert flight_ids(found)[0] == [late.flight_id]
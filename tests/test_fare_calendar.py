@@ -0,0 +1,65 @@
+import pytest
+
+import app as app_module
+from cache import LocalRouteCache
+from models import db, Flight
+
+
+@pytest.fixture
+def route(app, monkeypatch):
+    """The busiest route's flights in its busiest month, as (departure_city, date, price, seats)."""
+    monkeypatch.setattr(app_module, 'route_cache', LocalRouteCache())
+    with app.app_context():
+        flights = db.session.scalars(db.select(Flight)).all()
+        counts = {}
+        for f in flights:
+            key = (f.departure_city, f.arrival_city, f"{f.departure_date:%Y-%m}")
+            counts[key] = counts.get(key, 0) + 1
+        from_city, to_city, month = max(counts, key=counts.get)
+        legs = [(f.departure_city, f"{f.departure_date:%Y-%m-%d}", f.price, f.seats_available) for f in flights
+                if {f.departure_city, f.arrival_city} == {from_city, to_city} and f"{f.departure_date:%Y-%m}" == month]
+        db.session.remove()
+    return from_city, to_city, month, legs
+
+
+def expected(legs, origin, passengers=1):
+    days = {}
+    for city, day, price, seats in legs:
+        if city == origin and seats >= passengers:
+            cheapest, most_seats, count = days.get(day, (price, seats, 0))
+            days[day] = (min(cheapest, price), max(most_seats, seats), count + 1)
+    return days
+
+
+def as_days(calendar):
+    return {d['date']: (d['min_price'], d['seats_available'], d['flights']) for d in calendar if d['flights']}
+
+
+def test_calendar_has_the_cheapest_fare_per_day(client, route):
+    from_city, to_city, month, legs = route
+    response = client.get(f'/flights/calendar?from={from_city}&to={to_city}&month={month}')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['month'] == month
+    assert 'return' not in body
+    # Every day of the month is listed, empty days included
+    assert len(body['outbound']) >= 28
+    assert all(d['date'].startswith(month) for d in body['outbound'])
+    assert as_days(body['outbound']) == expected(legs, from_city)
+    empty = next(d for d in body['outbound'] if not d['flights'])
+    assert empty == {"date": empty['date'], "min_price": None, "seats_available": 0, "flights": 0}
+
+
+def test_roundtrip_calendar_and_passenger_filter(client, route):
+    from_city, to_city, month, legs = route
+    passengers = sorted(seats for _, _, _, seats in legs)[len(legs) // 2]
+    body = client.get(f'/flights/calendar?from={from_city}&to={to_city}&month={month}'
+                      f'&tripType=roundtrip&passengers={passengers}').get_json()
+    assert as_days(body['outbound']) == expected(legs, from_city, passengers)
+    assert as_days(body['return']) == expected(legs, to_city, passengers)
+
+
+def test_calendar_rejects_bad_parameters(client):
+    assert client.get('/flights/calendar?from=A&to=B').status_code == 400
+    assert client.get('/flights/calendar?from=A&to=B&month=2030-13').status_code == 400
+    assert client.get('/flights/calendar?from=A&to=B&month=2030-01&passengers=two').status_code == 400
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import app as app_module
+from cache import LocalRouteCache
+from models import db, Flight
+
+
+def flight(number, departure_city='Importville', arrival_city='Upsertburg', **changes):
+    return {
+        "flight_number": number, "departure_city": departure_city, "arrival_city": arrival_city,
+        "departure_date": "2031-05-04", "arrival_date": "2031-05-04",
+        "departure_time": "08:00:00", "arrival_time": "10:30:00",
+        "price": 120.0, "seats_available": 40, **changes,
+    }
+
+
+def ndjson(*records):
+    return '\n'.join(json.dumps(record) for record in records) + '\n'
+
+
+@pytest.fixture
+def post_import(client, auth):
+    def post(body, batch_size=500):
+        return client.post(f'/flights/import?batch_size={batch_size}', data=body,
+                           content_type='application/x-ndjson', headers=auth('admin'))
+    return post
+
+
+@pytest.fixture
+def stored(app):
+    def get(*numbers):
+        with app.app_context():
+            flights = {f.flight_number: (f.departure_city, f.arrival_city, f.price, f.seats_available, f.version)
+                       for f in db.session.scalars(db.select(Flight).where(Flight.flight_number.in_(numbers)))}
+            db.session.remove()
+        return flights
+    yield get
+    with app.app_context():
+        db.session.execute(db.delete(Flight).where(Flight.flight_number.like('IMP%')))
+        db.session.commit()
+        db.session.remove()
+
+
+def test_import_inserts_new_flights(post_import, stored):
+    response = post_import(ndjson(flight('IMP1'), flight('IMP2', price=99.5)))
+    assert response.status_code == 200
+    assert response.get_json() == {"imported": 2, "error_count": 0, "errors": []}
+    assert stored('IMP1', 'IMP2') == {
+        'IMP1': ('Importville', 'Upsertburg', 120.0, 40, 1),
+        'IMP2': ('Importville', 'Upsertburg', 99.5, 40, 1),
+    }
+
+
+def test_import_updates_flights_by_number(post_import, stored):
+    assert post_import(ndjson(flight('IMP1'))).get_json()['imported'] == 1
+    # The last row for a flight number within a batch wins
+    body = ndjson(flight('IMP1', price=80.0), flight('IMP1', price=90.0, seats_available=3))
+    assert post_import(body).get_json() == {"imported": 1, "error_count": 0, "errors": []}
+    assert stored('IMP1') == {'IMP1': ('Importville', 'Upsertburg', 90.0, 3, 2)}
+
+
+def test_failing_batch_is_retried_row_by_row(post_import, stored):
+    # Valid to parse_flight but refused by the database: NaN is stored as NULL
+    # by SQLite, and the trip type is too long for PostgreSQL's varchar(10)
+    bad = flight('IMP2', price='nan', trip_type='x' * 11)
+    body = ndjson(flight('IMP1'), bad, flight('IMP3')) + '{not json\n' + ndjson(flight('IMP4'))
+    result = post_import(body, batch_size=3).get_json()
+    assert result['imported'] == 3
+    assert result['error_count'] == 2
+    assert [error['line'] for error in result['errors']] == [2, 4]
+    assert result['errors'][1]['error'] == "Invalid JSON"
+    assert set(stored('IMP1', 'IMP2', 'IMP3', 'IMP4')) == {'IMP1', 'IMP3', 'IMP4'}
+
+
+def test_import_invalidates_the_old_and_new_routes(app, client, post_import, stored, monkeypatch):
+    monkeypatch.setattr(app_module, 'route_cache', LocalRouteCache())
+
+    def numbers(from_city, to_city):
+        response = client.get(f"/flights?from={from_city}&to={to_city}&outboundDate=2031-05-04")
+        return [f['flight_number'] for f in response.get_json()['outbound_flights']]
+
+    assert post_import(ndjson(flight('IMP1'))).status_code == 200
+    assert numbers('Importville', 'Upsertburg') == ['IMP1']
+    assert numbers('Importville', 'Movedton') == []
+
+    # Moving the flight to another route clears the cached searches of both
+    assert post_import(ndjson(flight('IMP1', arrival_city='Movedton'))).get_json()['imported'] == 1
+    assert numbers('Importville', 'Upsertburg') == []
+    assert numbers('Importville', 'Movedton') == ['IMP1']
+    assert stored('IMP1')['IMP1'][:2] == ('Importville', 'Movedton')
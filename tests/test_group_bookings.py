@@ -0,0 +1,108 @@
+import pytest
+
+from models import db, Booking, Flight, Hotel, UserFlight, UserHotel
+
+
+@pytest.fixture
+def trip(app):
+    """Two flights with seats to spare and a hotel; their seats are put back afterwards."""
+    with app.app_context():
+        flights = db.session.scalars(db.select(Flight).where(Flight.seats_available > 10).limit(2)).all()
+        hotel_id = db.session.scalar(db.select(Hotel.hotel_id).limit(1))
+        seats = {f.flight_id: f.seats_available for f in flights}
+        db.session.remove()
+    yield list(seats), hotel_id
+    with app.app_context():
+        for flight_id, count in seats.items():
+            db.session.get(Flight, flight_id).seats_available = count
+        db.session.commit()
+        db.session.remove()
+
+
+def state(app, flight_ids):
+    """Seats left on ``flight_ids`` and the number of bookings and saved flights and hotels."""
+    with app.app_context():
+        seats = {f.flight_id: f.seats_available
+                 for f in db.session.scalars(db.select(Flight).where(Flight.flight_id.in_(flight_ids)))}
+        counts = [db.session.scalar(db.select(db.func.count()).select_from(model))
+                  for model in (Booking, UserFlight, UserHotel)]
+        db.session.remove()
+    return seats, counts
+
+
+def book_group(client, auth, *itineraries):
+    return client.post('/bookings/group', json={"itineraries": list(itineraries)}, headers=auth('traveler'))
+
+
+def test_group_is_booked_in_one_go(app, client, auth, trip):
+    (first, second), hotel_id = trip
+    seats, counts = state(app, [first, second])
+    itineraries = [
+        {"flight_id": first, "passengers": 2, "hotel_id": hotel_id, "nights": 3},
+        {"flight_id": first, "passengers": 1},
+        {"flight_id": second, "passengers": 4},
+    ]
+    quotes = client.post('/quotes', json={"itineraries": itineraries}).get_json()['quotes']
+    response = book_group(client, auth, *itineraries)
+    assert response.status_code == 201
+    body = response.get_json()
+    try:
+        assert [(b['flight_id'], b['hotel_id'], b['booking_type']) for b in body['bookings']] == [
+            (first, hotel_id, 'package'), (first, None, 'flight'), (second, None, 'flight')]
+        assert [b['total_price'] for b in body['bookings']] == pytest.approx([q['total_price'] for q in quotes])
+        assert body['total_price'] == pytest.approx(sum(q['total_price'] for q in quotes))
+        # One saved flight per distinct flight
+        assert [f['flight_id'] for f in body['user_flights']] == [first, second]
+        assert [h['hotel_id'] for h in body['user_hotels']] == [hotel_id]
+        assert state(app, [first, second]) == (
+            {first: seats[first] - 3, second: seats[second] - 4}, [counts[0] + 3, counts[1] + 2, counts[2] + 1])
+    finally:
+        with app.app_context():
+            for model, key, rows in ((Booking, 'booking_id', body['bookings']),
+                                     (UserFlight, 'user_flight_id', body['user_flights']),
+                                     (UserHotel, 'user_hotel_id', body['user_hotels'])):
+                db.session.execute(db.delete(model).where(getattr(model, key).in_([row[key] for row in rows])))
+            db.session.commit()
+            db.session.remove()
+
+
+def test_sold_out_leg_books_nothing(app, client, auth, trip):
+    (first, second), _ = trip
+    before = state(app, [first, second])
+    response = book_group(client, auth, {"flight_id": first, "passengers": 1},
+                          {"flight_id": second, "passengers": before[0][second] + 1})
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "Not enough seats available", "flight_id": second}
+    assert state(app, [first, second]) == before
+
+
+def test_unknown_flight_books_nothing(app, client, auth, trip):
+    (first, _), _ = trip
+    before = state(app, [first])
+    response = book_group(client, auth, {"flight_id": first, "passengers": 1}, {"flight_id": 10 ** 9})
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Flight not found", "flight_id": 10 ** 9}
+    assert state(app, [first]) == before
+
+
+def test_unknown_hotel_releases_the_reserved_seats(app, client, auth, trip):
+    (first, _), _ = trip
+    before = state(app, [first])
+    response = book_group(client, auth, {"flight_id": first, "passengers": 2}, {"hotel_id": 10 ** 9})
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Hotel not found", "index": 1}
+    assert state(app, [first]) == before
+
+
+def test_invalid_groups_are_rejected(app, client, auth, trip, monkeypatch):
+    (first, _), _ = trip
+    before = state(app, [first])
+    response = book_group(client, auth, {"flight_id": first}, {"passengers": 2})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "flight_id or hotel_id is required", "index": 1}
+    assert book_group(client, auth).status_code == 400
+    monkeypatch.setitem(app.config, 'GROUP_BOOKING_MAX_ITINERARIES', 2)
+    response = book_group(client, auth, *[{"flight_id": first}] * 3)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "At most 2 itineraries per group"}
+    assert state(app, [first]) == before
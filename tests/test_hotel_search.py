@@ -0,0 +1,83 @@
+import pytest
+
+from hotel_search import search_terms
+
+HOTELS = {
+    # The search word in the name, the location and the amenities respectively
+    'name': {"name": "Zebrafinch Lodge", "location": "Kilifi", "amenities": "Pool, Free WiFi"},
+    'location': {"name": "Harbour View", "location": "Zebrafinch Bay", "amenities": "Restaurant"},
+    'amenities': {"name": "Palm Court", "location": "Malindi", "amenities": "Zebrafinch watching tours, Spa"},
+}
+
+
+def test_search_terms():
+    assert search_terms("  Zebra-finch, LODGE!  ") == ['zebra', 'finch', 'lodge']
+    assert search_terms("?!") == []
+
+
+@pytest.fixture(scope='module')
+def hotels(app, tokens):
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {tokens['admin']}"}
+    ids = {}
+    for key, hotel in HOTELS.items():
+        response = client.post('/hotels', json={**hotel, "price_per_night": 90,
+                                                 "image_url": "https://example.com/hotel.jpg"}, headers=headers)
+        assert response.status_code == 201
+        ids[key] = response.get_json()['hotel_id']
+    yield ids
+    for hotel_id in ids.values():
+        client.delete(f'/hotels/{hotel_id}', headers=headers)
+
+
+def found(client, q, **params):
+    response = client.get('/hotels/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return [hotel['hotel_id'] for hotel in response.get_json()]
+
+
+def test_name_matches_rank_above_location_and_amenity_matches(client, hotels):
+    assert found(client, 'zebrafinch') == [hotels['name'], hotels['location'], hotels['amenities']]
+
+
+def test_every_word_must_match_as_a_prefix(client, hotels):
+    assert found(client, 'zebraf') == [hotels['name'], hotels['location'], hotels['amenities']]
+    assert found(client, 'zebrafinch lodge') == [hotels['name']]
+    assert found(client, 'zebrafinch tour') == [hotels['amenities']]
+    assert found(client, 'zebrafinch nowhere') == []
+
+
+def test_results_are_paged_by_relevance(client, hotels):
+    pages, cursor = [], None
+    while True:
+        response = client.get('/hotels/search', query_string={'q': 'zebrafinch', 'limit': 1,
+                                                              **({'cursor': cursor} if cursor else {})})
+        pages += [hotel['hotel_id'] for hotel in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert pages == [hotels['name'], hotels['location'], hotels['amenities']]
+
+
+def test_index_follows_updates_and_deletes(client, auth, hotels):
+    hotel_id = hotels['location']
+    assert client.patch(f'/hotels/{hotel_id}', json={"location": "Watamu"}, headers=auth('admin')).status_code == 200
+    try:
+        assert hotel_id not in found(client, 'zebrafinch')
+        assert hotel_id in found(client, 'watamu harbour')
+    finally:
+        client.patch(f'/hotels/{hotel_id}', json={"location": "Zebrafinch Bay"}, headers=auth('admin'))
+
+    response = client.post('/hotels', json={"name": "Zebrafinch Annex", "location": "Kilifi", "price_per_night": 60,
+                                            "image_url": "https://example.com/annex.jpg", "amenities": ""},
+                           headers=auth('admin'))
+    annex = response.get_json()['hotel_id']
+    assert annex in found(client, 'annex')
+    assert client.delete(f'/hotels/{annex}', headers=auth('admin')).status_code == 200
+    assert found(client, 'annex') == []
+
+
+def test_query_is_required(client):
+    assert client.get('/hotels/search').status_code == 400
+    assert client.get('/hotels/search?q=%20').status_code == 400
+    assert client.get('/hotels/search?q=lodge&limit=0').status_code == 400
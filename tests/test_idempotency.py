@@ -0,0 +1,135 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import app as app_module
+from models import db, Booking, Flight, IdempotencyKey
+
+KEY = 'Idempotency-Key'
+
+
+def anonymous(address, agent='app/1.0'):
+    return {'environ_base': {'REMOTE_ADDR': address}, 'headers': {'User-Agent': agent}}
+
+
+def stk_push(client, key, phone, **request):
+    headers = {KEY: key, **request.pop('headers')}
+    return client.post('/stkpush', json={"phone": phone, "amount": "1"}, headers=headers, **request)
+
+
+def test_anonymous_retry_is_replayed(client):
+    key = uuid.uuid4().hex
+    first = stk_push(client, key, '254700000001', **anonymous('10.0.0.1'))
+    retry = stk_push(client, key, '254700000001', **anonymous('10.0.0.1'))
+    assert first.status_code == retry.status_code == 202
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+
+
+def test_anonymous_clients_do_not_share_keys(client):
+    key = uuid.uuid4().hex
+    mine = stk_push(client, key, '254700000001', **anonymous('10.0.0.1'))
+    # Same key from another address, or another client on the same address
+    for other in (anonymous('10.0.0.2'), anonymous('10.0.0.1', agent='other/2.0')):
+        theirs = stk_push(client, key, '254700000002', **other)
+        assert theirs.status_code == 202
+        assert 'Idempotent-Replayed' not in theirs.headers
+        assert theirs.get_json()['job_id'] != mine.get_json()['job_id']
+
+
+@pytest.fixture
+def flight_id(app):
+    with app.app_context():
+        flight_id = db.session.scalar(db.select(Flight.flight_id).where(Flight.seats_available > 10).limit(1))
+        db.session.remove()
+    return flight_id
+
+
+def booking_count(app):
+    with app.app_context():
+        count = db.session.scalar(db.select(db.func.count()).select_from(Booking))
+        db.session.remove()
+    return count
+
+
+def book(client, auth, key, flight_id, passengers=1):
+    return client.post('/bookings', json={"flight_id": flight_id, "passengers": passengers},
+                       headers={KEY: key, **auth('traveler')})
+
+
+def test_booking_retry_is_replayed_without_booking_again(app, client, auth, flight_id):
+    key = uuid.uuid4().hex
+    before = booking_count(app)
+    first = book(client, auth, key, flight_id)
+    retry = book(client, auth, key, flight_id)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert booking_count(app) == before + 1
+
+
+def test_key_reused_for_a_different_request_is_rejected(app, client, auth, flight_id):
+    key = uuid.uuid4().hex
+    assert book(client, auth, key, flight_id).status_code == 201
+    before = booking_count(app)
+    response = book(client, auth, key, flight_id, passengers=2)
+    assert response.status_code == 422
+    assert booking_count(app) == before
+
+
+def test_concurrent_duplicate_waits_for_the_first_response(app, auth, flight_id, monkeypatch):
+    quote = app_module.quote_itineraries
+    started = threading.Event()
+
+    def slow_quote(itineraries):
+        started.set()
+        time.sleep(0.3)
+        return quote(itineraries)
+
+    monkeypatch.setattr(app_module, 'quote_itineraries', slow_quote)
+    key = uuid.uuid4().hex
+    before = booking_count(app)
+    responses = {}
+
+    def first():
+        responses['first'] = book(app.test_client(), auth, key, flight_id)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    assert started.wait(5)
+    duplicate = book(app.test_client(), auth, key, flight_id)
+    thread.join()
+    assert responses['first'].status_code == duplicate.status_code == 201
+    assert 'Idempotent-Replayed' not in responses['first'].headers
+    assert duplicate.headers['Idempotent-Replayed'] == 'true'
+    assert duplicate.get_json() == responses['first'].get_json()
+    assert booking_count(app) == before + 1
+
+
+def test_request_that_failed_after_committing_is_not_run_again(app, client, auth, flight_id, monkeypatch):
+    def fail(flight):
+        raise RuntimeError("index unavailable")
+
+    # Fails after the booking has been committed, before the response is stored
+    monkeypatch.setattr(app_module.route_index, 'upsert', fail)
+    monkeypatch.setattr(app_module.idempotency, 'wait', 0.2)
+    key = uuid.uuid4().hex
+    before = booking_count(app)
+    assert book(client, auth, key, flight_id).status_code == 500
+    monkeypatch.undo()
+    monkeypatch.setattr(app_module.idempotency, 'wait', 0.2)
+
+    # Soon after, a retry is told the request is still in progress
+    assert book(client, auth, key, flight_id).status_code == 409
+    # Past the lock timeout, when a dead worker's claim would be taken over, it is still not run again
+    with app.app_context():
+        row = db.session.scalars(db.select(IdempotencyKey).where(IdempotencyKey.key == key)).one()
+        row.created_at -= app_module.idempotency.lock_timeout
+        db.session.commit()
+        db.session.remove()
+    retry = book(client, auth, key, flight_id)
+    assert retry.status_code == 409
+    assert 'already processed' in retry.get_json()['error']
+    assert booking_count(app) == before + 1
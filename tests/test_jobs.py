@@ -0,0 +1,249 @@
+"""The job worker against a local stub of Daraja and SendGrid.
+
+The stub answers the STK push and mail endpoints, failing the next requests
+with whatever statuses a test queues up, and records how many requests of
+each kind were in flight at once.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app as app_module
+from daraja import DarajaClient
+from emails import Mailer
+from jobs import Handler, JobQueue, Worker, STALE_ERROR
+from models import db, Booking, Job
+
+PUSH = {"phone": "254708374149", "amount": 1}
+
+
+class Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.failures = {'push': [], 'mail': []}  # Statuses for the next requests, then success
+        self.requests = {'push': 0, 'mail': 0}
+        self.inflight = {'push': 0, 'mail': 0}
+        self.max_inflight = {'push': 0, 'mail': 0}
+        self.delay = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/oauth/v1/generate'):
+            return self._send(200, {"access_token": "token", "expires_in": "3599"})
+        self._send(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        kind = {'/mpesa/stkpush/v1/processrequest': 'push', '/v3/mail/send': 'mail'}.get(self.path)
+        if kind is None:
+            return self._send(404, {})
+        stub = self.server
+        with stub.lock:
+            stub.requests[kind] += 1
+            number = stub.requests[kind]
+            stub.inflight[kind] += 1
+            stub.max_inflight[kind] = max(stub.max_inflight[kind], stub.inflight[kind])
+            status = stub.failures[kind].pop(0) if stub.failures[kind] else None
+        time.sleep(stub.delay)
+        with stub.lock:
+            stub.inflight[kind] -= 1
+        if status:
+            return self._send(status, {"errorMessage": "stub failure"})
+        if kind == 'push':
+            return self._send(200, {"CheckoutRequestID": f"ws_CO_{number}", "ResponseCode": "0"})
+        self._send(202, None, {'X-Message-Id': f"msg-{number}"})
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub(app, monkeypatch):
+    server = Stub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(app_module, 'mpesa', DarajaClient(server.url, 'key', 'secret', timeout=(1, 5)))
+    monkeypatch.setattr(app_module, 'mailer', Mailer('test-key', 'bookings@example.com', host=server.url, timeout=5))
+    # Retries a few milliseconds apart instead of seconds
+    monkeypatch.setattr(app_module.jobs, 'retry_base', 0.01)
+    with app.app_context():
+        db.session.execute(db.delete(Job))
+        db.session.commit()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def enqueue(app, kind, payload):
+    with app.app_context():
+        job = app_module.jobs.enqueue(kind, payload)
+        db.session.commit()
+        return job.job_id
+
+
+def booking_ids(app):
+    with app.app_context():
+        return db.session.scalars(db.select(Booking.booking_id).where(Booking.user_id == 2).limit(2)).all()
+
+
+def work(app, timeout=10, **options):
+    """Run a worker until no job is queued or running (retries included)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        Worker(app, app_module.jobs, poll_interval=0.01, **options).run(once=True)
+        with app.app_context():
+            pending = db.session.scalar(
+                db.select(db.func.count()).select_from(Job).where(Job.status.in_(['queued', 'running']))
+            )
+            db.session.remove()
+        if not pending:
+            return
+        time.sleep(0.01)
+    raise AssertionError("jobs still pending")
+
+
+def status(client, job_id):
+    return client.get(f'/jobs/{job_id}').get_json()
+
+
+def test_push_succeeds(app, client, stub):
+    job_id = enqueue(app, 'stk_push', PUSH)
+    work(app)
+    job = status(client, job_id)
+    assert job['status'] == 'succeeded'
+    assert job['attempts'] == 1
+    assert job['result']['CheckoutRequestID'] == 'ws_CO_1'
+
+
+@pytest.mark.parametrize('refusal', [429, 503])
+def test_refused_push_is_retried(app, client, stub, refusal):
+    stub.failures['push'] = [refusal, refusal]
+    job_id = enqueue(app, 'stk_push', PUSH)
+    work(app)
+    job = status(client, job_id)
+    assert job['status'] == 'succeeded'
+    assert job['attempts'] == 3
+    assert stub.requests['push'] == 3
+
+
+@pytest.mark.parametrize('error', [400, 500])
+def test_push_that_may_have_been_processed_is_not_resent(app, client, stub, error):
+    stub.failures['push'] = [error]
+    job_id = enqueue(app, 'stk_push', PUSH)
+    work(app)
+    job = status(client, job_id)
+    assert job['status'] == 'dead'
+    assert job['attempts'] == 1
+    assert job['last_error'].startswith(f"Daraja answered {error}")
+    assert stub.requests['push'] == 1
+
+
+def test_push_is_dead_lettered_after_its_attempts_and_can_be_requeued(app, client, stub):
+    attempts = app.config['STK_PUSH_MAX_ATTEMPTS']
+    stub.failures['push'] = [503] * attempts
+    job_id = enqueue(app, 'stk_push', PUSH)
+    work(app)
+    job = status(client, job_id)
+    assert (job['status'], job['attempts'], job['last_error']) == ('dead', attempts, "Daraja answered 503")
+    assert stub.requests['push'] == attempts
+
+    with app.app_context():
+        assert app_module.jobs.requeue_dead('stk_push') == 1
+    work(app)
+    assert status(client, job_id)['status'] == 'succeeded'
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    queue = JobQueue(retry_base=5, retry_max=60)
+    for attempts, ceiling in ((1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (12, 60)):
+        delay = queue.backoff(attempts)
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_email_is_retried_on_server_errors_only(app, client, stub):
+    stub.failures['mail'] = [503, 500]
+    retried = enqueue(app, 'booking_confirmation', {"booking_ids": booking_ids(app)})
+    work(app)
+    assert (status(client, retried)['status'], status(client, retried)['attempts']) == ('succeeded', 3)
+
+    stub.failures['mail'] = [400]
+    rejected = enqueue(app, 'booking_confirmation', {"booking_ids": booking_ids(app)})
+    work(app)
+    job = status(client, rejected)
+    assert (job['status'], job['attempts']) == ('dead', 1)
+    assert job['last_error'].startswith("SendGrid answered 400")
+
+
+def test_each_kind_runs_within_its_own_concurrency(app, stub):
+    stub.delay = 0.2
+    for _ in range(6):
+        enqueue(app, 'stk_push', PUSH)
+        enqueue(app, 'booking_confirmation', {"booking_ids": booking_ids(app)})
+    started = time.perf_counter()
+    work(app, concurrency=8)
+    assert stub.max_inflight['push'] == app.config['STK_PUSH_CONCURRENCY']
+    assert stub.max_inflight['mail'] == app.config['EMAIL_CONCURRENCY']
+    # Three rounds of two pushes, with the emails running alongside them
+    assert time.perf_counter() - started < 6 * 0.2
+
+
+def test_unexpected_error_keeps_the_traceback_out_of_the_job(app, client, stub, monkeypatch, caplog):
+    def crash(payload):
+        raise ValueError("no such account")
+
+    monkeypatch.setitem(app_module.jobs.handlers, 'crash', Handler(crash, 1, 1, True))
+    job_id = enqueue(app, 'crash', {})
+    work(app)
+    job = status(client, job_id)
+    assert (job['status'], job['last_error']) == ('dead', "no such account")
+    assert 'Traceback' in caplog.text
+
+
+def make_stale(app, job_id):
+    with app.app_context():
+        long_ago = datetime.utcnow() - timedelta(seconds=app.config['JOB_LOCK_SECONDS'] + 1)
+        db.session.execute(
+            db.update(Job).where(Job.job_id == job_id)
+            .values(status='running', attempts=1, locked_at=long_ago, locked_by='dead-worker')
+        )
+        db.session.commit()
+
+
+def test_push_left_running_by_a_dead_worker_is_not_resent(app, client, stub):
+    job_id = enqueue(app, 'stk_push', PUSH)
+    make_stale(app, job_id)
+    work(app)
+    job = status(client, job_id)
+    assert (job['status'], job['last_error']) == ('dead', STALE_ERROR)
+    assert stub.requests['push'] == 0
+
+
+def test_email_left_running_by_a_dead_worker_is_run_again(app, client, stub):
+    job_id = enqueue(app, 'booking_confirmation', {"booking_ids": booking_ids(app)})
+    make_stale(app, job_id)
+    work(app)
+    job = status(client, job_id)
+    assert (job['status'], job['attempts']) == ('succeeded', 2)
+    assert stub.requests['mail'] == 1
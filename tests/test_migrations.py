@@ -0,0 +1,12 @@
+import os
+
+from flask_migrate import check
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def test_models_match_the_migrations(app):
+    # Fails (exits) if autogenerate would emit any operation, such as
+    # dropping the full-text search tables it does not know about
+    with app.app_context():
+        check(directory=MIGRATIONS)
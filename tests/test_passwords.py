@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+import app as app_module
+from models import db, User
+from passwords import HashingBusy, PasswordHasher
+
+
+class SlowBcrypt:
+    """Stands in for Flask-Bcrypt; each check blocks until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def check_password_hash(self, pw_hash, password):
+        self.started.release()
+        self.release.wait(10)
+        return True
+
+
+def test_hasher_turns_callers_away_once_pool_and_queue_are_full():
+    bcrypt = SlowBcrypt()
+    hasher = PasswordHasher(bcrypt, max_workers=1, max_queue=0)
+    running = threading.Thread(target=hasher.check, args=('hash', 'pw'))
+    running.start()
+    assert bcrypt.started.acquire(timeout=5)
+    try:
+        with pytest.raises(HashingBusy):
+            hasher.check('hash', 'pw')
+    finally:
+        bcrypt.release.set()
+        running.join()
+    assert hasher.check('hash', 'pw')
+
+
+def test_login_succeeds_when_the_rehash_cannot_be_queued(app, client, monkeypatch):
+    with app.app_context():
+        user = db.session.get(User, 3)
+        email, stored = user.email, user.password
+        db.session.remove()
+
+    def busy(password):
+        raise HashingBusy(1)
+
+    # The stored hash now has the wrong cost, and the pool has no room to fix it
+    monkeypatch.setattr(app_module.passwords, 'rounds', app_module.passwords.rounds + 1)
+    monkeypatch.setattr(app_module.passwords, 'hash', busy)
+    response = client.post('/login/email', json={"email": email, "password": "password"})
+
+    assert response.status_code == 200
+    assert response.get_json()['token']
+    with app.app_context():
+        assert db.session.get(User, 3).password == stored
+        db.session.remove()
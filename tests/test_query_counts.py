@@ -0,0 +1,42 @@
+"""SQL statements per request, counted by the metrics hooks (``g.db_statements``).
+
+Listings must cost the same whatever the page size, and each expanded
+relationship exactly one more batched query.
+"""
+import pytest
+from flask import g
+
+ENDPOINTS = [
+    # Page query only; the admin's role is cached by the warm-up request
+    ('admin', '/users?limit=20', 1),
+    ('admin', '/users?limit=200', 1),
+    ('admin', '/users?limit=200&expand=bookings', 2),
+    ('admin', '/users?limit=200&expand=bookings,flights,hotels', 4),
+    ('admin', '/users/3', 1),
+    ('admin', '/users/3?expand=bookings', 2),
+    # Page query and the change counter behind the ETag
+    ('traveler', '/flights?limit=20', 2),
+    ('traveler', '/flights?limit=200', 2),
+    # Expanded responses have no ETag, so no counter read
+    ('traveler', '/flights?limit=200&expand=bookings', 2),
+    ('traveler', '/flights?limit=200&expand=bookings,user_flights', 3),
+    ('traveler', '/flights/3', 2),
+    ('traveler', '/flights/3?expand=bookings', 2),
+    ('traveler', '/hotels?limit=20', 2),
+    ('traveler', '/hotels?limit=200', 2),
+    ('traveler', '/hotels?limit=200&expand=bookings', 2),
+    ('traveler', '/hotels/3', 2),
+    ('traveler', '/hotels/3?expand=bookings,amenity_tags', 3),
+    ('traveler', '/bookings', 1),
+]
+
+
+@pytest.mark.parametrize('role, path, statements', ENDPOINTS)
+def test_query_count(client, auth, role, path, statements):
+    headers = auth(role)
+    # Warm the per-process caches (the admin's role) so only the request's own queries count
+    client.get(path, headers=headers)
+    with client:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        assert g.db_statements == statements
@@ -0,0 +1,96 @@
+import pytest
+
+from models import db, Booking, Flight, Hotel
+
+
+@pytest.fixture
+def catalog(app):
+    """Two flights with seats, one flight that is full and two hotels, with their prices."""
+    with app.app_context():
+        open_flights = db.session.scalars(db.select(Flight).where(Flight.seats_available > 5).limit(2)).all()
+        full = db.session.scalars(db.select(Flight).where(Flight.seats_available < 2).limit(1)).first()
+        hotels = db.session.scalars(db.select(Hotel).limit(2)).all()
+        data = {
+            'flights': [(f.flight_id, f.price, f.seats_available) for f in open_flights],
+            'full': (full.flight_id, full.seats_available) if full else None,
+            'hotels': [(h.hotel_id, h.price_per_night) for h in hotels],
+        }
+        db.session.remove()
+    return data
+
+
+def quote(client, *itineraries):
+    return client.post('/quotes', json={"itineraries": list(itineraries)})
+
+
+def test_quotes_come_back_in_request_order(client, catalog):
+    (first, first_price, _), (second, second_price, _) = catalog['flights']
+    (hotel, per_night), _ = catalog['hotels']
+    response = quote(client,
+                     {"flight_id": second, "passengers": 2},
+                     {"hotel_id": hotel, "nights": 3},
+                     {"flight_id": first, "passengers": 1, "hotel_id": hotel, "nights": 2})
+    assert response.status_code == 200
+    quotes = response.get_json()['quotes']
+    assert [(q['flight_id'], q['hotel_id']) for q in quotes] == [(second, None), (None, hotel), (first, hotel)]
+    assert quotes[0]['total_price'] == pytest.approx(second_price * 2)
+    assert quotes[0]['bookable'] is True
+    assert quotes[1]['total_price'] == pytest.approx(per_night * 3)
+    assert 'bookable' not in quotes[1]
+    assert quotes[2]['flight_total'] == pytest.approx(first_price)
+    assert quotes[2]['hotel_total'] == pytest.approx(per_night * 2)
+    assert quotes[2]['total_price'] == pytest.approx(first_price + per_night * 2)
+
+
+def test_flight_without_enough_seats_is_not_bookable(client, catalog):
+    if catalog['full'] is None:
+        pytest.skip("every flight in the dataset has seats")
+    flight_id, seats = catalog['full']
+    q, = quote(client, {"flight_id": flight_id, "passengers": seats + 1}).get_json()['quotes']
+    assert q['bookable'] is False
+
+
+def test_invalid_itineraries_get_an_error_in_their_place(client, catalog):
+    (flight_id, price, _), _ = catalog['flights']
+    quotes = quote(client,
+                   {"flight_id": flight_id},
+                   {"passengers": 2},
+                   {"flight_id": 10 ** 9},
+                   {"hotel_id": "abc"},
+                   {"flight_id": flight_id, "passengers": 0},
+                   {"flight_id": flight_id, "passengers": 3}).get_json()['quotes']
+    assert quotes[0]['total_price'] == pytest.approx(price)
+    assert quotes[1:5] == [
+        {"error": "flight_id or hotel_id is required"},
+        {"error": "Flight not found"},
+        {"error": "flight_id and hotel_id must be integers"},
+        {"error": "passengers and nights must be at least 1"},
+    ]
+    assert quotes[5]['total_price'] == pytest.approx(price * 3)
+
+
+def test_itinerary_limit(app, client, catalog, monkeypatch):
+    monkeypatch.setitem(app.config, 'QUOTE_MAX_ITINERARIES', 3)
+    (flight_id, _, _), _ = catalog['flights']
+    assert quote(client, *[{"flight_id": flight_id}] * 3).status_code == 200
+    response = quote(client, *[{"flight_id": flight_id}] * 4)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "At most 3 itineraries per request"}
+    assert client.post('/quotes', json={"itineraries": []}).status_code == 400
+
+
+def test_booking_is_priced_like_its_quote(app, client, auth, catalog):
+    (flight_id, _, seats), _ = catalog['flights']
+    (hotel, _), _ = catalog['hotels']
+    itinerary = {"flight_id": flight_id, "passengers": 2, "hotel_id": hotel, "nights": 3}
+    q, = quote(client, itinerary).get_json()['quotes']
+    # A client-supplied price is ignored
+    response = client.post('/bookings', json={**itinerary, "total_price": 1}, headers=auth('traveler'))
+    assert response.status_code == 201
+    booking = response.get_json()
+    assert booking['total_price'] == pytest.approx(q['total_price'])
+    with app.app_context():
+        db.session.delete(db.session.get(Booking, booking['booking_id']))
+        db.session.get(Flight, flight_id).seats_available = seats
+        db.session.commit()
+        db.session.remove()
@@ -0,0 +1,104 @@
+"""Read-replica routing against two local SQLite files, one standing in for each server."""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
+from sqlalchemy import Column, MetaData, String, Table
+
+from models import db, ChangeCounter
+from replicas import ReplicaRouter, STICKY_COOKIE
+
+COUNTERS = ChangeCounter.__table__
+# Each database says which one it is
+WHOAMI = Table('whoami', MetaData(), Column('name', String))
+
+
+@pytest.fixture
+def replicated(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS={'replica': f"sqlite:///{tmp_path / 'replica.db'}"},
+        JWT_SECRET_KEY='test',
+    )
+    JWTManager(app)
+    db.init_app(app)
+    router = ReplicaRouter(db, max_lag=5, check_interval=0, sticky_seconds=10)
+    router.init_app(app)
+
+    @app.get('/source')
+    def source():
+        return jsonify(db.session.execute(db.select(WHOAMI.c.name)).scalars().first())
+
+    @app.post('/write')
+    def write():
+        db.session.execute(WHOAMI.insert().values(name='written'))
+        db.session.commit()
+        return jsonify(True)
+
+    with app.app_context():
+        for key, name in ((None, 'primary'), ('replica', 'replica')):
+            with db.engines[key].begin() as connection:
+                COUNTERS.create(connection)
+                WHOAMI.create(connection)
+                connection.execute(WHOAMI.insert().values(name=name))
+    app.router = router
+    return app
+
+
+def set_counter(app, bind, version, seconds_ago):
+    with app.app_context(), db.engines[bind].begin() as connection:
+        connection.execute(COUNTERS.delete())
+        connection.execute(COUNTERS.insert().values(
+            name='flights', version=version, updated_at=datetime.utcnow() - timedelta(seconds=seconds_ago),
+        ))
+
+
+def test_reads_go_to_an_up_to_date_replica(replicated):
+    set_counter(replicated, None, 10, 60)
+    set_counter(replicated, 'replica', 10, 60)
+    assert replicated.test_client().get('/source').get_json() == 'replica'
+
+
+def test_small_lag_still_reads_from_the_replica(replicated):
+    set_counter(replicated, None, 11, 0)
+    set_counter(replicated, 'replica', 10, 1)
+    assert replicated.test_client().get('/source').get_json() == 'replica'
+
+
+def test_replica_far_behind_under_steady_writes_is_not_used(replicated):
+    # The primary bumped two seconds ago, as it does all the time under load;
+    # the replica last applied a bump two minutes ago and is 40 versions behind
+    set_counter(replicated, None, 140, 2)
+    set_counter(replicated, 'replica', 100, 120)
+    client = replicated.test_client()
+    assert client.get('/source').get_json() == 'primary'
+    with replicated.app_context():
+        assert replicated.router.lag() >= 120
+
+
+def test_replica_without_the_counter_is_not_used(replicated):
+    set_counter(replicated, None, 1, 0)
+    assert replicated.test_client().get('/source').get_json() == 'primary'
+
+
+def test_unreachable_replica_is_not_used(replicated):
+    set_counter(replicated, None, 10, 60)
+    with replicated.app_context(), db.engines['replica'].begin() as connection:
+        connection.execute(db.text("DROP TABLE change_counters"))
+    assert replicated.test_client().get('/source').get_json() == 'primary'
+
+
+def test_client_reads_its_own_writes_from_the_primary(replicated):
+    set_counter(replicated, None, 10, 60)
+    set_counter(replicated, 'replica', 10, 60)
+    client = replicated.test_client()
+    response = client.post('/write')
+    assert STICKY_COOKIE in response.headers.get('Set-Cookie', '')
+    # The write has not reached the replica, and this client must see it
+    assert client.get('/source').get_json() == 'primary'
+    # Another client is still served by the replica until the lag check says otherwise
+    set_counter(replicated, None, 11, 0)
+    set_counter(replicated, 'replica', 11, 0)
+    assert replicated.test_client().get('/source').get_json() == 'replica'
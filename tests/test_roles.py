@@ -0,0 +1,76 @@
+import pytest
+from flask_jwt_extended import decode_token
+
+import app as app_module
+from cache import RedisTTLMap, TTLCache
+from models import db, User
+
+
+@pytest.fixture
+def admin(app, client):
+    """A fresh admin and a token issued to them while they were one."""
+    with app.app_context():
+        user = User(first_name='Temp', last_name='Admin', email='temp.admin@example.com', role='admin',
+                    phone_number='0700000000', password=app_module.passwords.hash('password'))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.user_id
+        db.session.remove()
+    token = client.post('/login/email', json={"email": 'temp.admin@example.com', "password": 'password'}).get_json()['token']
+    yield user_id, {'Authorization': f"Bearer {token}"}
+    with app.app_context():
+        db.session.execute(db.delete(User).where(User.user_id == user_id))
+        db.session.commit()
+        db.session.remove()
+
+
+def demote_elsewhere(app, user_id):
+    # Written straight to the database, the way another worker's PATCH would look from here
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.user_id == user_id).values(role='traveler'))
+        db.session.commit()
+        db.session.remove()
+
+
+def test_admin_tokens_are_short_lived(app, admin, tokens):
+    _, headers = admin
+    with app.app_context():
+        admin_claims = decode_token(headers['Authorization'].split()[1])
+        traveler_claims = decode_token(tokens['traveler'])
+    assert admin_claims['exp'] - admin_claims['iat'] == app.config['JWT_ADMIN_ACCESS_TOKEN_EXPIRES'].total_seconds()
+    assert traveler_claims['exp'] - traveler_claims['iat'] == app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+
+
+def test_demotion_by_another_worker_is_seen_once_the_role_cache_expires(app, client, admin, monkeypatch):
+    user_id, headers = admin
+    monkeypatch.setattr(app_module, 'role_changes', None)
+    monkeypatch.setattr(app_module, 'role_cache', TTLCache(ttl=0))
+    assert client.get('/flights/cache', headers=headers).status_code == 200
+
+    demote_elsewhere(app, user_id)
+
+    assert client.get('/flights/cache', headers=headers).status_code == 403
+
+
+def test_demotion_by_another_worker_is_seen_at_once_through_redis(app, client, admin, monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    this_worker = RedisTTLMap(fakeredis.FakeRedis(server=server), ttl=900, prefix='rolechange:')
+    other_worker = RedisTTLMap(fakeredis.FakeRedis(server=server), ttl=900, prefix='rolechange:')
+    monkeypatch.setattr(app_module, 'role_changes', this_worker)
+    user_id, headers = admin
+    assert client.get('/flights/cache', headers=headers).status_code == 200
+
+    # The other worker demotes the admin and records the change
+    demote_elsewhere(app, user_id)
+    other_worker.set(user_id, app_module.datetime.now().timestamp() + 1)
+
+    assert client.get('/flights/cache', headers=headers).status_code == 403
+
+
+def test_deleted_admin_is_refused(app, client, admin, tokens, monkeypatch):
+    monkeypatch.setattr(app_module, 'role_cache', TTLCache(ttl=0))
+    user_id, headers = admin
+    response = client.delete(f'/users/{user_id}', headers={'Authorization': f"Bearer {tokens['admin']}"})
+    assert response.status_code == 200
+    assert client.get('/flights/cache', headers=headers).status_code == 404
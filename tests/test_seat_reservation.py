@@ -0,0 +1,133 @@
+"""Hundreds of parallel bookings on one flight must never oversell it.
+
+The endpoint test runs against the suite's database. The reservation path
+(the conditional UPDATE on ``seats_available`` plus the booking insert in
+one transaction) is also run against a SQLite file and, when
+``TEST_POSTGRES_URI`` points at a server, against PostgreSQL in a scratch
+schema that is dropped afterwards:
+
+    TEST_POSTGRES_URI=postgresql://localhost/airescape_test python -m pytest -q tests/test_seat_reservation.py
+"""
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Booking, Flight, User
+
+SEATS = 25
+ATTEMPTS = 300
+THREADS = 32
+# Bookings per second; far below what either database manages, but a
+# reservation path that serialized on a lock held across requests would miss it
+MIN_THROUGHPUT = 50
+
+
+def hammer(book):
+    """Run ``book()`` ATTEMPTS times from THREADS threads; returns (results, seconds)."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(lambda _: book(), range(ATTEMPTS)))
+    return results, time.perf_counter() - started
+
+
+def test_parallel_booking_requests_never_oversell(app, client, auth):
+    with app.app_context():
+        flight = db.session.scalars(db.select(Flight).limit(1)).first()
+        flight.seats_available = SEATS
+        flight_id = flight.flight_id
+        before = db.session.scalar(db.select(db.func.count()).select_from(Booking).where(Booking.flight_id == flight_id))
+        db.session.commit()
+        db.session.remove()
+    headers = auth('traveler')
+
+    def book():
+        return client.post('/bookings', json={"flight_id": flight_id, "passengers": 1}, headers=headers).status_code
+
+    statuses, seconds = hammer(book)
+    assert statuses.count(201) == SEATS
+    assert statuses.count(409) == ATTEMPTS - SEATS
+    with app.app_context():
+        assert db.session.get(Flight, flight_id).seats_available == 0
+        after = db.session.scalar(db.select(db.func.count()).select_from(Booking).where(Booking.flight_id == flight_id))
+        assert after - before == SEATS
+        db.session.remove()
+    assert ATTEMPTS / seconds >= MIN_THROUGHPUT
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def inventory(request, tmp_path):
+    """A stand-alone app on one backend, with one user and a flight of SEATS seats."""
+    options = {'pool_size': THREADS, 'max_overflow': 0}
+    if request.param == 'sqlite':
+        uri = f"sqlite:///{tmp_path / 'seats.db'}"
+        drop = None
+    else:
+        uri = os.environ.get('TEST_POSTGRES_URI')
+        if not uri:
+            pytest.skip("TEST_POSTGRES_URI is not set")
+        schema = f"seat_stress_{uuid.uuid4().hex[:8]}"
+        admin = create_engine(uri)
+        try:
+            with admin.begin() as connection:
+                connection.execute(text(f"CREATE SCHEMA {schema}"))
+        except OperationalError as e:
+            admin.dispose()
+            pytest.skip(f"PostgreSQL is not reachable: {e.orig}")
+        options['connect_args'] = {'options': f"-c search_path={schema}"}
+        drop = f"DROP SCHEMA {schema} CASCADE"
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=uri, SQLALCHEMY_ENGINE_OPTIONS=options)
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine)
+        user = User(first_name='Stress', last_name='Test', email='stress@example.com',
+                    password='x', role='traveler', phone_number='254700000000')
+        flight = Flight(flight_number='ST100', departure_city='Nairobi', arrival_city='Mombasa',
+                        departure_date=datetime(2030, 1, 1), arrival_date=datetime(2030, 1, 1),
+                        departure_time=dt_time(8), arrival_time=dt_time(9),
+                        price=5000.0, seats_available=SEATS, trip_type='one-way')
+        db.session.add_all([user, flight])
+        db.session.commit()
+        app.ids = (user.user_id, flight.flight_id)
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    if drop:
+        with admin.begin() as connection:
+            connection.execute(text(drop))
+        admin.dispose()
+
+
+def test_parallel_reservations_never_oversell(inventory):
+    user_id, flight_id = inventory.ids
+
+    def book():
+        # What POST /bookings does: seats and booking in one transaction
+        with inventory.app_context():
+            try:
+                if not Flight.reserve_seats(flight_id, 1):
+                    db.session.rollback()
+                    return False
+                db.session.add(Booking(user_id=user_id, flight_id=flight_id, total_price=5000.0,
+                                       booking_type='flight', booking_status='confirmed'))
+                db.session.commit()
+                return True
+            finally:
+                db.session.remove()
+
+    results, seconds = hammer(book)
+    assert results.count(True) == SEATS
+    with inventory.app_context():
+        assert db.session.get(Flight, flight_id).seats_available == 0
+        assert db.session.scalar(db.select(db.func.count()).select_from(Booking)) == SEATS
+        db.session.remove()
+    assert ATTEMPTS / seconds >= MIN_THROUGHPUT
@@ -0,0 +1,45 @@
+"""``DB_STATEMENT_TIMEOUT_MS`` applies to requests only; needs ``TEST_POSTGRES_URI``."""
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+from database import StatementTimeout
+
+
+@pytest.fixture
+def engine():
+    uri = os.environ.get('TEST_POSTGRES_URI')
+    if not uri:
+        pytest.skip("TEST_POSTGRES_URI is not set")
+    engine = create_engine(uri, pool_size=1, max_overflow=0)
+    timeout = StatementTimeout(timeout_ms=200)
+    timeout.install(engine)
+    try:
+        with engine.connect():
+            pass
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL is not reachable: {e.orig}")
+    yield engine
+    event.remove(engine, 'engine_connect', timeout._on_connect)
+    engine.dispose()
+
+
+def current_timeout(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("SHOW statement_timeout").scalar()
+
+
+def test_timeout_applies_inside_requests_only(engine):
+    default = current_timeout(engine)
+    with Flask(__name__).test_request_context('/'):
+        assert current_timeout(engine) == '200ms'
+        with pytest.raises(OperationalError, match='statement timeout'):
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SELECT pg_sleep(1)")
+    # The same pooled connection, back outside a request (a CLI command or migration)
+    assert current_timeout(engine) == default
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT pg_sleep(0.3)")
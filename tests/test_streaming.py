@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('path, role, key', [
+    ('/users', 'admin', 'user_id'),
+    ('/flights', None, 'flight_id'),
+    ('/hotels', None, 'hotel_id'),
+    ('/bookings', 'traveler', 'booking_id'),
+])
+@pytest.mark.parametrize('how', ['query', 'accept'])
+def test_collections_stream_as_ndjson(client, auth, path, role, key, how):
+    headers = auth(role) if role else {}
+    if how == 'accept':
+        headers['Accept'] = 'application/x-ndjson'
+        response = client.get(path, headers=headers)
+    else:
+        response = client.get(f"{path}?stream=1", headers=headers)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = read_ndjson(response)
+    assert rows
+    ids = [row[key] for row in rows]
+    assert ids == sorted(ids)
+
+
+def test_stream_includes_expanded_relationships(client):
+    rows = read_ndjson(client.get('/flights?stream=1&expand=bookings'))
+    assert all(isinstance(row['bookings'], list) for row in rows)
+    assert any(row['bookings'] for row in rows)